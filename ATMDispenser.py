@@ -0,0 +1,129 @@
+import threading
+
+_MISSING = object()
+
+
+class ATMDispenser:
+    """
+    Bill cassettes of one ATM plus a bounded change-making solver.
+
+    Plans use the fewest bills possible given how many of each bill are left.
+    A table of plans for every amount up to `planLimit` is built whenever the
+    cassettes are (re)loaded, so common withdrawals are a dict lookup plus a
+    check that the plan still fits the cassettes. Dispensing only removes
+    bills, so a cached plan that still fits is still optimal; one that no
+    longer fits is re-solved for that amount alone and cached again.
+    Amounts above planLimit (up to maxDispense) are solved on demand and not
+    cached, so the table never holds more than planLimit + 1 plans. Amounts
+    above maxDispense are refused before any solving: the solver is linear in
+    the amount and runs under the cassette lock.
+    """
+
+    DENOMINATIONS = (50, 20, 10, 5, 1)
+    DEFAULT_BILLS_PER_CASSETTE = 2000
+
+    def __init__(self, inventory: dict | None = None, planLimit: int = 1000, maxDispense: int = 1000):
+        if inventory is None:
+            inventory = {bill: ATMDispenser.DEFAULT_BILLS_PER_CASSETTE for bill in ATMDispenser.DENOMINATIONS}
+        self._counts = [int(inventory.get(bill, 0)) for bill in ATMDispenser.DENOMINATIONS]
+        self._planLimit = planLimit
+        self.maxDispense = maxDispense    # most dollars one dispense can ask for
+        self._plans = {}     # amount -> tuple of bill counts (DENOMINATIONS order), or None if impossible
+        self._lock = threading.Lock()
+        self._rebuild()
+
+    # ---------- Solver ----------
+    def _solve(self, limit: int) -> list:
+        """
+        Bounded change-making DP for every amount 0..limit with the current counts.
+        Each cassette is split into 1, 2, 4, ... bill bundles (0/1 knapsack items).
+        Returns a list indexed by amount of count tuples (or None).
+        """
+        k = len(ATMDispenser.DENOMINATIONS)
+        infinity = limit + 1
+        cost = [0] + [infinity] * limit
+        plan = [(0,) * k] + [None] * limit
+        for idx, bill in enumerate(ATMDispenser.DENOMINATIONS):
+            remaining = self._counts[idx]
+            bundle = 1
+            while remaining > 0:
+                take = min(bundle, remaining)
+                remaining -= take
+                bundle *= 2
+                weight = take * bill
+                if weight > limit:
+                    continue
+                for amount in range(limit, weight - 1, -1):
+                    prev = cost[amount - weight]
+                    if prev + take < cost[amount]:
+                        cost[amount] = prev + take
+                        p = plan[amount - weight]
+                        plan[amount] = p[:idx] + (p[idx] + take,) + p[idx + 1:]
+        return plan
+
+    def _rebuild(self):
+        table = self._solve(self._planLimit)
+        self._plans = {amount: p for amount, p in enumerate(table)}
+
+    def _fits(self, plan: tuple) -> bool:
+        counts = self._counts
+        for i, n in enumerate(plan):
+            if n > counts[i]:
+                return False
+        return True
+
+    def _planLocked(self, amount: int) -> tuple | None:
+        if amount <= 0 or amount > self.maxDispense:
+            return None
+        plan = self._plans.get(amount, _MISSING)
+        if plan is None:
+            return None     # dispensing never makes an impossible amount possible
+        if plan is not _MISSING and self._fits(plan):
+            return plan
+        if amount > sum(bill * n for bill, n in zip(ATMDispenser.DENOMINATIONS, self._counts)):
+            return None
+        plan = self._solve(amount)[amount]
+        if amount <= self._planLimit:
+            self._plans[amount] = plan
+        return plan
+
+    @staticmethod
+    def _asDict(plan: tuple) -> dict:
+        return {bill: n for bill, n in zip(ATMDispenser.DENOMINATIONS, plan) if n}
+
+    # ---------- Public API ----------
+    def plan(self, amountInDollars: int) -> dict | None:
+        """Bills for amountInDollars ({bill: count}) without dispensing, or None if impossible (or over maxDispense)."""
+        with self._lock:
+            plan = self._planLocked(int(amountInDollars))
+        return None if plan is None else self._asDict(plan)
+
+    def dispense(self, amountInDollars: int) -> dict | None:
+        """
+        Remove the bills for amountInDollars from the cassettes. Returns {bill: count},
+        or None if impossible (or over maxDispense).
+        """
+        with self._lock:
+            plan = self._planLocked(int(amountInDollars))
+            if plan is None:
+                return None
+            for i, n in enumerate(plan):
+                self._counts[i] -= n
+        return self._asDict(plan)
+
+    def load(self, bills: dict):
+        """Add bills ({bill: count}) to the cassettes, e.g. a restock or returning an undelivered dispense."""
+        with self._lock:
+            for bill, n in bills.items():
+                self._counts[ATMDispenser.DENOMINATIONS.index(bill)] += int(n)
+            # More bills can make impossible amounts possible and change optimal plans
+            self._rebuild()
+
+    def getInventory(self) -> dict:
+        with self._lock:
+            return dict(zip(ATMDispenser.DENOMINATIONS, self._counts))
+
+    def cashOnHand(self) -> int:
+        """Total dollars in the cassettes."""
+        with self._lock:
+            return sum(bill * n for bill, n in zip(ATMDispenser.DENOMINATIONS, self._counts))
@@ -1,6 +1,15 @@
+import hmac
+
+
 class Account:
+    # An Account is either detached (fields live on the object) or a lightweight
+    # view over one row of a Bank's AccountStore (only _store/_accountNumber are used).
+    __slots__ = ("_store", "_accountNumber", "_ownerFirstName", "_ownerLastName",
+                 "_ownerSSN", "_pin", "_balanceInCents")
+
     def __init__(self):
         # Required attributes (see spec)
+        self._store = None                  # AccountStore once added to a Bank
         self._accountNumber = None          # int, 8 digits (set later via setter)
         self._ownerFirstName = ""           # str
         self._ownerLastName = ""            # str
@@ -8,72 +17,136 @@ class Account:
         self._pin = ""                      # str, 4 digits, may start with 0
         self._balanceInCents = 0            # int, store money in cents
 
+    @classmethod
+    def _view(cls, store, accountNumber: int) -> "Account":
+        """Build a view over an existing row of store."""
+        a = cls.__new__(cls)
+        a._store = store
+        a._accountNumber = accountNumber
+        return a
+
+    def _attach(self, store):
+        # Called by Bank after the fields were copied into store. The store only
+        # keeps a hash of the PIN, so _pin stays: the object that set the PIN
+        # (e.g. the one Bank.openAccount returns) can still show it once.
+        self._store = store
+        for name in ("_ownerFirstName", "_ownerLastName", "_ownerSSN", "_balanceInCents"):
+            delattr(self, name)
+
     # -------- Getters --------
     def getAccountNumber(self): return self._accountNumber
-    def getOwnerFirstName(self): return self._ownerFirstName
-    def getOwnerLastName(self): return self._ownerLastName
-    def getOwnerSSN(self): return self._ownerSSN
-    def getPIN(self): return self._pin
-    def getBalanceInCents(self): return self._balanceInCents
+
+    def getOwnerFirstName(self):
+        if self._store is None:
+            return self._ownerFirstName
+        return self._store.getFirstName(self._accountNumber)
+
+    def getOwnerLastName(self):
+        if self._store is None:
+            return self._ownerLastName
+        return self._store.getLastName(self._accountNumber)
+
+    def getOwnerSSN(self):
+        if self._store is None:
+            return self._ownerSSN
+        return self._store.getSSN(self._accountNumber)
+
+    def getPIN(self):
+        # Plain PIN only on an object it was set on; views over a bank row return ""
+        try:
+            return self._pin
+        except AttributeError:
+            return ""
+
+    def getBalanceInCents(self):
+        if self._store is None:
+            return self._balanceInCents
+        return self._store.getBalance(self._accountNumber)
 
     # -------- Setters --------
     # Keep validation light; generation/validation logic happens in BankManager/BankUtility per spec.
     def setAccountNumber(self, num: int):
+        if self._store is not None:
+            raise ValueError("Cannot change the number of an account that belongs to a bank.")
         self._accountNumber = int(num)
 
     def setOwnerFirstName(self, name: str):
-        self._ownerFirstName = str(name)
+        if self._store is None:
+            self._ownerFirstName = str(name)
+        else:
+            self._store.setFirstName(self._accountNumber, str(name))
 
     def setOwnerLastName(self, name: str):
-        self._ownerLastName = str(name)
+        if self._store is None:
+            self._ownerLastName = str(name)
+        else:
+            self._store.setLastName(self._accountNumber, str(name))
 
     def setOwnerSSN(self, ssn: str):
         # Store as 9-digit string; masking happens in __repr__
-        self._ownerSSN = str(ssn)
+        if self._store is None:
+            self._ownerSSN = str(ssn)
+        else:
+            self._store.setSSN(self._accountNumber, str(ssn))
 
     def setPIN(self, pin: str):
-        # Store as 4-char string; can start with '0'
+        # Store as 4-char string; can start with '0'. A bank row keeps only its hash.
+        if self._store is not None:
+            self._store.setPIN(self._accountNumber, str(pin))
         self._pin = str(pin)
 
     def setBalanceInCents(self, cents: int):
-        self._balanceInCents = int(cents)
+        if self._store is None:
+            self._balanceInCents = int(cents)
+        else:
+            self._store.setBalance(self._accountNumber, int(cents))
 
     # -------- Banking actions --------
-    def deposit(self, amountInCents: int) -> int:
+    def deposit(self, amountInCents: int, idempotencyKey: str | None = None) -> int:
         """
         Add amountInCents (int) to balance and return new balance (int).
         Spec: deposit/withdraw take and return cents.  :contentReference[oaicite:2]{index=2}
+        For an account in a bank, a repeated idempotencyKey returns the first result (see Bank.deposit).
         """
+        if self._store is not None:
+            return self._store.addToBalance(self._accountNumber, int(amountInCents), None, idempotencyKey)
         self._balanceInCents += int(amountInCents)
         return self._balanceInCents
 
-    def withdraw(self, amountInCents: int) -> int:
+    def withdraw(self, amountInCents: int, idempotencyKey: str | None = None) -> int:
         """
         Subtract amountInCents (int) from balance and return new balance (int).
         NOTE: Caller (BankManager) should enforce 'insufficient funds' before calling,
         per project’s error-handling examples.  :contentReference[oaicite:3]{index=3}
         """
+        if self._store is not None:
+            return self._store.addToBalance(self._accountNumber, -int(amountInCents), None, idempotencyKey)
         self._balanceInCents -= int(amountInCents)
         return self._balanceInCents
 
     def isValidPIN(self, pin: str) -> bool:
         """
         Return True if the provided PIN matches the account PIN.  :contentReference[oaicite:4]{index=4}
+        For an account in a bank this checks the stored hash (slow on purpose) and
+        does not count failed attempts; use Bank.checkPIN for logins.
         """
-        return str(pin) == self._pin
+        if self._store is not None:
+            return self._store.checkPIN(self._accountNumber, str(pin))
+        return hmac.compare_digest(str(pin).encode(), self._pin.encode())
 
     # -------- Helpers --------
     def _masked_ssn(self) -> str:
         """
         Format SSN like XXX-XX-#### as shown in the sample outputs.  :contentReference[oaicite:5]{index=5}
         """
-        s = self._ownerSSN
+        s = self.getOwnerSSN()
         last4 = s[-4:] if len(s) >= 4 else s
         return f"XXX-XX-{last4}"
 
     def _formatted_balance(self) -> str:
-        dollars = self._balanceInCents // 100
-        cents = self._balanceInCents % 100
+        bal = self.getBalanceInCents()
+        dollars = bal // 100
+        cents = bal % 100
         return f"${dollars:,}.{cents:02d}"
 
     # Provide formatted string like the sample printout in the PDF.  :contentReference[oaicite:6]{index=6}
@@ -81,10 +154,10 @@ class Account:
         lines = [
             "============================================================",
             f"Account Number: {self._accountNumber if self._accountNumber is not None else ''}",
-            f"Owner First Name: {self._ownerFirstName}",
-            f"Owner Last Name: {self._ownerLastName}",
+            f"Owner First Name: {self.getOwnerFirstName()}",
+            f"Owner Last Name: {self.getOwnerLastName()}",
             f"Owner SSN: {self._masked_ssn()}",
-            f"PIN: {self._pin}",
+            f"PIN: {self.getPIN() or '****'}",
             f"Balance: {self._formatted_balance()}",
             "============================================================",
         ]
@@ -0,0 +1,124 @@
+import json
+import os
+import secrets
+import threading
+from functools import lru_cache
+
+_MASK64 = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+
+
+def _mix(x: int) -> int:
+    # splitmix64 finalizer: a cheap, well-distributed 64-bit hash
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+class AccountNumberAllocator:
+    """
+    Hands out 8-digit account numbers in O(1) time without ever repeating one.
+
+    The i-th number issued (i = 0, 1, 2, ...) is FIRST_NUMBER + P(i), where P is
+    a keyed permutation of [0, NUMBER_RANGE): a Feistel network over two
+    base-9487 halves (9487 squared just covers the range) that cycle-walks the
+    few outputs past the end. Numbers look random, yet the only state is the
+    key and how far the counter has got.
+
+    The counter is given out in blocks. reserveBlock() saves the new high-water
+    mark before any index in the block is used, so after a restart allocation
+    resumes past every block ever reserved; unused parts of a block are skipped,
+    never reissued. Shards or worker processes that each reserve their own block
+    need no further coordination: permute(key, index) turns an index into its
+    number anywhere.
+
+    With statePath set, the key and high-water mark are kept in that JSON file.
+    """
+
+    FIRST_NUMBER = 10000000
+    NUMBER_RANGE = 90000000     # 8-digit account numbers
+    _HALF = 9487                # smallest m with m * m >= NUMBER_RANGE
+    _ROUNDS = 6
+
+    def __init__(self, statePath: str | None = None, key: int | None = None, blockSize: int = 4096):
+        self._statePath = statePath
+        self.blockSize = blockSize
+        self._lock = threading.Lock()
+        self._next = 0           # first index not yet reserved
+        self._cursor = 0         # next index of the current block
+        self._blockEnd = 0
+        if statePath is not None and os.path.exists(statePath):
+            with open(statePath) as f:
+                state = json.load(f)
+            self.key, self._next = int(state["key"]), int(state["next"])
+        else:
+            self.key = secrets.randbits(64) if key is None else int(key)
+            self._save()
+
+    # ---------- Permutation ----------
+    @staticmethod
+    @lru_cache(maxsize=16)
+    def _roundKeys(key: int) -> tuple:
+        return tuple(_mix((key + (r + 1) * _GOLDEN) & _MASK64) for r in range(AccountNumberAllocator._ROUNDS))
+
+    @staticmethod
+    def permute(key: int, index: int) -> int:
+        """The account number for counter index (0 <= index < NUMBER_RANGE) under key."""
+        if not 0 <= index < AccountNumberAllocator.NUMBER_RANGE:
+            raise ValueError(f"Index {index} is outside the account-number range.")
+        m = AccountNumberAllocator._HALF
+        round_keys = AccountNumberAllocator._roundKeys(key)
+        x = index
+        while True:
+            left, right = divmod(x, m)
+            for k in round_keys:
+                left, right = right, (left + _mix(right ^ k)) % m
+            x = left * m + right
+            # P is a bijection of [0, m * m), so walking its cycle from an index in
+            # range always comes back into range, at a number no other index reaches
+            if x < AccountNumberAllocator.NUMBER_RANGE:
+                return AccountNumberAllocator.FIRST_NUMBER + x
+
+    # ---------- Allocation ----------
+    def _save(self):
+        if self._statePath is None:
+            return
+        tmp = self._statePath + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"key": self.key, "next": self._next}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._statePath)
+
+    def reserveBlock(self, size: int | None = None) -> range:
+        """
+        Reserve the next `size` counter indices (blockSize by default) and save the
+        new high-water mark. Returns the range of indices, which is never handed
+        out again; pass them to permute() with this allocator's key.
+        """
+        with self._lock:
+            return self._reserveLocked(self.blockSize if size is None else size)
+
+    def _reserveLocked(self, size: int) -> range:
+        start = self._next
+        if start >= AccountNumberAllocator.NUMBER_RANGE:
+            raise RuntimeError("Every 8-digit account number has been issued.")
+        stop = min(start + max(1, int(size)), AccountNumberAllocator.NUMBER_RANGE)
+        self._next = stop
+        self._save()
+        return range(start, stop)
+
+    def next(self) -> int:
+        """The next account number from this allocator's current block."""
+        with self._lock:
+            if self._cursor >= self._blockEnd:
+                block = self._reserveLocked(self.blockSize)
+                self._cursor, self._blockEnd = block.start, block.stop
+            index = self._cursor
+            self._cursor += 1
+        return AccountNumberAllocator.permute(self.key, index)
+
+    def issued(self) -> int:
+        """How many counter indices have been reserved so far (used or skipped)."""
+        with self._lock:
+            return self._next
@@ -0,0 +1,1153 @@
+import mmap
+import os
+import struct
+import itertools
+import threading
+import time
+import weakref
+from array import array
+from bisect import bisect_left, insort
+from contextlib import contextmanager, nullcontext
+
+from BankUtility import BankUtility
+from IdempotencyCache import IdempotencyCache
+from Ledger import Ledger
+
+
+class _InternTable:
+    """
+    Side table that stores each distinct string once and hands out small int ids.
+    Rows in AccountStore keep the ids, not the strings.
+
+    A table loaded from a snapshot keeps its first `_baseCount` strings in the
+    mapped string heap and decodes them on demand; only strings added after
+    loading live in `_strings`/`_ids`.
+    """
+    __slots__ = ("_strings", "_ids", "_baseCount", "_baseOffsets", "_baseBytes", "_lock")
+
+    def __init__(self):
+        self._strings = []   # id - _baseCount -> str
+        self._ids = {}       # str -> id
+        self._baseCount = 0
+        self._baseOffsets = None
+        self._baseBytes = None
+        self._lock = threading.Lock()   # shared by every shard of the store
+
+    def intern(self, s: str) -> int:
+        i = self._ids.get(s)
+        if i is None:
+            with self._lock:
+                i = self._ids.get(s)
+                if i is None:
+                    i = self._baseCount + len(self._strings)
+                    self._strings.append(s)
+                    self._ids[s] = i
+        return i
+
+    def get(self, i: int) -> str:
+        if i < self._baseCount:
+            offsets = self._baseOffsets
+            return bytes(self._baseBytes[offsets[i]:offsets[i + 1]]).decode()
+        return self._strings[i - self._baseCount]
+
+
+class AccountStore:
+    """
+    Columnar, array-backed account storage used by Bank.
+
+    Every account is one row across parallel arrays:
+      - account numbers and balances (cents) as int64
+      - PINs as salted slow hashes (BankUtility.hashPIN), PIN_HASH_SIZE bytes
+        per row in one bytearray, all zero when unset; plain PINs are never kept
+      - consecutive failed PIN attempts as uint16
+      - the account class (uint8, 0 by default) that month-end postings price by
+      - first/last names as ids into an interned side table
+      - SSNs as the 9-digit number itself; any other string is interned and
+        stored as -(id + 1)
+    Account numbers are located through an open-addressing hash table whose
+    slots hold row indices, so no per-account Python objects are kept alive.
+
+    A store loaded from a snapshot starts with `_base` rows sorted by account
+    number, read straight from a private (copy-on-write) memory map and found by
+    binary search. Rows added later go through the hash table. Closing a base
+    row only marks it dead (and zeroes its balance) so the base stays sorted.
+
+    When a Journal is attached, every mutation is appended to it before it is
+    applied, so Bank can rebuild the store by replaying the journal. When a
+    Ledger is attached, every balance change is recorded in it under the same
+    shard lock, so each account's entries are in the order they happened.
+    Balance changes may carry an idempotency key: it is journaled with the
+    change and, with an IdempotencyCache attached, checked and recorded under
+    the same lock, so a retried request returns its first result.
+
+    Concurrency: the account-number space is split into `shards` equal ranges,
+    each with its own lock. Single-account operations take their shard's lock;
+    transfer() takes both shard locks in shard order, so it is atomic and cannot
+    deadlock. Adding/removing rows and whole-store passes hold every lock
+    (see exclusive()).
+
+    Secondary indexes (owner SSN -> account numbers, and owner names sorted for
+    prefix search) are built by the first query that needs them, so loading a
+    snapshot stays cheap, and from then on are kept in sync by row add/remove
+    and the name/SSN setters. Balance aggregates for report() work the same
+    way: one pass on first use, then an O(1) update per balance change, kept
+    per shard under that shard's lock.
+
+    readView() hands out point-in-time views of the number, balance and class
+    columns (see BalanceView). The columns are versioned in pages of
+    2**_PAGE_BITS rows: before a row changes, the first write to its page since
+    a view was opened copies the page aside for every open view (copy on
+    write), so the views never wait for writers and writers never wait for them.
+    """
+
+    # Per-shard aggregate layout: accounts, total cents, non-zero balances,
+    # negative balances, then counts of balances >= 0 by bit length (0 = zero)
+    _STATS_ACCOUNTS, _STATS_TOTAL, _STATS_NONZERO, _STATS_NEGATIVE, _STATS_BUCKETS = range(5)
+    _STATS_SIZE = _STATS_BUCKETS + 64
+
+    # Read views: the columns they see, copied aside a page of rows at a time
+    _PAGE_BITS = 12
+    _VERSIONED = (("_numbers", "q"), ("_balances", "q"), ("_classes", "B"))
+
+    _PIN_WIDTH = BankUtility.PIN_HASH_SIZE
+    _NO_PIN = bytes(BankUtility.PIN_HASH_SIZE)
+    _EMPTY = -1
+    _FIRST_NUMBER = 10000000
+    _NUMBER_RANGE = 90000000     # 8-digit account numbers
+
+    # What a balance (or a ledger amount) can hold: the columns are int64
+    MIN_CENTS = -(1 << 63)
+    MAX_CENTS = (1 << 63) - 1
+
+    # Snapshot layout: header, then one 8-byte aligned section per column in
+    # _SNAPSHOT_COLUMNS order (name, typecode, items per row), then the name heap
+    # and the SSN heap (each: uint64 offsets[count + 1] followed by the utf-8 bytes).
+    _SNAPSHOT_MAGIC = b"BANKSNAP"
+    _SNAPSHOT_VERSION = 3
+    _SNAPSHOT_HEADER = struct.Struct("<8sIIqqqq")   # magic, version, pad, rows, names, ssns, journal offset
+    _SNAPSHOT_COLUMNS = (("_numbers", "q", 1), ("_balances", "q", 1), ("_pinHashes", "B", _PIN_WIDTH),
+                         ("_failedPINs", "H", 1), ("_classes", "B", 1), ("_firstNames", "I", 1),
+                         ("_lastNames", "I", 1), ("_ssns", "q", 1))
+
+    def __init__(self, shards: int = 1):
+        self._locks = [threading.Lock() for _ in range(max(1, int(shards)))]
+        self._numbers = array("q")
+        self._balances = array("q")
+        self._pinHashes = bytearray()
+        self._failedPINs = array("H")
+        self._classes = array("B")
+        self._firstNames = array("I")
+        self._lastNames = array("I")
+        self._ssns = array("q")
+        self._names = _InternTable()
+        self._ssnTable = _InternTable()
+        self._slots = array("q", [AccountStore._EMPTY]) * 16   # hash slot -> row (rows >= _base)
+        self._base = 0           # rows [0, _base) come from a snapshot, sorted by number
+        self._dead = set()       # closed base rows
+        self._mapped = None      # snapshot mmap while the columns still point into it
+        self._journal = None
+        self._ledger = None
+        self._replayPosition = 0  # journal position of the record being replayed, for its ledger entries
+        self._layoutVersion = 0   # bumped whenever a row is added or removed (rows move)
+        self._dedup = None
+        self._stats = None       # per-shard aggregates (see _STATS_*), None until the first report()
+        self._bySSN = None       # SSN key -> account number, or set of them (None until first query)
+        self._byName = None      # "last\0first" (casefolded) -> account number, or set of them
+        self._nameKeys = None    # sorted keys of _byName
+        self._indexLock = threading.Lock()
+        self._views = {}         # open read view token -> {page: saved (numbers, balances, classes)}
+        self._viewVersion = 0    # bumped by every readView()
+        self._pageVersions = {}  # page -> _viewVersion when it was last saved for the open views
+        self._pageLock = threading.Lock()
+        self._viewTokens = itertools.count()
+
+    def setJournal(self, journal):
+        """Attach (or detach with None) the Journal that records mutations."""
+        self._journal = journal
+
+    def setLedger(self, ledger):
+        """Attach (or detach with None) the Ledger that records balance changes."""
+        self._ledger = ledger
+
+    def setReplayPosition(self, position: int):
+        """While replaying with no journal attached: the position of the record being applied."""
+        self._replayPosition = position
+
+    def setIdempotencyCache(self, cache):
+        """Attach (or detach with None) the IdempotencyCache that answers keyed retries."""
+        self._dedup = cache
+
+    # ---------- Locking ----------
+    def shardCount(self) -> int:
+        return len(self._locks)
+
+    @staticmethod
+    def shardIndex(num: int, shards: int) -> int:
+        """Which of `shards` equal account-number ranges num falls in."""
+        i = (num - AccountStore._FIRST_NUMBER) * shards // AccountStore._NUMBER_RANGE
+        return 0 if i < 0 else (shards - 1 if i >= shards else i)
+
+    def shardOf(self, num: int) -> int:
+        """Index of the shard (account-number range) that owns num."""
+        return AccountStore.shardIndex(num, len(self._locks))
+
+    def _lockFor(self, num: int):
+        return self._locks[self.shardOf(num)]
+
+    def _writeLockFor(self, num: int):
+        # A write waits for its journal fsync after letting go of the shard (see Journal.deferring)
+        lock = self._locks[self.shardOf(num)]
+        return lock if self._journal is None else self._journal.deferring(lock)
+
+    def _deferAcks(self):
+        return nullcontext() if self._journal is None else self._journal.deferring()
+
+    @contextmanager
+    def exclusive(self):
+        """
+        Hold every shard lock (acquired in shard order) for the duration of the
+        block. Journal records appended inside are waited for after the release.
+        """
+        with self._deferAcks():
+            for lock in self._locks:
+                lock.acquire()
+            try:
+                yield
+            finally:
+                for lock in reversed(self._locks):
+                    lock.release()
+
+    # ---------- Lookup ----------
+    def _home(self, num: int, mask: int) -> int:
+        return ((num * 0x9E3779B1) >> 7) & mask
+
+    def _probe(self, num: int) -> int:
+        """Return the hash slot holding num, or the empty slot where it would go."""
+        slots, numbers = self._slots, self._numbers
+        mask = len(slots) - 1
+        i = self._home(num, mask)
+        while True:
+            r = slots[i]
+            if r < 0 or numbers[r] == num:
+                return i
+            i = (i + 1) & mask
+
+    def _find(self, num: int) -> int:
+        """Row index of num, or -1."""
+        r = self._slots[self._probe(num)]
+        if r >= 0 or not self._base:
+            return r
+        i = bisect_left(self._numbers, num, 0, self._base)
+        if i < self._base and self._numbers[i] == num and i not in self._dead:
+            return i
+        return -1
+
+    def _row(self, num: int) -> int:
+        r = self._find(num)
+        if r < 0:
+            raise KeyError(num)
+        return r
+
+    def _grow(self):
+        slots = array("q", [AccountStore._EMPTY]) * (len(self._slots) * 2)
+        self._slots = slots
+        mask = len(slots) - 1
+        numbers = self._numbers
+        for r in range(self._base, len(numbers)):
+            i = self._home(numbers[r], mask)
+            while slots[i] >= 0:
+                i = (i + 1) & mask
+            slots[i] = r
+
+    def _unlink(self, slot: int):
+        """Empty a slot using backward-shift deletion (no tombstones)."""
+        slots, numbers = self._slots, self._numbers
+        mask = len(slots) - 1
+        i = j = slot
+        while True:
+            j = (j + 1) & mask
+            r = slots[j]
+            if r < 0:
+                break
+            k = self._home(numbers[r], mask)
+            # Leave the entry where it is if its home lies cyclically in (i, j]
+            if (i <= j and i < k <= j) or (i > j and (k > i or k <= j)):
+                continue
+            slots[i] = r
+            i = j
+        slots[i] = AccountStore._EMPTY
+
+    # ---------- Introspection ----------
+    def __len__(self) -> int:
+        return len(self._numbers) - len(self._dead)
+
+    def contains(self, num: int) -> bool:
+        with self._lockFor(num):
+            return self._find(num) >= 0
+
+    def balanceColumn(self, write: bool = False):
+        """
+        The live balance column (row order); used by whole-bank batch operations,
+        which must hold exclusive() while using it. Ask with write=True before
+        changing balances in it, so open read views keep the old ones.
+        Dead rows always hold 0, so loops that skip non-positive balances skip them.
+        """
+        if write and self._views:
+            for p in range((len(self._balances) >> AccountStore._PAGE_BITS) + 1):
+                self._savePage(p)
+        return self._balances
+
+    def numberColumn(self):
+        """The account-number column (row order); same rules as balanceColumn()."""
+        return self._numbers
+
+    def classColumn(self):
+        """The account-class column (row order); same rules as balanceColumn()."""
+        return self._classes
+
+    def layoutVersion(self) -> int:
+        """Changes whenever rows are added or removed, i.e. whenever a row index may stop meaning the same account."""
+        return self._layoutVersion
+
+    def partitionRows(self, parts: int) -> list:
+        """
+        Live rows split into `parts` equal account-number ranges (as shardIndex
+        splits them): a list of row-index arrays, one per range. Caller holds exclusive().
+        """
+        groups = [array("q") for _ in range(parts)]
+        numbers, base, dead = self._numbers, self._base, self._dead
+        # Base rows are sorted, so each range of them is one slice
+        start = 0
+        for i in range(parts):
+            # The smallest number shardIndex puts in range i + 1
+            bound = AccountStore._FIRST_NUMBER - (-(i + 1) * AccountStore._NUMBER_RANGE // parts)
+            end = base if i == parts - 1 else bisect_left(numbers, bound, 0, base)
+            groups[i].extend(r for r in range(start, end) if r not in dead)
+            start = end
+        shard = AccountStore.shardIndex
+        for r in range(base, len(numbers)):
+            groups[shard(numbers[r], parts)].append(r)
+        return groups
+
+    def accountNumbers(self):
+        # Copy so callers can add/remove while iterating
+        with self.exclusive():
+            if not self._dead:
+                return list(self._numbers)
+            dead = self._dead
+            return [num for r, num in enumerate(self._numbers) if r not in dead]
+
+    # ---------- Row insert/remove ----------
+    def _materialize(self):
+        """Copy mapped snapshot columns into growable arrays before the first append/pop."""
+        if self._mapped is None:
+            return
+        for name, typecode, width in AccountStore._SNAPSHOT_COLUMNS:
+            if width > 1:
+                col = bytearray(getattr(self, name))
+            else:
+                col = array(typecode)
+                col.frombytes(getattr(self, name).cast("B"))
+            setattr(self, name, col)
+        self._mapped = None
+
+    def addRow(self, num: int, first: str, last: str, ssn: str, pin, balanceInCents: int) -> bool:
+        """
+        Append a row. pin is a 4-digit PIN (hashed here), an existing hash
+        (bytes, or hex as found in the journal), or "" for none.
+        Returns False if num is already present.
+        """
+        # Hash before taking the locks: it is slow on purpose
+        pin_hash = AccountStore._encodePIN(pin)
+        with self.exclusive():
+            return self._addRow(num, first, last, ssn, pin_hash, balanceInCents)
+
+    def _addRow(self, num, first, last, ssn, pinHash: bytes, balanceInCents) -> bool:
+        if self._find(num) >= 0:
+            return False
+        self._materialize()
+        if (len(self._numbers) - self._base + 1) * 2 > len(self._slots):
+            self._grow()
+        if self._journal is not None:
+            self._journal.append(["O", num, first, last, ssn, pinHash.hex(), balanceInCents])
+        self._saveRow(len(self._numbers))
+        self._layoutVersion += 1
+        self._slots[self._probe(num)] = len(self._numbers)
+        self._numbers.append(num)
+        self._balances.append(balanceInCents)
+        self._pinHashes += pinHash
+        self._failedPINs.append(0)
+        self._classes.append(0)
+        self._firstNames.append(self._names.intern(first))
+        self._lastNames.append(self._names.intern(last))
+        self._ssns.append(self._encodeSSN(ssn))
+        self._track(num, None, balanceInCents)
+        if self._bySSN is not None:
+            with self._indexLock:
+                self._indexAdd(num, AccountStore._nameKey(last, first), self._ssnKey(self._ssns[-1]))
+        return True
+
+    def removeRow(self, num: int) -> bool:
+        """Remove a row by moving the last row into its place. Returns False if not found."""
+        with self.exclusive():
+            return self._removeRow(num)
+
+    def _removeRow(self, num: int) -> bool:
+        r = self._find(num)
+        if r < 0:
+            return False
+        if self._journal is not None:
+            self._journal.append(["C", num])
+        if self._bySSN is not None:
+            with self._indexLock:
+                self._indexRemove(num, self._rowNameKey(r), self._ssnKey(self._ssns[r]))
+        self._track(num, self._balances[r], None)
+        self._saveRow(r)
+        self._layoutVersion += 1
+        if r < self._base:
+            self._dead.add(r)
+            self._balances[r] = 0
+            return True
+        self._materialize()
+        self._unlink(self._probe(num))
+        last = len(self._numbers) - 1
+        self._saveRow(last)
+        if r != last:
+            moved = self._numbers[last]
+            self._slots[self._probe(moved)] = r
+            for col in self._columns():
+                col[r] = col[last]
+            w = AccountStore._PIN_WIDTH
+            self._pinHashes[r * w:(r + 1) * w] = self._pinHashes[last * w:]
+        for col in self._columns():
+            col.pop()
+        del self._pinHashes[last * AccountStore._PIN_WIDTH:]
+        return True
+
+    def _columns(self):
+        # One-item-per-row columns; _pinHashes is handled alongside them
+        return (self._numbers, self._balances, self._failedPINs, self._classes,
+                self._firstNames, self._lastNames, self._ssns)
+
+    # ---------- Field access ----------
+    @staticmethod
+    def _encodePIN(pin) -> bytes:
+        if isinstance(pin, (bytes, bytearray, memoryview)):
+            if len(pin) != AccountStore._PIN_WIDTH:
+                raise ValueError("PIN hash has the wrong size.")
+            return bytes(pin)
+        pin = str(pin)
+        if pin == "":
+            return AccountStore._NO_PIN
+        if len(pin) == 2 * AccountStore._PIN_WIDTH:
+            return bytes.fromhex(pin)    # already hashed (journal replay)
+        if not (len(pin) == 4 and pin.isascii() and pin.isdigit()):
+            raise ValueError("PIN must be exactly 4 digits.")
+        return BankUtility.hashPIN(pin)
+
+    def _encodeSSN(self, ssn: str) -> int:
+        if len(ssn) == 9 and ssn.isascii() and ssn.isdigit():
+            return int(ssn)
+        return -(self._ssnTable.intern(ssn) + 1)
+
+    def _decodeSSN(self, code: int) -> str:
+        if code >= 0:
+            return f"{code:09d}"
+        return self._ssnTable.get(-code - 1)
+
+    @staticmethod
+    def fits(*cents: int) -> bool:
+        """True if every value fits a balance column (and a ledger amount)."""
+        return AccountStore.MIN_CENTS <= min(cents) and max(cents) <= AccountStore.MAX_CENTS
+
+    def getBalance(self, num: int) -> int:
+        with self._lockFor(num):
+            return self._balances[self._row(num)]
+
+    def setBalance(self, num: int, cents: int):
+        with self._writeLockFor(num):
+            r = self._row(num)
+            old = self._balances[r]
+            # Checked before journaling: a record that cannot be applied would fail every replay
+            if not AccountStore.fits(cents, cents - old):
+                raise ValueError(f"A balance of {cents} cents is out of range.")
+            position = self._replayPosition if self._journal is None else self._journal.append(["B", num, cents])
+            if self._ledger is not None and cents != old:
+                self._ledger.append(num, Ledger.ADJUSTMENT, cents - old, 0, cents, position=position)
+            self._saveRow(r)
+            self._balances[r] = cents
+            self._track(num, old, cents)
+
+    def _completed(self, key: str | None, request: tuple):
+        """Earlier result of a keyed request, or None (caller holds the shard lock(s) of its accounts)."""
+        if key is None:
+            return None
+        IdempotencyCache.checkKey(key)
+        return None if self._dedup is None else self._dedup.get(key, request)
+
+    def _journalKeyed(self, record: list, key: str | None, keyTime: float | None, kind: int | None = None) -> int:
+        # Returns the record's position (the replayed one's when no journal is attached).
+        # A key is journaled as [key, keyTime], so replay can give it back its expiry.
+        # kind: a ledger kind other than the usual one, so a rebuilt ledger entry gets it too
+        if self._journal is None:
+            return self._replayPosition
+        field = None if key is None else [key, keyTime]
+        if kind is not None:
+            record += [field, kind]
+        elif field is not None:
+            record.append(field)
+        return self._journal.append(record)
+
+    def _remember(self, key: str | None, request: tuple, result, keyTime: float | None):
+        if key is not None and self._dedup is not None:
+            self._dedup.put(key, request, result, keyTime + self._dedup.ttlSeconds)
+
+    def addToBalance(self, num: int, deltaInCents: int, kind: int | None = None, key: str | None = None,
+                     keyTime: float | None = None) -> int | None:
+        """
+        Add (or with a negative delta, take) cents. kind is the Ledger entry kind; by
+        default deposit/withdrawal. A repeated idempotency key returns the first result.
+        keyTime is when the keyed request completed (time.time(); default now),
+        given by replay so the key expires when it first would have.
+        Returns the new balance, or None (and changes nothing) if it would not fit
+        the balance column.
+        """
+        with self._writeLockFor(num):
+            done = self._completed(key, ("D", num, deltaInCents))
+            if done is not None:
+                return done
+            r = self._row(num)
+            old = self._balances[r]
+            bal = old + deltaInCents
+            if not AccountStore.fits(deltaInCents, bal):
+                return None
+            usual = Ledger.DEPOSIT if deltaInCents >= 0 else Ledger.WITHDRAWAL
+            if kind is None:
+                kind = usual
+            if key is not None and keyTime is None:
+                keyTime = round(time.time(), 3)
+            position = self._journalKeyed(["D", num, deltaInCents], key, keyTime, None if kind == usual else kind)
+            self._saveRow(r)
+            self._balances[r] = bal
+            self._track(num, old, bal)
+            if self._ledger is not None:
+                self._ledger.append(num, kind, deltaInCents, 0, bal, position=position)
+            self._remember(key, ("D", num, deltaInCents), bal, keyTime)
+            return bal
+
+    def withdrawIfFunded(self, num: int, amountInCents: int, kind: int = Ledger.WITHDRAWAL,
+                         key: str | None = None, keyTime: float | None = None) -> int | None:
+        """
+        Check-and-withdraw under one lock. Returns the new balance, or None if funds are
+        short (or the amount is out of range). Journaled as a negative deposit, so a key is shared with addToBalance(num, -amountInCents).
+        """
+        with self._writeLockFor(num):
+            done = self._completed(key, ("D", num, -amountInCents))
+            if done is not None:
+                return done
+            r = self._row(num)
+            bal = self._balances[r]
+            if bal < amountInCents or not AccountStore.fits(-amountInCents, bal - amountInCents):
+                return None
+            if key is not None and keyTime is None:
+                keyTime = round(time.time(), 3)
+            position = self._journalKeyed(["D", num, -amountInCents], key, keyTime,
+                                          None if kind == Ledger.WITHDRAWAL else kind)
+            self._saveRow(r)
+            self._balances[r] = bal - amountInCents
+            self._track(num, bal, bal - amountInCents)
+            if self._ledger is not None:
+                self._ledger.append(num, kind, -amountInCents, 0, bal - amountInCents, position=position)
+            self._remember(key, ("D", num, -amountInCents), bal - amountInCents, keyTime)
+            return bal - amountInCents
+
+    def transfer(self, src: int, dst: int, amountInCents: int, key: str | None = None,
+                 keyTime: float | None = None) -> tuple[int, int] | None:
+        """
+        Move cents from src to dst as a single journal record, holding both shard
+        locks. Returns the (src, dst) balances afterwards, or None (and moves
+        nothing) if either account is missing, src has insufficient funds or
+        either balance would leave the balance column's range.
+        A repeated idempotency key returns the balances from the first time.
+        """
+        a, b = self.shardOf(src), self.shardOf(dst)
+        first, second = self._locks[min(a, b)], self._locks[max(a, b)]
+        with self._deferAcks(), first:
+            if second is not first:
+                second.acquire()
+            try:
+                done = self._completed(key, ("T", src, dst, amountInCents))
+                if done is not None:
+                    return done
+                rs, rd = self._find(src), self._find(dst)
+                if rs < 0 or rd < 0 or self._balances[rs] < amountInCents:
+                    return None
+                old_src, old_dst = self._balances[rs], self._balances[rd]
+                src_bal, dst_bal = old_src - amountInCents, old_dst + amountInCents
+                if not AccountStore.fits(amountInCents, -amountInCents, src_bal, dst_bal):
+                    return None
+                if key is not None and keyTime is None:
+                    keyTime = round(time.time(), 3)
+                position = self._journalKeyed(["T", src, dst, amountInCents], key, keyTime)
+                self._saveRow(rs)
+                self._saveRow(rd)
+                self._balances[rs] = src_bal
+                self._balances[rd] = dst_bal
+                self._track(src, old_src, src_bal)
+                self._track(dst, old_dst, dst_bal)
+                if self._ledger is not None:
+                    self._ledger.append(src, Ledger.TRANSFER_OUT, -amountInCents, dst, src_bal, position=position)
+                    self._ledger.append(dst, Ledger.TRANSFER_IN, amountInCents, src, dst_bal, position=position)
+                self._remember(key, ("T", src, dst, amountInCents), (src_bal, dst_bal), keyTime)
+                return src_bal, dst_bal
+            finally:
+                if second is not first:
+                    second.release()
+
+    def getPINHash(self, num: int) -> bytes:
+        w = AccountStore._PIN_WIDTH
+        with self._lockFor(num):
+            r = self._row(num)
+            return bytes(self._pinHashes[r * w:(r + 1) * w])
+
+    def checkPIN(self, num: int, pin: str) -> bool:
+        """Verify pin against the stored hash (slow; runs outside the shard lock)."""
+        return BankUtility.verifyPIN(pin, self.getPINHash(num))
+
+    def setPIN(self, num: int, pin):
+        pin_hash = AccountStore._encodePIN(pin)
+        w = AccountStore._PIN_WIDTH
+        with self._writeLockFor(num):
+            r = self._row(num)
+            if self._journal is not None:
+                self._journal.append(["P", num, pin_hash.hex()])
+            self._pinHashes[r * w:(r + 1) * w] = pin_hash
+
+    def getFailedPINAttempts(self, num: int) -> int:
+        with self._lockFor(num):
+            return self._failedPINs[self._row(num)]
+
+    def setFailedPINAttempts(self, num: int, count: int):
+        with self._writeLockFor(num):
+            r = self._row(num)
+            if self._failedPINs[r] == count:
+                return
+            if self._journal is not None:
+                self._journal.append(["X", num, count])
+            self._failedPINs[r] = count
+
+    def recordFailedPIN(self, num: int) -> int:
+        """Count one more failed PIN attempt; returns the new count."""
+        with self._writeLockFor(num):
+            r = self._row(num)
+            count = min(self._failedPINs[r] + 1, 0xFFFF)
+            if self._journal is not None:
+                self._journal.append(["X", num, count])
+            self._failedPINs[r] = count
+            return count
+
+    def getAccountClass(self, num: int) -> int:
+        with self._lockFor(num):
+            return self._classes[self._row(num)]
+
+    def setAccountClass(self, num: int, accountClass: int):
+        if not 0 <= accountClass <= 255:
+            raise ValueError("Account class must be between 0 and 255.")
+        with self._writeLockFor(num):
+            r = self._row(num)
+            if self._journal is not None:
+                self._journal.append(["K", num, accountClass])
+            self._saveRow(r)
+            self._classes[r] = accountClass
+
+    def getFirstName(self, num: int) -> str:
+        with self._lockFor(num):
+            return self._names.get(self._firstNames[self._row(num)])
+
+    def setFirstName(self, num: int, name: str):
+        with self._writeLockFor(num):
+            r = self._row(num)
+            if self._journal is not None:
+                self._journal.append(["F", num, name])
+            old_key = self._rowNameKey(r) if self._bySSN is not None else None
+            self._firstNames[r] = self._names.intern(name)
+            if old_key is not None:
+                self._reindexName(num, old_key, self._rowNameKey(r))
+
+    def getLastName(self, num: int) -> str:
+        with self._lockFor(num):
+            return self._names.get(self._lastNames[self._row(num)])
+
+    def setLastName(self, num: int, name: str):
+        with self._writeLockFor(num):
+            r = self._row(num)
+            if self._journal is not None:
+                self._journal.append(["L", num, name])
+            old_key = self._rowNameKey(r) if self._bySSN is not None else None
+            self._lastNames[r] = self._names.intern(name)
+            if old_key is not None:
+                self._reindexName(num, old_key, self._rowNameKey(r))
+
+    def getSSN(self, num: int) -> str:
+        with self._lockFor(num):
+            return self._decodeSSN(self._ssns[self._row(num)])
+
+    def setSSN(self, num: int, ssn: str):
+        with self._writeLockFor(num):
+            r = self._row(num)
+            if self._journal is not None:
+                self._journal.append(["S", num, ssn])
+            old_code = self._ssns[r]
+            self._ssns[r] = self._encodeSSN(ssn)
+            if self._bySSN is not None:
+                with self._indexLock:
+                    AccountStore._bucketRemove(self._bySSN, self._ssnKey(old_code), num)
+                    AccountStore._bucketAdd(self._bySSN, self._ssnKey(self._ssns[r]), num)
+
+    # ---------- Aggregates ----------
+    @staticmethod
+    def _count(stats: list, bal: int, sign: int):
+        stats[AccountStore._STATS_ACCOUNTS] += sign
+        stats[AccountStore._STATS_TOTAL] += sign * bal
+        if bal != 0:
+            stats[AccountStore._STATS_NONZERO] += sign
+        if bal < 0:
+            stats[AccountStore._STATS_NEGATIVE] += sign
+        else:
+            stats[AccountStore._STATS_BUCKETS + bal.bit_length()] += sign
+
+    def _track(self, num: int, old: int | None, new: int | None):
+        # Caller holds num's shard lock (or exclusive()); None = no row
+        if self._stats is None:
+            return
+        stats = self._stats[self.shardOf(num)]
+        if old is not None:
+            AccountStore._count(stats, old, -1)
+        if new is not None:
+            AccountStore._count(stats, new, 1)
+
+    def noteBalanceChange(self, num: int, old: int, new: int):
+        """Keep report() current after writing balanceColumn() directly (caller holds exclusive())."""
+        self._track(num, old, new)
+
+    def _buildStats(self):
+        """One pass over every live row; afterwards each balance change updates the shard's aggregates."""
+        shards = len(self._locks)
+        # Python ints: a total of int64 balances can itself pass 2**63
+        stats = [[0] * AccountStore._STATS_SIZE for _ in range(shards)]
+        dead = self._dead
+        count = AccountStore._count
+        for r, (num, bal) in enumerate(zip(self._numbers, self._balances)):
+            if r not in dead:
+                count(stats[AccountStore.shardIndex(num, shards)], bal, 1)
+        self._stats = stats
+
+    def report(self) -> dict:
+        """
+        Bank-wide aggregates: accounts, totalCents, nonZeroAccounts, positiveAccounts,
+        negativeAccounts and histogram, a list of (low, high, count) for balances
+        low <= cents < high, where the first bucket is exactly 0 and bucket k covers
+        [2**(k-1), 2**k). Only non-empty buckets are listed.
+        """
+        with self.exclusive():
+            if self._stats is None:
+                self._buildStats()
+            totals = [0] * AccountStore._STATS_SIZE
+            for stats in self._stats:
+                for i, v in enumerate(stats):
+                    totals[i] += v
+        buckets = totals[AccountStore._STATS_BUCKETS:]
+        histogram = [(0 if k == 0 else 1 << (k - 1), 1 << k if k else 1, n)
+                     for k, n in enumerate(buckets) if n]
+        return {
+            "accounts": totals[AccountStore._STATS_ACCOUNTS],
+            "totalCents": totals[AccountStore._STATS_TOTAL],
+            "nonZeroAccounts": totals[AccountStore._STATS_NONZERO],
+            "positiveAccounts": totals[AccountStore._STATS_NONZERO] - totals[AccountStore._STATS_NEGATIVE],
+            "negativeAccounts": totals[AccountStore._STATS_NEGATIVE],
+            "histogram": histogram,
+        }
+
+    # ---------- Read views ----------
+    def readView(self) -> "BalanceView":
+        """A point-in-time view of every account's number, balance and class; see BalanceView."""
+        # The locks are held only to pick the moment: no write is half done
+        with self.exclusive():
+            self._viewVersion += 1
+            token = next(self._viewTokens)
+            pages = self._views[token] = {}
+            return BalanceView(self, token, pages, len(self._numbers), frozenset(self._dead))
+
+    def _closeView(self, token: int):
+        # Its saved pages go with it; needs no lock, as a garbage-collected view may close anywhere
+        self._views.pop(token, None)
+
+    @staticmethod
+    def _copyRows(col, typecode: str, lo: int, hi: int) -> array:
+        chunk = col[lo:hi]
+        # Slicing a mapped snapshot column gives a view of it, not a copy
+        return chunk if isinstance(chunk, array) else array(typecode, chunk.tobytes())
+
+    def _saveRow(self, r: int):
+        """
+        Call before changing row r (holding its shard lock, or exclusive()). While
+        views are open, the first change to a page since the newest one opened
+        saves the page for them; otherwise this is one truth test.
+        """
+        if self._views and self._pageVersions.get(r >> AccountStore._PAGE_BITS, -1) < self._viewVersion:
+            self._savePage(r >> AccountStore._PAGE_BITS)
+
+    def _savePage(self, p: int):
+        # Shard locks do not cover pages, so two shards' writers may race to save one
+        with self._pageLock:
+            version = self._viewVersion
+            if self._pageVersions.get(p, -1) >= version:
+                return
+            lo = p << AccountStore._PAGE_BITS
+            hi = lo + (1 << AccountStore._PAGE_BITS)
+            saved = tuple(AccountStore._copyRows(getattr(self, name), typecode, lo, hi)
+                          for name, typecode in AccountStore._VERSIONED)
+            # Views that already have the page saw an older version of it
+            for pages in list(self._views.values()):
+                pages.setdefault(p, saved)
+            self._pageVersions[p] = version
+
+    # ---------- Secondary indexes ----------
+    @staticmethod
+    def _nameKey(last: str, first: str) -> str:
+        return f"{last.casefold()}\0{first.casefold()}"
+
+    def _rowNameKey(self, r: int) -> str:
+        names = self._names
+        return AccountStore._nameKey(names.get(self._lastNames[r]), names.get(self._firstNames[r]))
+
+    def _ssnKey(self, code: int):
+        # 9-digit SSNs are their own key; interned ids are not unique across a
+        # snapshot reload, so other SSNs are keyed by the string itself
+        return code if code >= 0 else self._ssnTable.get(-code - 1)
+
+    @staticmethod
+    def _bucketAdd(index: dict, key, num: int) -> bool:
+        """Add num under key; True if key is new. A bucket is an int until it holds two numbers."""
+        bucket = index.get(key)
+        if bucket is None:
+            index[key] = num
+            return True
+        if isinstance(bucket, set):
+            bucket.add(num)
+        elif bucket != num:
+            index[key] = {bucket, num}
+        return False
+
+    @staticmethod
+    def _bucketRemove(index: dict, key, num: int) -> bool:
+        """Remove num from key's bucket; True if the key is now gone."""
+        bucket = index.get(key)
+        if isinstance(bucket, set):
+            bucket.discard(num)
+            if len(bucket) == 1:
+                index[key] = next(iter(bucket))
+            return False
+        if bucket == num:
+            del index[key]
+            return True
+        return False
+
+    @staticmethod
+    def _bucketNumbers(bucket) -> list:
+        return sorted(bucket) if isinstance(bucket, set) else [bucket]
+
+    def _indexAdd(self, num: int, nameKey: str, ssnKey):
+        # Caller holds _indexLock
+        AccountStore._bucketAdd(self._bySSN, ssnKey, num)
+        if AccountStore._bucketAdd(self._byName, nameKey, num):
+            insort(self._nameKeys, nameKey)
+
+    def _indexRemove(self, num: int, nameKey: str, ssnKey):
+        # Caller holds _indexLock
+        AccountStore._bucketRemove(self._bySSN, ssnKey, num)
+        if AccountStore._bucketRemove(self._byName, nameKey, num):
+            keys = self._nameKeys
+            del keys[bisect_left(keys, nameKey)]
+
+    def _reindexName(self, num: int, oldKey: str, newKey: str):
+        if oldKey == newKey:
+            return
+        with self._indexLock:
+            if AccountStore._bucketRemove(self._byName, oldKey, num):
+                keys = self._nameKeys
+                del keys[bisect_left(keys, oldKey)]
+            if AccountStore._bucketAdd(self._byName, newKey, num):
+                insort(self._nameKeys, newKey)
+
+    def _buildIndexes(self):
+        """Build both indexes with one pass over the rows (first query only)."""
+        if self._bySSN is not None:
+            return
+        with self.exclusive():
+            if self._bySSN is not None:
+                return
+            by_ssn, by_name = {}, {}
+            folded = {}          # name id -> casefolded name
+            names = self._names
+            dead = self._dead
+            for r, num in enumerate(self._numbers):
+                if r in dead:
+                    continue
+                first_id, last_id = self._firstNames[r], self._lastNames[r]
+                first = folded.get(first_id)
+                if first is None:
+                    first = folded[first_id] = names.get(first_id).casefold()
+                last = folded.get(last_id)
+                if last is None:
+                    last = folded[last_id] = names.get(last_id).casefold()
+                AccountStore._bucketAdd(by_name, f"{last}\0{first}", num)
+                AccountStore._bucketAdd(by_ssn, self._ssnKey(self._ssns[r]), num)
+            with self._indexLock:
+                self._byName = by_name
+                self._nameKeys = sorted(by_name)
+                self._bySSN = by_ssn
+
+    def numbersBySSN(self, ssn: str, limit: int = 50, after: int | None = None) -> tuple[list, int | None]:
+        """
+        Account numbers owned by ssn in ascending order, at most `limit` of them,
+        starting after account number `after`. Returns (numbers, cursor): pass the
+        cursor as `after` for the next page; it is None on the last page.
+        """
+        self._buildIndexes()
+        with self._indexLock:
+            bucket = self._bySSN.get(int(ssn) if len(ssn) == 9 and ssn.isascii() and ssn.isdigit() else ssn)
+            nums = [] if bucket is None else AccountStore._bucketNumbers(bucket)
+        if after is not None:
+            nums = nums[bisect_left(nums, after + 1):]
+        page = nums[:limit]
+        return page, (page[-1] if len(nums) > limit else None)
+
+    def numbersByName(self, lastName: str, firstName: str | None = None, limit: int = 50,
+                      after: tuple | None = None) -> tuple[list, tuple | None]:
+        """
+        Account numbers whose owner's last name starts with lastName (case-insensitive),
+        ordered by last name, first name, account number. With firstName given,
+        the last name must match exactly and the first name starts with firstName.
+        Returns (numbers, cursor): pass the cursor as `after` for the next page;
+        it is None on the last page.
+        """
+        self._buildIndexes()
+        prefix = lastName.casefold() if firstName is None else AccountStore._nameKey(lastName, firstName)
+        page = []
+        with self._indexLock:
+            keys, by_name = self._nameKeys, self._byName
+            i = bisect_left(keys, prefix if after is None else max(prefix, after[0]))
+            while i < len(keys) and keys[i].startswith(prefix) and len(page) <= limit:
+                key = keys[i]
+                nums = AccountStore._bucketNumbers(by_name[key])
+                if after is not None and key == after[0]:
+                    nums = nums[bisect_left(nums, after[1] + 1):]
+                page.extend((key, num) for num in nums[:limit + 1 - len(page)])
+                i += 1
+        cursor = page[limit - 1] if len(page) > limit else None
+        return [num for _, num in page[:limit]], cursor
+
+    # ---------- Snapshots ----------
+    @staticmethod
+    def _pad8(n: int) -> int:
+        return (n + 7) & ~7
+
+    def writeSnapshot(self, path: str, journalOffset: int):
+        """
+        Write every live row, sorted by account number, to path (atomically via a
+        temp file + rename). journalOffset is where replay should resume.
+        The caller must hold exclusive() so the journal offset matches the rows.
+        """
+        numbers = self._numbers
+        dead = self._dead
+        order = sorted((r for r in range(len(numbers)) if r not in dead), key=numbers.__getitem__)
+
+        # Re-intern strings so the heaps only hold what live rows reference
+        names, ssn_table = _InternTable(), _InternTable()
+        old_names, old_ssns = self._names, self._ssnTable
+        first_ids = array("I", (names.intern(old_names.get(self._firstNames[r])) for r in order))
+        last_ids = array("I", (names.intern(old_names.get(self._lastNames[r])) for r in order))
+        ssn_codes = array("q")
+        for r in order:
+            code = self._ssns[r]
+            if code < 0:
+                code = -(ssn_table.intern(old_ssns.get(-code - 1)) + 1)
+            ssn_codes.append(code)
+
+        w = AccountStore._PIN_WIDTH
+        pin_hashes = self._pinHashes
+        columns = (
+            array("q", (numbers[r] for r in order)),
+            array("q", (self._balances[r] for r in order)),
+            b"".join(pin_hashes[r * w:(r + 1) * w] for r in order),
+            array("H", (self._failedPINs[r] for r in order)),
+            array("B", (self._classes[r] for r in order)),
+            first_ids, last_ids, ssn_codes,
+        )
+        header = AccountStore._SNAPSHOT_HEADER.pack(
+            AccountStore._SNAPSHOT_MAGIC, AccountStore._SNAPSHOT_VERSION, 0,
+            len(order), len(names._strings), len(ssn_table._strings), journalOffset)
+
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(header)
+            for col in columns:
+                data = bytes(col)
+                f.write(data)
+                f.write(b"\0" * (AccountStore._pad8(len(data)) - len(data)))
+            for table in (names, ssn_table):
+                encoded = [s.encode() for s in table._strings]
+                offsets = array("Q", [0])
+                for b in encoded:
+                    offsets.append(offsets[-1] + len(b))
+                f.write(offsets.tobytes())
+                f.write(b"".join(encoded))
+                f.write(b"\0" * (AccountStore._pad8(offsets[-1]) - offsets[-1]))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    @classmethod
+    def fromSnapshot(cls, path: str, shards: int = 1) -> tuple["AccountStore", int]:
+        """
+        Map a snapshot written by writeSnapshot. Columns are zero-copy views into
+        a private (copy-on-write) mapping; nothing is decoded up front.
+        Returns (store, journal offset to resume replay from).
+        """
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        view = memoryview(mapped)
+        magic, version, _, rows, name_count, ssn_count, journal_offset = \
+            AccountStore._SNAPSHOT_HEADER.unpack_from(mapped)
+        if magic != AccountStore._SNAPSHOT_MAGIC or version != AccountStore._SNAPSHOT_VERSION:
+            raise ValueError(f"{path} is not a version {AccountStore._SNAPSHOT_VERSION} bank snapshot.")
+
+        store = cls(shards)
+        pos = AccountStore._SNAPSHOT_HEADER.size
+        for name, typecode, width in AccountStore._SNAPSHOT_COLUMNS:
+            size = rows * width * array(typecode).itemsize
+            setattr(store, name, view[pos:pos + size].cast(typecode))
+            pos += AccountStore._pad8(size)
+        for table, count in ((store._names, name_count), (store._ssnTable, ssn_count)):
+            offsets = view[pos:pos + 8 * (count + 1)].cast("Q")
+            pos += 8 * (count + 1)
+            table._baseCount = count
+            table._baseOffsets = offsets
+            table._baseBytes = view[pos:pos + offsets[count]]
+            pos += AccountStore._pad8(offsets[count])
+        store._base = rows
+        store._mapped = mapped
+        return store, journal_offset
+
+
+class BalanceView:
+    """
+    Account numbers, balances and classes as they were at one moment: an MVCC
+    read snapshot (not to be confused with the snapshot files of
+    writeSnapshot). Get one from Bank.readView(); opening it only takes every
+    shard lock for an instant. Scans then run without blocking deposits and
+    transfers: the view reads the live columns, except pages that changed
+    since it opened, which the writers copied aside for it first.
+
+    Close the view when done (or use it in a with block) so its saved pages can
+    be freed; a view that is garbage-collected closes itself.
+
+        with bank.readView() as view:
+            total = sum(view.balances())
+    """
+
+    def __init__(self, store: AccountStore, token: int, pages: dict, rows: int, dead: frozenset):
+        self._store = store
+        self._pages = pages      # page -> saved (numbers, balances, classes), filled in by writers
+        self._rows = rows
+        self._dead = dead
+        self._byNumber = None    # account number -> balance, built if a lookup finds the row moved
+        self._close = weakref.finalize(self, store._closeView, token)
+
+    def close(self):
+        self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._rows - len(self._dead)
+
+    def _page(self, p: int) -> tuple:
+        saved = self._pages.get(p)
+        if saved is not None:
+            return saved
+        lo = p << AccountStore._PAGE_BITS
+        hi = min(lo + (1 << AccountStore._PAGE_BITS), self._rows)
+        store = self._store
+        live = tuple(AccountStore._copyRows(getattr(store, name), typecode, lo, hi)
+                     for name, typecode in AccountStore._VERSIONED)
+        # A writer that changed the page while it was copied saved it for us first
+        saved = self._pages.get(p)
+        return live if saved is None else saved
+
+    def _row(self, r: int) -> tuple | None:
+        """(number, balance) of row r (< the view's row count) as of the view."""
+        p, i = r >> AccountStore._PAGE_BITS, r & ((1 << AccountStore._PAGE_BITS) - 1)
+        saved = self._pages.get(p)
+        if saved is None:
+            store = self._store
+            try:
+                live = store._numbers[r], store._balances[r]
+            except IndexError:
+                live = None
+            saved = self._pages.get(p)
+            if saved is None:
+                return live
+        return saved[0][i], saved[1][i]
+
+    def pages(self):
+        """Yield (numbers, balances, classes) arrays a page at a time, leaving out closed accounts."""
+        size = 1 << AccountStore._PAGE_BITS
+        closed = {}
+        for r in self._dead:
+            closed.setdefault(r >> AccountStore._PAGE_BITS, set()).add(r & (size - 1))
+        for p in range((self._rows + size - 1) >> AccountStore._PAGE_BITS):
+            n = min(size, self._rows - (p << AccountStore._PAGE_BITS))
+            numbers, balances, classes = self._page(p)
+            if p not in closed:
+                yield numbers[:n], balances[:n], classes[:n]
+                continue
+            keep = [i for i in range(n) if i not in closed[p]]
+            yield (array("q", (numbers[i] for i in keep)), array("q", (balances[i] for i in keep)),
+                   array("B", (classes[i] for i in keep)))
+
+    def items(self):
+        """Yield (account number, balance) for every account."""
+        for numbers, balances, _ in self.pages():
+            yield from zip(numbers, balances)
+
+    def balances(self) -> array:
+        """Every account's balance, in one array."""
+        out = array("q")
+        for _, balances, _ in self.pages():
+            out.extend(balances)
+        return out
+
+    def balance(self, num: int) -> int | None:
+        """Balance of num as of the view, or None if it had no such account."""
+        store = self._store
+        with store._lockFor(num):
+            r = store._find(num)
+        # An account that was open then is usually still in the same row
+        if 0 <= r < self._rows and r not in self._dead:
+            row = self._row(r)
+            if row is not None and row[0] == num:
+                return row[1]
+        if self._byNumber is None:
+            self._byNumber = dict(self.items())
+        return self._byNumber.get(num)
@@ -1,23 +1,195 @@
+import json
+import os
+import time
+from array import array
+
 from Account import Account
+from AccountNumberAllocator import AccountNumberAllocator
+from AccountStore import AccountStore
 from BankUtility import BankUtility
+from IdempotencyCache import IdempotencyCache
+from Journal import Journal
+from Ledger import Ledger
+from PostingSchedule import PostingSchedule
 
 class Bank:
     MAX_ACCOUNTS = 100
+    MAX_PIN_ATTEMPTS = 5       # consecutive wrong PINs before an account is locked
+    PIN_LOCKOUT_SECONDS = 900.0    # how long a lock lasts; then the account gets MAX_PIN_ATTEMPTS again
+    IDEMPOTENCY_KEYS = 100000  # most completed keyed requests remembered at once
+    IDEMPOTENCY_TTL = 86400.0  # seconds a completed keyed request is remembered
+
+    def __init__(self, journalPath: str | None = None, syncEvery: int = 1, syncIntervalMs: float | None = None,
+                 snapshotPath: str | None = None, shards: int = 1, allocatorPath: str | None = None,
+                 ledgerPath: str | None = None, idempotencyPath: str | None = None):
+        """
+        With journalPath set, state is rebuilt by replaying that journal and every
+        later mutation is appended to it (see Journal for the sync options).
+        With snapshotPath set as well, an existing snapshot is memory-mapped first
+        and only the journal written after that checkpoint is replayed.
+        shards splits the account-number space into that many locked ranges so
+        threads working on different ranges do not contend (see AccountStore).
+        New account numbers come from an AccountNumberAllocator whose state is kept
+        in allocatorPath (by default the journal path + ".alloc"), so a restart
+        never reissues a number. Every balance change is recorded in a Ledger kept
+        in ledgerPath (by default the journal path + ".ledger"); replay reconciles
+        it with the journal, so changes whose entries were lost in a crash get them.
+        Results of requests made with an idempotency key are remembered in an
+        IdempotencyCache; each checkpoint saves it to idempotencyPath (by default
+        the journal path + ".idem") and replay re-adds the keys journaled since.
+        Each checkpoint also saves the ids of finished month-end posting runs
+        (snapshot path + ".runs"), so posting one of them again does nothing.
+        """
+        if snapshotPath is not None and journalPath is None:
+            raise ValueError("A snapshot needs a journal to record changes made after it.")
+        # Columnar store; Account objects are views created on demand
+        self._store = AccountStore(shards)
+        self._journal = None
+        self._ledger = None
+        self._postings = {}      # run id -> {"schedule", "chunks", "done": set of posted chunks}
+        self._postedRuns = {}    # run id -> PostingSchedule of runs finished before the snapshot
+        self._replayGroups = None    # (chunks, rows per chunk) while replaying a posting run
+        self._replayPosition = 0     # journal position of the record being replayed
+        self._snapshotPath = snapshotPath
+        self._lockedUntil = {}   # locked account -> time.monotonic() its lock ends
+        self._idempotency = IdempotencyCache(self.IDEMPOTENCY_KEYS, self.IDEMPOTENCY_TTL)
+        if idempotencyPath is None and journalPath is not None:
+            idempotencyPath = journalPath + ".idem"
+        self._idempotencyPath = idempotencyPath
+        offset = 0
+        if snapshotPath is not None and os.path.exists(snapshotPath):
+            self._store, offset = AccountStore.fromSnapshot(snapshotPath, shards)
+            journal_size = os.path.getsize(journalPath) if os.path.exists(journalPath) else 0
+            if journal_size < offset:
+                raise RuntimeError("Journal is shorter than the snapshot expects; refusing to start.")
+            if os.path.exists(idempotencyPath):
+                self._idempotency.load(idempotencyPath)
+            if os.path.exists(snapshotPath + ".runs"):
+                with open(snapshotPath + ".runs") as f:
+                    self._postedRuns = {runId: PostingSchedule.fromDict(d) for runId, d in json.load(f).items()}
+        self._store.setIdempotencyCache(self._idempotency)
+        if journalPath is not None:
+            if allocatorPath is None:
+                allocatorPath = journalPath + ".alloc"
+            if ledgerPath is None:
+                ledgerPath = journalPath + ".ledger"
+            # Replayed changes only add the ledger entries a crash kept from the file
+            self._ledger = Ledger(ledgerPath, recoverFrom=offset)
+            self._store.setLedger(self._ledger)
+            Journal.replay(journalPath, self._applyRecord, offset, positions=True)
+            self._replayPosition = 0
+            self._store.setReplayPosition(0)
+            self._ledger.endRecovery()
+            self._journal = Journal(journalPath, syncEvery, syncIntervalMs)
+            self._store.setJournal(self._journal)
+        else:
+            self._ledger = Ledger(ledgerPath)
+            self._store.setLedger(self._ledger)
+        self._allocator = AccountNumberAllocator(allocatorPath)
+
+    def _applyRecord(self, record: list, position: int = 0):
+        """Re-apply one journal record (journaling is off while replaying)."""
+        kind, num = record[0], record[1]
+        store = self._store
+        self._replayPosition = position
+        store.setReplayPosition(position)
+        if kind == "D":
+            store.addToBalance(num, record[2], record[4] if len(record) > 4 else None,
+                               *Bank._journaledKey(record[3] if len(record) > 3 else None))
+        elif kind == "T":
+            store.transfer(num, record[2], record[3], *Bank._journaledKey(record[4] if len(record) > 4 else None))
+        elif kind == "O":
+            store.addRow(num, *record[2:])
+            self._replayGroups = None
+        elif kind == "C":
+            store.removeRow(num)
+            self._replayGroups = None
+        elif kind == "B":
+            store.setBalance(num, record[2])
+        elif kind == "P":
+            store.setPIN(num, record[2])
+        elif kind == "F":
+            store.setFirstName(num, record[2])
+        elif kind == "L":
+            store.setLastName(num, record[2])
+        elif kind == "S":
+            store.setSSN(num, record[2])
+        elif kind == "X":
+            store.setFailedPINAttempts(num, record[2])
+        elif kind == "K":
+            store.setAccountClass(num, record[2])
+        elif kind == "I":
+            self.applyMonthlyInterest(num)
+        elif kind == "Q":
+            self._postings[num] = {"schedule": PostingSchedule.fromDict(record[2]), "chunks": record[3],
+                                   "done": set()}
+        elif kind == "M":
+            self._replayPostedChunk(num, record[2])
+        else:
+            raise ValueError(f"Unknown journal record: {record!r}")
+
+    @staticmethod
+    def _journaledKey(field) -> tuple:
+        # (key, time it completed): journaled as [key, time], or a bare key (or None) from older journals
+        return tuple(field) if isinstance(field, list) else (field, None)
+
+    def sync(self):
+        """Force everything journaled so far (and the ledger) to disk."""
+        if self._journal is not None:
+            self._journal.sync()
+        self._ledger.flush()
+
+    def checkpoint(self):
+        """
+        Write a snapshot of every account that records the current journal
+        position, so the next startup only replays what comes after it.
+        """
+        if self._snapshotPath is None:
+            raise RuntimeError("Bank was created without a snapshot path.")
+        if self.pendingPostingRuns():
+            # Replay needs the run's schedule, which is only in the journal
+            raise RuntimeError("Finish the month-end posting run(s) "
+                               f"{', '.join(map(str, self.pendingPostingRuns()))} before a checkpoint.")
+        with self._store.exclusive():
+            # Saved first: a crash in between replays the whole journal over it, which is harmless.
+            # The ledger too: replay after the snapshot can only rebuild entries of later records
+            if self._idempotencyPath is not None:
+                self._idempotency.save(self._idempotencyPath)
+            self._savePostedRuns(self._snapshotPath + ".runs")
+            offset = self._journal.size()
+            self._ledger.checkpoint(offset)
+            self._store.writeSnapshot(self._snapshotPath, offset)
+
+    def _savePostedRuns(self, path: str):
+        # Atomically, like IdempotencyCache.save(); every run is finished (checkpoint() checked)
+        runs = {runId: schedule.toDict() for runId, schedule in self._postedRuns.items()}
+        runs.update((runId, run["schedule"].toDict()) for runId, run in self._postings.items())
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(runs, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
 
-    def __init__(self):
-        # Use a dict for O(1) lookups by account number
-        self._accounts = {}  # {int accountNumber -> Account}
+    def close(self):
+        if self._journal is not None:
+            self._store.setJournal(None)
+            self._journal.close()
+            self._journal = None
+        self._store.setLedger(None)
+        self._ledger.close()
 
     # ---------- Introspection ----------
     def countAccounts(self) -> int:
-        return len(self._accounts)
+        return len(self._store)
 
     def isFull(self) -> bool:
-        return self.countAccounts() >= Bank.MAX_ACCOUNTS
+        # Looked up on the instance so a single bank can raise its own limit
+        return self.countAccounts() >= self.MAX_ACCOUNTS
 
     def getAllAccounts(self):
         # Returns a list (copy) so external code can iterate safely
-        return list(self._accounts.values())
+        return [Account._view(self._store, num) for num in self._store.accountNumbers()]
 
     # ---------- Core operations ----------
     def addAccountToBank(self, account: Account) -> bool:
@@ -30,22 +202,370 @@ class Bank:
         acct_num = account.getAccountNumber()
         if acct_num is None:
             raise ValueError("Account must have an account number before adding to bank.")
-        if acct_num in self._accounts:
-            return False
-        self._accounts[acct_num] = account
-        return True
+        added = self._store.addRow(
+            acct_num,
+            account.getOwnerFirstName(),
+            account.getOwnerLastName(),
+            account.getOwnerSSN(),
+            # A view from another bank only has the hash to copy
+            account.getPIN() if account._store is None else account._store.getPINHash(acct_num),
+            account.getBalanceInCents(),
+        )
+        if added and account._store is None:
+            account._attach(self._store)
+        return added
 
     def removeAccountFromBank(self, accountNumber: int) -> bool:
         """
         Remove an account by number. Returns True if removed, False if not found.
         """
-        return self._accounts.pop(int(accountNumber), None) is not None
+        return self._store.removeRow(int(accountNumber))
 
     def findAccount(self, accountNumber: int) -> Account | None:
         """
         Find an account by number. Returns the Account or None.
         """
-        return self._accounts.get(int(accountNumber))
+        num = int(accountNumber)
+        if not self._store.contains(num):
+            return None
+        return Account._view(self._store, num)
+
+    def findAccountsBySSN(self, ssn: str, limit: int = 50, after: int | None = None) -> tuple[list, int | None]:
+        """
+        Accounts owned by ssn, by account number, one page at a time.
+        Returns (accounts, cursor); pass cursor as `after` for the next page (None = last page).
+        """
+        nums, cursor = self._store.numbersBySSN(str(ssn), limit, after)
+        return [Account._view(self._store, num) for num in nums], cursor
+
+    def findAccountsByName(self, lastName: str, firstName: str | None = None, limit: int = 50,
+                           after: tuple | None = None) -> tuple[list, tuple | None]:
+        """
+        Accounts whose owner's last name starts with lastName (case-insensitive), or with
+        firstName given, whose last name is lastName and first name starts with firstName.
+        Ordered by last name, first name, account number, one page at a time.
+        Returns (accounts, cursor); pass cursor as `after` for the next page (None = last page).
+        """
+        nums, cursor = self._store.numbersByName(lastName, firstName, limit, after)
+        return [Account._view(self._store, num) for num in nums], cursor
+
+    # ---------- PINs ----------
+    def checkPIN(self, accountNumber: int, pin: str) -> bool:
+        """
+        Verify a PIN and keep the account's failed-attempt count (persisted): a
+        wrong PIN adds one, a right one resets it. A locked account never verifies,
+        and wrong PINs sent while it is locked do not make the lock last longer.
+        """
+        num = int(accountNumber)
+        if self.isLocked(num):
+            return False
+        if self._store.checkPIN(num, pin):
+            self._store.setFailedPINAttempts(num, 0)
+            return True
+        if self._store.recordFailedPIN(num) >= self.MAX_PIN_ATTEMPTS:
+            self._lockedUntil[num] = time.monotonic() + self.PIN_LOCKOUT_SECONDS
+        return False
+
+    def isLocked(self, accountNumber: int) -> bool:
+        """
+        Whether MAX_PIN_ATTEMPTS wrong PINs in a row locked the account less than
+        PIN_LOCKOUT_SECONDS ago; once the lock ends the count starts over. (A lock
+        is timed in memory: one found in the journal on startup runs from then.)
+        """
+        num = int(accountNumber)
+        if self._store.getFailedPINAttempts(num) < self.MAX_PIN_ATTEMPTS:
+            return False
+        now = time.monotonic()
+        if now < self._lockedUntil.setdefault(num, now + self.PIN_LOCKOUT_SECONDS):
+            return True
+        self.unlockAccount(num)
+        return False
+
+    def unlockAccount(self, accountNumber: int):
+        """Clear the failed-attempt count of a locked account."""
+        self._store.setFailedPINAttempts(int(accountNumber), 0)
+        self._lockedUntil.pop(int(accountNumber), None)
+
+    def getPINHash(self, accountNumber: int) -> bytes:
+        return self._store.getPINHash(int(accountNumber))
+
+    def deposit(self, accountNumber: int, amountInCents: int, kind: int = Ledger.DEPOSIT,
+                idempotencyKey: str | None = None) -> int | None:
+        """
+        Add cents to an account. Returns the new balance, or None if no such account
+        (or the balance would not fit in 64 bits; nothing is changed). kind is how the ledger records it (e.g. Ledger.COINS).
+
+        Money-moving methods take an optional idempotencyKey chosen by the client:
+        repeating a completed request with the same key (within IDEMPOTENCY_TTL)
+        moves nothing and returns the first result. Using the key for a different
+        request raises ValueError. Refused requests are not remembered.
+        """
+        try:
+            return self._store.addToBalance(int(accountNumber), int(amountInCents), kind, idempotencyKey)
+        except KeyError:
+            return None
+
+    def withdraw(self, accountNumber: int, amountInCents: int, kind: int = Ledger.WITHDRAWAL,
+                 idempotencyKey: str | None = None) -> int | None:
+        """
+        Check the balance and withdraw as one atomic step, so concurrent callers
+        cannot overdraw. Returns the new balance, or None if the funds are short
+        (or there is no such account). kind is how the ledger records it (e.g. Ledger.ATM).
+        """
+        try:
+            return self._store.withdrawIfFunded(int(accountNumber), int(amountInCents), kind, idempotencyKey)
+        except KeyError:
+            return None
+
+    def transfer(self, fromAccountNumber: int, toAccountNumber: int, amountInCents: int,
+                 idempotencyKey: str | None = None) -> bool:
+        """
+        Move amountInCents between two accounts as one atomic, journaled step.
+        Returns False if either account is missing, they are the same account,
+        or the source has insufficient funds.
+        """
+        src, dst = int(fromAccountNumber), int(toAccountNumber)
+        if src == dst:
+            return False
+        return self._store.transfer(src, dst, int(amountInCents), idempotencyKey) is not None
+
+    # ---------- Batch operations ----------
+    def applyMonthlyInterest(self, apr) -> tuple[int, int]:
+        """
+        Credit one month of interest (APR/12, rounded half-up to the cent) to every
+        account with a positive balance, in a single pass over the balance column.
+        Returns (accounts updated, total interest paid in cents). Raises ValueError,
+        before anything is journaled, if a balance would not fit in 64 bits.
+        """
+        numerator, exponent = BankUtility.monthlyRateFromAPR(apr)
+        interest_for = BankUtility.monthlyInterestInCents
+        note = self._store.noteBalanceChange
+        updated = 0
+        total = 0
+        # Credited accounts, amounts and new balances, for the ledger
+        credited, credits, new_balances = array("q"), array("q"), array("q")
+        with self._store.exclusive():
+            # Interest grows with the balance, so if the largest balance fits so does every other
+            top = max(self._store.balanceColumn(), default=0)
+            if not AccountStore.fits(top + interest_for(top, numerator, exponent)):
+                raise ValueError(f"Interest at {apr}% would take a balance past {AccountStore.MAX_CENTS} cents.")
+            position = self._replayPosition
+            if self._journal is not None:
+                # Replay recomputes the same credits from the same balances
+                position = self._journal.append(["I", str(apr)])
+            balances = self._store.balanceColumn(write=True)
+            numbers = self._store.numberColumn()
+            for row, bal in enumerate(balances):
+                if bal <= 0:
+                    continue
+                interest = interest_for(bal, numerator, exponent)
+                if interest > 0:
+                    balances[row] = bal + interest
+                    note(numbers[row], bal, bal + interest)
+                    updated += 1
+                    total += interest
+                    if self._ledger is not None:
+                        credited.append(numbers[row])
+                        credits.append(interest)
+                        new_balances.append(bal + interest)
+            if credited:
+                self._ledger.appendMany(Ledger.INTEREST, credited, credits, new_balances, position=position)
+        return updated, total
+
+    def postMonthEnd(self, runId: str, schedule: PostingSchedule | None = None, workers: int = 0,
+                     chunks: int = 256) -> dict:
+        """
+        Post month-end interest and fees to every account whose class `schedule` prices.
+        The account-number space is cut into `chunks` ranges that `workers` processes
+        price in parallel (0 = price in this process); each range is applied and
+        journaled under its own exclusive() hold, so other requests run between
+        ranges. A range whose balances changed after it was priced is re-priced
+        before it is applied. If the bank stopped part way, calling this again
+        with the same runId (schedule may be None) posts only the ranges still
+        missing, with the schedule and ranges the run started with. Calling it
+        for a run that already finished does nothing.
+        Returns what this call posted: chunks, credited, interestCents, charged, feeCents.
+        """
+        run = self._postings.get(runId)
+        started = run["schedule"] if run is not None else self._postedRuns.get(runId)
+        if started is None and schedule is None:
+            raise ValueError(f"There is no posting run {runId!r} to resume; give a schedule to start it.")
+        if started is not None and schedule is not None and schedule.toDict() != started.toDict():
+            raise ValueError(f"Posting run {runId!r} was started with a different schedule.")
+        summary = dict.fromkeys(("chunks", "credited", "interestCents", "charged", "feeCents"), 0)
+        if run is None and runId in self._postedRuns:
+            return summary
+        store = self._store
+        with store.exclusive():
+            run = self._postings.get(runId)
+            if run is None:
+                if self._journal is not None:
+                    self._journal.append(["Q", runId, schedule.toDict(), chunks])
+                run = self._postings[runId] = {"schedule": schedule, "chunks": chunks, "done": set()}
+            layout = [store.layoutVersion(), store.partitionRows(run["chunks"])]
+        pending = [i for i in range(run["chunks"]) if i not in run["done"]]
+        for chunk, priced in self._priceChunks(run, layout, pending, workers):
+            with store.exclusive():
+                if chunk in run["done"]:
+                    continue    # posted meanwhile by another call for this run
+                rows = self._runRows(run, layout)[chunk]
+                inputs = self._chunkInputs(rows)
+                if priced is not None and priced[:2] == inputs:
+                    interest, fees = priced[2:]
+                else:
+                    interest, fees = run["schedule"].price(*inputs)
+                self._postChunk(runId, run, chunk, rows, interest, fees, summary)
+        return summary
+
+    def pendingPostingRuns(self) -> list:
+        """Ids of month-end posting runs that started but have not posted every range."""
+        return [runId for runId, run in self._postings.items() if len(run["done"]) < run["chunks"]]
+
+    def _runRows(self, run: dict, layout: list) -> list:
+        """A run's ranges as row-index arrays, re-cut if rows moved since (caller holds exclusive())."""
+        if layout[0] != self._store.layoutVersion():
+            layout[:] = [self._store.layoutVersion(), self._store.partitionRows(run["chunks"])]
+        return layout[1]
+
+    def _chunkInputs(self, rows: array) -> tuple:
+        """The balances and classes of `rows` (caller holds exclusive())."""
+        balances, classes = self._store.balanceColumn(), self._store.classColumn()
+        return array("q", (balances[r] for r in rows)), array("B", (classes[r] for r in rows))
+
+    def _priceChunks(self, run: dict, layout: list, pending: list, workers: int):
+        """
+        Yield (chunk, priced) for each pending chunk, in any order: priced is
+        (balances, classes, interest, fees), or None to price it when it is applied.
+        """
+        if not workers:
+            # Priced under the same hold that applies it: nothing can change in between
+            for chunk in pending:
+                yield chunk, None
+            return
+
+        inputs = {}
+
+        def tasks():
+            # Runs in the pool's feeder thread, a range at a time between postings
+            for chunk in pending:
+                with self._store.exclusive():
+                    inputs[chunk] = self._chunkInputs(self._runRows(run, layout)[chunk])
+                yield (chunk, *inputs[chunk])
+
+        # Imported here: multiprocessing is slow to import and only posting runs need it
+        import multiprocessing
+        with multiprocessing.Pool(workers, PostingSchedule.attach, (run["schedule"],)) as pool:
+            for chunk, interest, fees in pool.imap_unordered(PostingSchedule.priceChunk, tasks()):
+                yield chunk, (*inputs.pop(chunk), interest, fees)
+
+    def _postChunk(self, runId: str, run: dict, chunk: int, rows: array, interest: array, fees: array,
+                   summary: dict | None = None):
+        """Apply one priced chunk: interest, then the fee, per row (caller holds exclusive())."""
+        balances = self._store.balanceColumn()
+        if not AccountStore.fits(max((balances[r] + c for r, c in zip(rows, interest) if c), default=0)):
+            raise ValueError(f"Posting run {runId!r} would take a balance past {AccountStore.MAX_CENTS} cents.")
+        position = self._replayPosition
+        if self._journal is not None:
+            # Replay re-prices the chunk from the same balances
+            position = self._journal.append(["M", runId, chunk])
+        store = self._store
+        balances, numbers, note = store.balanceColumn(write=True), store.numberColumn(), store.noteBalanceChange
+        credited, credits, credited_balances = array("q"), array("q"), array("q")
+        charged, charges, charged_balances = array("q"), array("q"), array("q")
+        for row, credit, fee in zip(rows, interest, fees):
+            if not (credit or fee):
+                continue
+            num, bal = numbers[row], balances[row]
+            new_bal = bal + credit - fee
+            balances[row] = new_bal
+            note(num, bal, new_bal)
+            if credit:
+                credited.append(num)
+                credits.append(credit)
+                credited_balances.append(bal + credit)
+            if fee:
+                charged.append(num)
+                charges.append(-fee)
+                charged_balances.append(new_bal)
+        if self._ledger is not None:
+            if credited:
+                self._ledger.appendMany(Ledger.INTEREST, credited, credits, credited_balances, position=position)
+            if charged:
+                self._ledger.appendMany(Ledger.FEE, charged, charges, charged_balances, position=position)
+        run["done"].add(chunk)
+        if summary is not None:
+            summary["chunks"] += 1
+            summary["credited"] += len(credited)
+            summary["interestCents"] += sum(credits)
+            summary["charged"] += len(charged)
+            summary["feeCents"] -= sum(charges)
+
+    def _replayPostedChunk(self, runId: str, chunk: int):
+        run = self._postings[runId]
+        # Rows only move when accounts open or close, so one partition serves the whole run
+        if self._replayGroups is None or self._replayGroups[0] != run["chunks"]:
+            self._replayGroups = (run["chunks"], self._store.partitionRows(run["chunks"]))
+        rows = self._replayGroups[1][chunk]
+        balances, classes = self._store.balanceColumn(), self._store.classColumn()
+        interest, fees = run["schedule"].price(array("q", (balances[r] for r in rows)),
+                                               array("B", (classes[r] for r in rows)))
+        self._postChunk(runId, run, chunk, rows, interest, fees)
+
+    def getAccountClass(self, accountNumber: int) -> int:
+        return self._store.getAccountClass(int(accountNumber))
+
+    def setAccountClass(self, accountNumber: int, accountClass: int):
+        """Put an account in a class (0-255) of the month-end PostingSchedule; new accounts are class 0."""
+        self._store.setAccountClass(int(accountNumber), int(accountClass))
+
+    def getStatement(self, accountNumber: int, start: float | None = None, end: float | None = None,
+                     limit: int | None = None) -> list:
+        """
+        Ledger entries of an account with start <= time < end (seconds since the
+        epoch; None = unbounded), oldest first, at most `limit`. Each entry is
+        (timestamp in microseconds, Ledger kind, amount in cents, counterparty, balance in cents).
+        """
+        return self._ledger.statement(
+            int(accountNumber),
+            None if start is None else int(start * 1_000_000),
+            None if end is None else int(end * 1_000_000),
+            limit)
+
+    def getReport(self) -> dict:
+        """
+        Bank-wide totals: accounts, totalCents, nonZeroAccounts, positiveAccounts,
+        negativeAccounts and histogram, a list of (low, high, count) for balances
+        low <= cents < high.
+        The first call scans every account once; after that the totals are kept up
+        to date by each balance change, so a report costs the same at any size.
+        """
+        return self._store.report()
+
+    def readView(self):
+        """
+        A point-in-time view of every account's balance (an AccountStore.BalanceView),
+        for reports and scans that must add up while deposits and transfers carry
+        on. Opening one is O(1); close it when done, e.g. with a with block.
+        """
+        return self._store.readView()
+
+    def previewMonthlyInterest(self, apr) -> tuple[int, int]:
+        """
+        What applyMonthlyInterest(apr) would pay right now, without paying it:
+        (accounts that would be credited, total interest in cents). Reads a
+        view, so transactions are not held up while it runs.
+        """
+        numerator, exponent = BankUtility.monthlyRateFromAPR(apr)
+        interest_for = BankUtility.monthlyInterestInCents
+        updated = total = 0
+        with self.readView() as view:
+            for bal in view.balances():
+                if bal > 0:
+                    interest = interest_for(bal, numerator, exponent)
+                    if interest > 0:
+                        updated += 1
+                        total += interest
+        return updated, total
 
     # ---------- Safe generators (unique within this bank) ----------
     def generateUniqueAccountNumber(self) -> int:
@@ -55,9 +575,10 @@ class Bank:
         if self.isFull():
             raise RuntimeError("Bank is full; cannot generate new account number.")
         while True:
-            # 8-digit, first digit non-zero
-            num = BankUtility.generateRandomInteger(10000000, 99999999)
-            if num not in self._accounts:
+            # The allocator never repeats itself; only numbers added some other way
+            # (addAccountToBank with a chosen number, older journals) can be taken
+            num = self._allocator.next()
+            if not self._store.contains(num):
                 return num
 
     def generateRandomPIN(self) -> str:
@@ -81,14 +602,15 @@ class Bank:
         a.setOwnerLastName(last)
         a.setOwnerSSN(ssn9)
 
-        acct_num = self.generateUniqueAccountNumber()
         pin = self.generateRandomPIN()
-        a.setAccountNumber(acct_num)
         a.setPIN(pin)
         a.setBalanceInCents(0)
 
-        added = self.addAccountToBank(a)
-        if not added:
-            # Extremely unlikely due to uniqueness check, but handle gracefully
-            raise RuntimeError("Failed to add newly created account to bank.")
-        return a
+        # A number chosen by addAccountToBank elsewhere may claim it between generating and adding
+        for _ in range(100):
+            a.setAccountNumber(self.generateUniqueAccountNumber())
+            if self.addAccountToBank(a):
+                return a
+            if self.isFull():
+                break
+        raise RuntimeError("Failed to add newly created account to bank.")
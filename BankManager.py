@@ -1,237 +1,330 @@
+import sys
+from datetime import datetime, timedelta
+
+from ATMDispenser import ATMDispenser
 from Bank import Bank
+from BankService import BankService, ServiceError
 from BankUtility import BankUtility
-from CoinCollector import CoinCollector
-from decimal import Decimal, ROUND_HALF_UP
+from Ledger import Ledger
+
+_MENU = "\n".join([
+    "=" * 60,
+    "What do you want to do?",
+    "1. Open an account",
+    "2. Get account information and balance",
+    "3. Change PIN",
+    "4. Deposit money in account",
+    "5. Transfer money between accounts",
+    "6. Withdraw money from account",
+    "7. ATM withdrawal",
+    "8. Deposit change",
+    "9. Close an account",
+    "10. Add monthly interest to all accounts",
+    "11. End Program",
+    "12. Print account statement",
+    "=" * 60,
+])
+
 
 class BankManager:
-    def __init__(self):
-        self.bank = Bank()
-        self.run()
+    """
+    The interactive menu. BankManager() runs it on the terminal and closes the
+    bank when the user picks "End Program".
+
+    For scripted runs, health checks and replaying a recorded session, pass
+    autoRun=False and drive it yourself. Answers then come from `script`, one
+    line per prompt exactly as typed, and the run ends at "11" or at the end
+    of the script. Output is buffered and written to `output` in large pieces,
+    with each prompt echoed next to its answer, so it reads like the session:
+
+        with open("session.txt") as script, BankManager("bank.journal", autoRun=False, script=script) as manager:
+            manager.run()
+
+    When reading from the terminal, `record` (a text file) receives every
+    answer, so the session can be replayed later as a script.
+    """
+
+    _FLUSH_EVERY = 4096    # buffered writes between flushes when running a script
+
+    def __init__(self, journalPath=None, snapshotPath=None, autoRun: bool = True, script=None, output=None,
+                 record=None):
+        self.bank = Bank(journalPath, snapshotPath=snapshotPath)
+        self.service = BankService(self.bank)
+        self._session = object()    # this terminal's session for the PIN cache
+        self._snapshotPath = snapshotPath
+        self._script = script
+        self._output = output if output is not None else sys.stdout
+        self._record = record
+        self._buffer = []
+        if autoRun:
+            with self:
+                self.run()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, *exc):
+        self.close(checkpoint=excType is None)
+
+    def close(self, checkpoint: bool = True):
+        """Write pending output and close the bank, checkpointing first if it has a snapshot file."""
+        try:
+            self._flush()
+            if checkpoint and self._snapshotPath is not None:
+                # Checkpoint on a clean exit so the next start replays nothing
+                self.bank.checkpoint()
+        finally:
+            self.bank.close()
+
+    # ------------- terminal or script -------------
+    def _print(self, *values, end="\n"):
+        self._buffer.append(" ".join(map(str, values)) + end)
+        if len(self._buffer) >= self._FLUSH_EVERY:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._output.write("".join(self._buffer))
+            self._buffer.clear()
+            self._output.flush()
+
+    def _input(self, prompt: str) -> str:
+        """One answer. Raises EOFError at the end of the script (or of the terminal's input)."""
+        if self._script is None:
+            self._flush()
+            answer = input(prompt)
+            if self._record is not None:
+                self._record.write(answer + "\n")
+            if self._output is not sys.stdout:
+                self._print(prompt + answer)
+            return answer
+        answer = self._script.readline()
+        if not answer:
+            raise EOFError
+        answer = answer.rstrip("\r\n")
+        self._print(prompt + answer)
+        return answer
 
     # ------------- generic prompts -------------
+    def _prompt_for_string(self, prompt: str) -> str:
+        return BankUtility.promptUserForString(prompt, self._input, self._print)
+
+    def _prompt_for_cents(self, prompt: str) -> int:
+        return BankUtility.promptUserForPositiveCents(prompt, self._input, self._print)
+
     def _prompt_for_ssn9(self) -> str:
         while True:
-            ssn = BankUtility.promptUserForString("Enter 9-digit SSN (digits only): ")
+            ssn = self._prompt_for_string("Enter 9-digit SSN (digits only): ")
             if ssn.isdigit() and len(ssn) == 9:
                 return ssn
-            print("Invalid SSN. Please enter exactly 9 digits (no dashes).")
+            self._print("Invalid SSN. Please enter exactly 9 digits (no dashes).")
 
     def _prompt_for_account_number(self) -> int:
         while True:
-            s = BankUtility.promptUserForString("Enter 8-digit account number: ")
+            s = self._prompt_for_string("Enter 8-digit account number: ")
             if s.isdigit() and len(s) == 8 and s[0] != "0":
                 return int(s)
-            print("Invalid account number. It must be 8 digits and cannot start with 0.")
+            self._print("Invalid account number. It must be 8 digits and cannot start with 0.")
 
     def _prompt_for_pin(self) -> str:
         while True:
-            p = BankUtility.promptUserForString("Enter 4-digit PIN: ")
+            p = self._prompt_for_string("Enter 4-digit PIN: ")
             if p.isdigit() and len(p) == 4:
                 return p
-            print("Invalid PIN format. Please enter exactly 4 digits.")
+            self._print("Invalid PIN format. Please enter exactly 4 digits.")
 
     def _verify_account_with_pin(self):
         """Prompt for account number + PIN. Return (acct) or None."""
         acct_num = self._prompt_for_account_number()
         acct = self.bank.findAccount(acct_num)
         if not acct:
-            print("No account found with that number.\n")
+            self._print("No account found with that number.\n")
             return None
         for attempt in range(1, 4):
             pin = self._prompt_for_pin()
-            if acct.isValidPIN(pin):
-                return acct
+            try:
+                return self.service.authenticate(acct_num, pin, self._session)
+            except ServiceError as e:
+                if self.bank.isLocked(acct_num):
+                    self._print(f"{e}\n")
+                    return None
             left = 3 - attempt
-            print(f"Incorrect PIN. {left} attempt(s) remaining." if left else "Incorrect PIN. Returning to main menu.\n")
+            self._print(f"Incorrect PIN. {left} attempt(s) remaining." if left else "Incorrect PIN. Returning to main menu.\n")
             if left == 0:
                 return None
         return None
 
     def _format_cents(self, cents: int) -> str:
-        dollars = cents // 100
-        cents_only = cents % 100
-        return f"${dollars:,}.{cents_only:02d}"
+        return BankUtility.formatCents(cents)
 
     # ---------- Option 1: Open account ----------
     def open_account_flow(self):
         if self.bank.isFull():
-            print("Sorry—the bank is full. Cannot open more accounts.")
+            self._print("Sorry—the bank is full. Cannot open more accounts.")
             return
 
-        print("\n--- Open an Account ---")
-        first = BankUtility.promptUserForString("First name: ")
-        last  = BankUtility.promptUserForString("Last name: ")
+        self._print("\n--- Open an Account ---")
+        first = self._prompt_for_string("First name: ")
+        last  = self._prompt_for_string("Last name: ")
         ssn9  = self._prompt_for_ssn9()
 
-        acct = self.bank.openAccount(first, last, ssn9)
+        try:
+            acct = self.service.openAccount(first, last, ssn9)
+        except ServiceError as e:
+            self._print(e)
+            return
 
-        print("\nAccount created successfully!\n")
-        print(acct)
-        print("\nSave this information securely:")
-        print(f"  Account Number: {acct.getAccountNumber()}")
-        print(f"  PIN:            {acct.getPIN()}\n")
+        self._print("\nAccount created successfully!\n")
+        self._print(acct)
+        self._print("\nSave this information securely:")
+        self._print(f"  Account Number: {acct.getAccountNumber()}")
+        self._print(f"  PIN:            {acct.getPIN()}\n")
 
     # ---------- Option 2: Info & balance ----------
     def info_and_balance_flow(self):
-        print("\n--- Account Information & Balance ---")
+        self._print("\n--- Account Information & Balance ---")
         acct = self._verify_account_with_pin()
         if acct:
-            print("\nAccount found:\n")
-            print(acct)
-            print()
+            self._print("\nAccount found:\n")
+            self._print(acct)
+            self._print()
 
     # ---------- Option 3: Change PIN ----------
     def change_pin_flow(self):
-        print("\n--- Change PIN ---")
+        self._print("\n--- Change PIN ---")
         acct = self._verify_account_with_pin()
         if not acct:
             return
 
         while True:
             new_pin = self._prompt_for_pin()
-            if new_pin == acct.getPIN():
-                print("New PIN cannot be the same as the current PIN.")
+            if acct.isValidPIN(new_pin):
+                self._print("New PIN cannot be the same as the current PIN.")
                 continue
-            confirm = BankUtility.promptUserForString("Re-enter new PIN to confirm: ")
+            confirm = self._prompt_for_string("Re-enter new PIN to confirm: ")
             if confirm != new_pin:
-                print("PINs do not match. Try again.")
+                self._print("PINs do not match. Try again.")
+                continue
+            try:
+                self.service.changePIN(acct.getAccountNumber(), new_pin)
+            except ServiceError as e:
+                self._print(e)
                 continue
-            acct.setPIN(new_pin)
-            print("PIN updated successfully.\n")
+            self._print("PIN updated successfully.\n")
             return
 
     # ---------- Option 4: Deposit ----------
     def deposit_flow(self):
-        print("\n--- Deposit Money ---")
+        self._print("\n--- Deposit Money ---")
         acct = self._verify_account_with_pin()
         if not acct:
             return
-        dollars = BankUtility.promptUserForPositiveNumber("Enter amount to deposit (in dollars): $")
-        cents = BankUtility.convertFromDollarsToCents(dollars)
-        new_bal = acct.deposit(cents)
-        print(f"Deposit successful. New balance: {self._format_cents(new_bal)}\n")
+        cents = self._prompt_for_cents("Enter amount to deposit (in dollars): $")
+        try:
+            new_bal = self.service.deposit(acct.getAccountNumber(), cents)
+        except ServiceError as e:
+            self._print(f"{e}\n")
+            return
+        self._print(f"Deposit successful. New balance: {self._format_cents(new_bal)}\n")
 
     # ---------- Option 5: Transfer between accounts ----------
     def transfer_flow(self):
-        print("\n--- Transfer Money Between Accounts ---")
-        print("Source account:")
+        self._print("\n--- Transfer Money Between Accounts ---")
+        self._print("Source account:")
         src = self._verify_account_with_pin()
         if not src:
             return
 
-        print("Destination account:")
+        self._print("Destination account:")
         dst_num = self._prompt_for_account_number()
         dst = self.bank.findAccount(dst_num)
         if not dst:
-            print("No destination account found with that number.\n")
+            self._print("No destination account found with that number.\n")
             return
         if dst.getAccountNumber() == src.getAccountNumber():
-            print("Cannot transfer to the same account.\n")
+            self._print("Cannot transfer to the same account.\n")
             return
 
-        dollars = BankUtility.promptUserForPositiveNumber("Enter transfer amount (in dollars): $")
-        amount_cents = BankUtility.convertFromDollarsToCents(dollars)
+        amount_cents = self._prompt_for_cents("Enter transfer amount (in dollars): $")
 
-        if src.getBalanceInCents() < amount_cents:
-            print(f"Insufficient funds. Current balance: {self._format_cents(src.getBalanceInCents())}\n")
+        try:
+            src_bal, dst_bal = self.service.transfer(src.getAccountNumber(), dst.getAccountNumber(), amount_cents)
+        except ServiceError as e:
+            self._print(f"{e}\n")
             return
-
-        src.withdraw(amount_cents)
-        dst.deposit(amount_cents)
-        print(f"Transfer successful.")
-        print(f"Source new balance: {self._format_cents(src.getBalanceInCents())}")
-        print(f"Destination new balance: {self._format_cents(dst.getBalanceInCents())}\n")
+        self._print(f"Transfer successful.")
+        self._print(f"Source new balance: {self._format_cents(src_bal)}")
+        self._print(f"Destination new balance: {self._format_cents(dst_bal)}\n")
 
     # ---------- Option 6: Withdraw ----------
     def withdraw_flow(self):
-        print("\n--- Withdraw Money ---")
+        self._print("\n--- Withdraw Money ---")
         acct = self._verify_account_with_pin()
         if not acct:
             return
-        dollars = BankUtility.promptUserForPositiveNumber("Enter amount to withdraw (in dollars): $")
-        amount_cents = BankUtility.convertFromDollarsToCents(dollars)
+        amount_cents = self._prompt_for_cents("Enter amount to withdraw (in dollars): $")
 
-        if acct.getBalanceInCents() < amount_cents:
-            print(f"Insufficient funds. Current balance: {self._format_cents(acct.getBalanceInCents())}\n")
+        try:
+            new_bal = self.service.withdraw(acct.getAccountNumber(), amount_cents)
+        except ServiceError as e:
+            self._print(f"{e}\n")
             return
-
-        new_bal = acct.withdraw(amount_cents)
-        print(f"Withdrawal successful. New balance: {self._format_cents(new_bal)}\n")
+        self._print(f"Withdrawal successful. New balance: {self._format_cents(new_bal)}\n")
 
     # ---------- Option 7: ATM withdrawal (bill breakdown) ----------
     def atm_withdrawal_flow(self):
         """
-        Greedy breakdown with $50, $20, $10, $5, $1 bills.
-        Adjust denominations here if your assignment specifies differently.
+        Breakdown with $50, $20, $10, $5, $1 bills, limited to what the ATM's cassettes hold.
+        Denominations and cassette counts live in ATMDispenser.
         """
-        print("\n--- ATM Withdrawal ---")
+        self._print("\n--- ATM Withdrawal ---")
         acct = self._verify_account_with_pin()
         if not acct:
             return
 
-        dollars = BankUtility.promptUserForPositiveNumber("Enter cash amount to withdraw (whole dollars): $")
-        # Enforce whole-dollar withdrawal
-        if Decimal(str(dollars)).quantize(Decimal("1"), rounding=ROUND_HALF_UP) != Decimal(str(dollars)):
-            print("ATM can only dispense whole dollars. Try again.\n")
+        cents = self._prompt_for_cents("Enter cash amount to withdraw (whole dollars): $")
+        try:
+            breakdown, new_bal = self.service.atmWithdrawal(acct.getAccountNumber(), cents)
+        except ServiceError as e:
+            self._print(f"{e}\n")
             return
 
-        cents = BankUtility.convertFromDollarsToCents(dollars)
-        if acct.getBalanceInCents() < cents:
-            print(f"Insufficient funds. Current balance: {self._format_cents(acct.getBalanceInCents())}\n")
-            return
-
-        # Bill breakdown
-        remaining = int(dollars)
-        breakdown = {}
-        for bill in [50, 20, 10, 5, 1]:
-            qty = remaining // bill
-            if qty:
-                breakdown[bill] = qty
-                remaining -= qty * bill
-
-        # Complete withdrawal
-        acct.withdraw(cents)
-
         # Print breakdown
-        print("Dispensed:")
-        for bill in [50, 20, 10, 5, 1]:
+        self._print("Dispensed:")
+        for bill in ATMDispenser.DENOMINATIONS:
             if bill in breakdown:
-                print(f"  ${bill}: {breakdown[bill]}")
-        print(f"New balance: {self._format_cents(acct.getBalanceInCents())}\n")
+                self._print(f"  ${bill}: {breakdown[bill]}")
+        self._print(f"New balance: {self._format_cents(new_bal)}\n")
 
     # ---------- Option 8: Deposit change (coins) ----------
     def deposit_change_flow(self):
-        print("\n--- Deposit Change ---")
+        self._print("\n--- Deposit Change ---")
         acct = self._verify_account_with_pin()
         if not acct:
             return
-        coin_str = BankUtility.promptUserForString(
+        coin_str = self._prompt_for_string(
             "Enter coins (e.g., '10q 3d 7n 5p', supports p/n/d/q/h/w): "
         )
-        cents = CoinCollector.parseChange(coin_str)
-        if cents <= 0:
-            print("No valid coins detected. Nothing deposited.\n")
+        try:
+            cents, new_bal = self.service.depositCoins(acct.getAccountNumber(), coin_str)
+        except ServiceError as e:
+            self._print(f"{e}\n")
             return
-        new_bal = acct.deposit(cents)
-        print(f"Deposited {self._format_cents(cents)} in coins. New balance: {self._format_cents(new_bal)}\n")
+        self._print(f"Deposited {self._format_cents(cents)} in coins. New balance: {self._format_cents(new_bal)}\n")
 
     # ---------- Option 9: Close an account ----------
     def close_account_flow(self):
-        print("\n--- Close Account ---")
+        self._print("\n--- Close Account ---")
         acct = self._verify_account_with_pin()
         if not acct:
             return
 
-        bal = acct.getBalanceInCents()
-        if bal != 0:
-            print(f"Account must have a zero balance to close (current: {self._format_cents(bal)}).\n")
+        try:
+            self.service.closeAccount(acct.getAccountNumber())
+        except ServiceError as e:
+            self._print(f"{e}\n")
             return
-
-        removed = self.bank.removeAccountFromBank(acct.getAccountNumber())
-        if removed:
-            print("Account closed successfully.\n")
-        else:
-            print("Unexpected error closing account.\n")
+        self._print("Account closed successfully.\n")
 
     # ---------- Option 10: Add monthly interest to all accounts ----------
     def add_monthly_interest_flow(self):
@@ -239,55 +332,74 @@ class BankManager:
         Prompts for an ANNUAL interest rate (e.g., 3.6 for 3.6% APR),
         computes monthly rate = APR/12, applies to all accounts, rounding half-up to cents.
         """
-        print("\n--- Add Monthly Interest to All Accounts ---")
+        self._print("\n--- Add Monthly Interest to All Accounts ---")
         # Accept positive (can be zero if you wish)
         while True:
-            s = BankUtility.promptUserForString("Enter ANNUAL interest rate as a percent (e.g., 3.6): ")
+            apr = self._prompt_for_string("Enter ANNUAL interest rate as a percent (e.g., 3.6): ")
             try:
-                apr = float(s)
-                if apr < 0:
-                    print("Rate cannot be negative.")
-                    continue
+                updated, _ = self.service.addMonthlyInterest(apr)
                 break
+            except ServiceError as e:
+                self._print(e)
+
+        self._print(f"Applied monthly interest at {apr}% APR to {updated} account(s).\n")
+
+    # ---------- Option 12: Print account statement ----------
+    def _prompt_for_date(self, prompt: str) -> datetime | None:
+        while True:
+            s = self._input(prompt).strip()
+            if not s:
+                return None
+            try:
+                return datetime.strptime(s, "%Y-%m-%d")
             except ValueError:
-                print("Invalid rate. Try again.")
+                self._print("Invalid date. Use YYYY-MM-DD, or leave blank.")
 
-        monthly_rate = Decimal(str(apr)) / Decimal("1200")  # apr% / 12 months
-        updated = 0
-        for acct in self.bank.getAllAccounts():
-            bal_cents = acct.getBalanceInCents()
-            if bal_cents <= 0:
-                continue
-            bal = Decimal(bal_cents) / Decimal(100)
-            interest = (bal * monthly_rate).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-            interest_cents = int((interest * Decimal(100)).to_integral_value(rounding=ROUND_HALF_UP))
-            if interest_cents > 0:
-                acct.deposit(interest_cents)
-                updated += 1
+    def statement_flow(self):
+        self._print("\n--- Account Statement ---")
+        acct = self._verify_account_with_pin()
+        if not acct:
+            return
+
+        start = self._prompt_for_date("From date (YYYY-MM-DD, blank = first entry): ")
+        end = self._prompt_for_date("Through date (YYYY-MM-DD, blank = today): ")
+        try:
+            entries = self.service.statement(
+                acct.getAccountNumber(),
+                None if start is None else start.timestamp(),
+                None if end is None else (end + timedelta(days=1)).timestamp())
+        except ServiceError as e:
+            self._print(f"{e}\n")
+            return
 
-        print(f"Applied monthly interest at {apr}% APR to {updated} account(s).\n")
+        self._print(f"\nStatement for account {acct.getAccountNumber()}")
+        self._print(f"{'Date':<20}{'Description':<18}{'Amount':>16}{'Balance':>16}  Counterparty")
+        for ts, kind, amount, counterparty, balance in entries:
+            when = datetime.fromtimestamp(ts / 1_000_000).strftime("%Y-%m-%d %H:%M:%S")
+            sign = "-" if amount < 0 else ""
+            self._print(f"{when:<20}{Ledger.KIND_NAMES.get(kind, '?'):<18}"
+                  f"{sign + self._format_cents(abs(amount)):>16}{self._format_cents(balance):>16}"
+                  f"  {counterparty or ''}")
+        if not entries:
+            self._print("No transactions in this period.")
+        self._print()
 
     # ------------- main loop -------------
     def run(self):
+        """Show the menu and handle choices until "End Program" or the end of the input."""
+        try:
+            self._loop()
+        except EOFError:
+            self._print()
+        finally:
+            self._flush()
+
+    def _loop(self):
         while True:
-            print("=" * 60)
-            print("What do you want to do?")
-            print("1. Open an account")
-            print("2. Get account information and balance")
-            print("3. Change PIN")
-            print("4. Deposit money in account")
-            print("5. Transfer money between accounts")
-            print("6. Withdraw money from account")
-            print("7. ATM withdrawal")
-            print("8. Deposit change")
-            print("9. Close an account")
-            print("10. Add monthly interest to all accounts")
-            print("11. End Program")
-            print("=" * 60)
-
-            choice = input("Enter choice: ").strip()
+            self._print(_MENU)
+            choice = self._input("Enter choice: ").strip()
             if choice == "11":
-                print("Goodbye!")
+                self._print("Goodbye!")
                 break
             elif choice == "1":
                 self.open_account_flow()
@@ -309,8 +421,36 @@ class BankManager:
                 self.close_account_flow()
             elif choice == "10":
                 self.add_monthly_interest_flow()
+            elif choice == "12":
+                self.statement_flow()
             else:
-                print("Invalid choice")
+                self._print("Invalid choice")
 
 if __name__ == "__main__":
-    BankManager()
+    # Imported here: the menu itself does not need them, so embedding it starts faster
+    import argparse
+    import contextlib
+
+    parser = argparse.ArgumentParser(description="Bank Manager")
+    parser.add_argument("--journal", help="journal file for durable state (replayed on startup)")
+    parser.add_argument("--snapshot", help="snapshot file loaded on startup and written on exit (needs --journal)")
+    parser.add_argument("--script", help="answer the prompts from this file, one line per prompt, instead of the terminal")
+    parser.add_argument("--output", help="write the session here instead of to the screen")
+    parser.add_argument("--record", help="append every answer typed at the terminal to this file, for --script")
+    parser.add_argument("--unlock", type=int, metavar="ACCOUNT",
+                        help="clear ACCOUNT's PIN lockout (operator use) and exit instead of showing the menu")
+    args = parser.parse_args()
+
+    if args.unlock is not None:
+        with BankManager(args.journal, args.snapshot, autoRun=False) as manager:
+            if manager.bank.findAccount(args.unlock) is None:
+                parser.error(f"No account {args.unlock}.")
+            manager.bank.unlockAccount(args.unlock)
+        print(f"Account {args.unlock} unlocked.")
+        raise SystemExit(0)
+
+    with contextlib.ExitStack() as files:
+        script = files.enter_context(open(args.script)) if args.script else None
+        output = files.enter_context(open(args.output, "w")) if args.output else None
+        record = files.enter_context(open(args.record, "a", buffering=1)) if args.record else None
+        BankManager(args.journal, args.snapshot, script=script, output=output, record=record)
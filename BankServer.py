@@ -0,0 +1,214 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from Bank import Bank
+from BankService import BankService, ServiceError
+from Instrumentation import Instrumentation
+from Ledger import Ledger
+from MoneyParser import MoneyParser
+
+
+class BankServer:
+    """
+    asyncio TCP front end for BankService: one JSON object per line each way.
+
+    Request:   {"id": 7, "op": "deposit", "account": 12345678, "pin": "0319", "amount": "12.50"}
+    Response:  {"id": 7, "ok": true, "result": {"balanceInCents": 1250}}
+           or  {"id": 7, "ok": false, "error": "Incorrect PIN."}
+
+    Ops (extra fields):  open (first, last, ssn), info, changePin (newPin),
+    deposit (amount), withdraw (amount), transfer (to, amount), atm (amount),
+    coins (coins), close. Every op except open needs account + pin. Bank-wide
+    operations such as monthly interest are not served: they are for the
+    operator, at the BankManager menu or with PostingSchedule. Amounts are
+    dollars, as typed at the menu (see MoneyParser). deposit, withdraw,
+    transfer and coins also take an optional "key": a retried request
+    with the same key gets the first response instead of moving money again. Each
+    connection is one session, so only its first request for an account pays
+    for the PIN hash (see BankService.authenticate).
+
+    Clients may pipeline requests; responses come back in request order. A
+    connection reads at most `pipelineDepth` requests ahead of the responses it
+    has written, and each response waits for the socket to drain, so a slow
+    reader stops the server from reading more of its requests (backpressure).
+
+    Requests run on a pool of `workers` threads, never on the event loop: a PIN
+    hash takes milliseconds and a durable journal append waits for its group
+    commit, and either would stall every other connection. A connection has
+    one request running at a time, so a client sending wrong PINs as fast as it
+    can ties up one worker, not the server.
+    """
+
+    def __init__(self, service: BankService, pipelineDepth: int = 64, workers: int = 32):
+        self.service = service
+        self.pipelineDepth = pipelineDepth
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="bank-request")
+        self._sessions = itertools.count(1)
+        self._ops = {
+            "open": self._open, "info": self._info, "changePin": self._changePin,
+            "deposit": self._deposit, "withdraw": self._withdraw, "transfer": self._transfer,
+            "atm": self._atm, "coins": self._coins, "close": self._close,
+        }
+
+    # ---------- Request handling ----------
+    @staticmethod
+    def _cents(request) -> int:
+        cents = MoneyParser.parseCents(str(request["amount"]))
+        if cents <= 0:
+            raise ServiceError("Please enter a number greater than 0.")
+        return cents
+
+    def _auth(self, request, session) -> int:
+        num = int(request["account"])
+        self.service.authenticate(num, str(request["pin"]), session)
+        return num
+
+    def _open(self, request, session):
+        acct = self.service.openAccount(str(request["first"]), str(request["last"]), str(request["ssn"]))
+        return {"accountNumber": acct.getAccountNumber(), "pin": acct.getPIN()}
+
+    def _info(self, request, session):
+        acct = self.service.findAccount(self._auth(request, session))
+        return {
+            "accountNumber": acct.getAccountNumber(),
+            "firstName": acct.getOwnerFirstName(),
+            "lastName": acct.getOwnerLastName(),
+            "ssn": f"XXX-XX-{acct.getOwnerSSN()[-4:]}",
+            "balanceInCents": acct.getBalanceInCents(),
+        }
+
+    def _changePin(self, request, session):
+        self.service.changePIN(self._auth(request, session), str(request["newPin"]))
+        return {}
+
+    def _deposit(self, request, session):
+        num, cents = self._auth(request, session), self._cents(request)
+        return {"balanceInCents": self.service.deposit(num, cents, Ledger.DEPOSIT, request.get("key"))}
+
+    def _withdraw(self, request, session):
+        num, cents = self._auth(request, session), self._cents(request)
+        return {"balanceInCents": self.service.withdraw(num, cents, request.get("key"))}
+
+    def _transfer(self, request, session):
+        src_bal, dst_bal = self.service.transfer(self._auth(request, session), int(request["to"]),
+                                                 self._cents(request), request.get("key"))
+        return {"balanceInCents": src_bal, "toBalanceInCents": dst_bal}
+
+    def _atm(self, request, session):
+        bills, bal = self.service.atmWithdrawal(self._auth(request, session), self._cents(request))
+        return {"bills": {str(b): n for b, n in bills.items()}, "balanceInCents": bal}
+
+    def _coins(self, request, session):
+        cents, bal = self.service.depositCoins(self._auth(request, session), str(request["coins"]), request.get("key"))
+        return {"depositedInCents": cents, "balanceInCents": bal}
+
+    def _close(self, request, session):
+        self.service.closeAccount(self._auth(request, session))
+        return {}
+
+    def dispatch(self, line: bytes, session=None) -> bytes:
+        """
+        Handle one request line (from `session`) and return the encoded response
+        line. Never raises: whatever goes wrong is that request's error response,
+        so the rest of its batch and its connection carry on.
+        """
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            op = self._ops.get(request.get("op"))
+            if op is None:
+                raise ServiceError(f"Unknown op {request.get('op')!r}.")
+            response = {"id": request_id, "ok": True, "result": op(request, session)}
+        except ServiceError as e:
+            response = {"id": request_id, "ok": False, "error": str(e)}
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            response = {"id": request_id, "ok": False, "error": f"Malformed request: {e!r}"}
+        except Exception as e:
+            response = {"id": request_id, "ok": False, "error": f"Request failed: {e!r}"}
+        return json.dumps(response, separators=(",", ":")).encode() + b"\n"
+
+    def _dispatchAll(self, lines: list, session) -> bytes:
+        return b"".join(self.dispatch(line, session) for line in lines if line and line.strip())
+
+    # ---------- Connections ----------
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        pending = asyncio.Queue(self.pipelineDepth)
+        session = next(self._sessions)
+
+        async def read_requests():
+            try:
+                while line := await reader.readline():
+                    await pending.put(line)
+            except (ConnectionError, ValueError):
+                pass   # reset connection or a line over the stream limit: stop reading
+            finally:
+                await pending.put(None)
+
+        loop = asyncio.get_running_loop()
+        reading = asyncio.create_task(read_requests())
+        done = False
+        try:
+            while not done:
+                # Hand every request already queued to one worker: one thread hop per batch, not per request
+                batch = [await pending.get()]
+                while batch[-1] is not None and not pending.empty():
+                    batch.append(pending.get_nowait())
+                done = batch[-1] is None
+                writer.write(await loop.run_in_executor(self._executor, self._dispatchAll, batch, session))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            reading.cancel()
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765, ready=None):
+        server = await asyncio.start_server(self.handle, host, port, backlog=4096)
+        if ready is not None:
+            ready()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def runServer(host: str, port: int, journalPath=None, snapshotPath=None, syncIntervalMs=None, ready=None,
+              metricsPort=None):
+    """Build a Bank + BankServer and serve until interrupted (with metricsPort, also serve /metrics there)."""
+    # Requests answer once journaled durably; concurrent ones share an fsync (group commit)
+    bank = Bank(journalPath, syncIntervalMs=syncIntervalMs, snapshotPath=snapshotPath)
+    metrics = None
+    if metricsPort is not None:
+        metrics = Instrumentation()
+        metrics.enable()
+        metrics.serve(metricsPort, host)
+    try:
+        service = BankService(bank, maxConcurrentHashes=os.cpu_count() or 1)
+        asyncio.run(BankServer(service).serve(host, port, ready))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if metrics is not None:
+            metrics.stopServing()
+            metrics.disable()
+        bank.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve bank operations over TCP (JSON lines)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--journal", help="journal file for durable state")
+    parser.add_argument("--snapshot", help="snapshot file (needs --journal)")
+    parser.add_argument("--sync-interval-ms", type=float, default=0,
+                        help="how long a journal fsync waits for more requests to join it (0 = no wait)")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port (off by default)")
+    args = parser.parse_args()
+    runServer(args.host, args.port, args.journal, args.snapshot, args.sync_interval_ms or None,
+              ready=lambda: print(f"Listening on {args.host}:{args.port}"), metricsPort=args.metrics_port)
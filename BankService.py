@@ -0,0 +1,270 @@
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+
+from ATMDispenser import ATMDispenser
+from Account import Account
+from Bank import Bank
+from BankUtility import BankUtility
+from CoinCollector import CoinCollector
+from Ledger import Ledger
+
+
+class ServiceError(Exception):
+    """A request was refused; str(error) is the message to show the user."""
+
+
+class _AuthCache:
+    """
+    Bounded LRU of recently verified (account, session) pairs, each valid for
+    `ttlSeconds`. An entry keeps a fast digest of the PIN together with the
+    stored hash it was checked against, never the PIN itself, so a hit needs
+    the same PIN and goes stale as soon as the PIN is changed.
+    """
+
+    def __init__(self, maxSize: int, ttlSeconds: float):
+        self.maxSize = maxSize
+        self.ttlSeconds = ttlSeconds
+        self._entries = OrderedDict()    # (account, session) -> (token, expires at)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _token(pin: str, pinHash: bytes) -> bytes:
+        return hashlib.sha256(pinHash + pin.encode()).digest()
+
+    def hit(self, key: tuple, pin: str, pinHash: bytes) -> bool:
+        if self.maxSize <= 0:
+            return False
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            token, expires = entry
+            if time.monotonic() >= expires:
+                del self._entries[key]
+                return False
+            self._entries.move_to_end(key)
+        return hmac.compare_digest(token, _AuthCache._token(pin, pinHash))
+
+    def add(self, key: tuple, pin: str, pinHash: bytes):
+        if self.maxSize <= 0:
+            return
+        entry = (_AuthCache._token(pin, pinHash), time.monotonic() + self.ttlSeconds)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxSize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: tuple):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class BankService:
+    """
+    Non-interactive operations behind the BankManager menu, for the CLI and the
+    network server alike. Methods take already-parsed values, never prompt or
+    print, and raise ServiceError with a user-facing message when a request is
+    refused. Callers authenticate first with authenticate().
+
+    deposit, withdraw, transfer and depositCoins take an optional idempotency
+    key, so a client that retries after a timeout is answered from the first
+    attempt instead of moving money twice (see Bank.deposit).
+
+    PINs are stored as slow hashes, so authenticate() remembers which
+    (account, session) pairs it verified recently (at most authCacheSize, for
+    authCacheTTL seconds) and skips the hash for repeat requests in a session.
+    authCacheSize=0 turns the cache off. maxConcurrentHashes caps how many
+    threads hash a PIN at once, so a flood of wrong PINs leaves CPU for the
+    requests that skip the hash (None: no cap).
+    """
+
+    MAX_APR = Decimal(100)       # percent; addMonthlyInterest refuses anything higher
+
+    def __init__(self, bank: Bank, atm: ATMDispenser | None = None,
+                 authCacheSize: int = 10000, authCacheTTL: float = 300.0, maxConcurrentHashes: int | None = None):
+        self.bank = bank
+        self.atm = atm if atm is not None else ATMDispenser()
+        self._authCache = _AuthCache(authCacheSize, authCacheTTL)
+        self._hashing = threading.BoundedSemaphore(maxConcurrentHashes) if maxConcurrentHashes else None
+
+    # ---------- Lookup / auth ----------
+    def findAccount(self, accountNumber: int) -> Account:
+        acct = self.bank.findAccount(accountNumber)
+        if acct is None:
+            raise ServiceError("No account found with that number.")
+        return acct
+
+    def authenticate(self, accountNumber: int, pin: str, session=None) -> Account:
+        """
+        Check pin for accountNumber. session (any hashable id, e.g. one per
+        connection) lets a repeat request skip the slow hash; None always verifies.
+        Wrong PINs are counted per account and lock it at Bank.MAX_PIN_ATTEMPTS,
+        for Bank.PIN_LOCKOUT_SECONDS.
+        """
+        acct = self.findAccount(accountNumber)
+        if self.bank.isLocked(accountNumber):
+            raise ServiceError("Account is locked after too many incorrect PIN attempts. "
+                               f"Try again in {BankService._lockoutMinutes()} or contact the bank.")
+        key = (accountNumber, session)
+        if session is not None and self._authCache.hit(key, pin, self.bank.getPINHash(accountNumber)):
+            return acct
+        if self._hashing is None:
+            verified = self.bank.checkPIN(accountNumber, pin)
+        else:
+            with self._hashing:
+                verified = self.bank.checkPIN(accountNumber, pin)
+        if not verified:
+            self._authCache.discard(key)
+            if self.bank.isLocked(accountNumber):
+                raise ServiceError("Incorrect PIN. The account is now locked for "
+                                   f"{BankService._lockoutMinutes()}; contact the bank to unlock it sooner.")
+            raise ServiceError("Incorrect PIN.")
+        if session is not None:
+            self._authCache.add(key, pin, self.bank.getPINHash(accountNumber))
+        return acct
+
+    @staticmethod
+    def _lockoutMinutes() -> str:
+        minutes = max(1, round(Bank.PIN_LOCKOUT_SECONDS / 60))
+        return f"{minutes} minute{'s' if minutes != 1 else ''}"
+
+    @staticmethod
+    def _requirePositive(amountInCents: int):
+        if amountInCents <= 0:
+            raise ServiceError("Please enter a number greater than 0.")
+
+    @staticmethod
+    def _keyed(move, *args):
+        # A malformed or reused idempotency key is the caller's mistake, not ours
+        try:
+            return move(*args)
+        except ValueError as e:
+            raise ServiceError(str(e)) from None
+
+    def _insufficient(self, accountNumber: int) -> ServiceError:
+        bal = self.bank.findAccount(accountNumber).getBalanceInCents()
+        return ServiceError(f"Insufficient funds. Current balance: {BankUtility.formatCents(bal)}")
+
+    # ---------- Operations ----------
+    def openAccount(self, first: str, last: str, ssn9: str) -> Account:
+        if not (first and last):
+            raise ServiceError("Input cannot be empty. Try again.")
+        if not (ssn9.isdigit() and len(ssn9) == 9):
+            raise ServiceError("Invalid SSN. Please enter exactly 9 digits (no dashes).")
+        if self.bank.isFull():
+            raise ServiceError("Sorry—the bank is full. Cannot open more accounts.")
+        return self.bank.openAccount(first, last, ssn9)
+
+    def changePIN(self, accountNumber: int, newPIN: str):
+        acct = self.findAccount(accountNumber)
+        if not (newPIN.isdigit() and len(newPIN) == 4):
+            raise ServiceError("Invalid PIN format. Please enter exactly 4 digits.")
+        if acct.isValidPIN(newPIN):
+            raise ServiceError("New PIN cannot be the same as the current PIN.")
+        acct.setPIN(newPIN)
+
+    def deposit(self, accountNumber: int, amountInCents: int, kind: int = Ledger.DEPOSIT,
+                idempotencyKey: str | None = None) -> int:
+        """Returns the new balance."""
+        self._requirePositive(amountInCents)
+        new_bal = self._keyed(self.bank.deposit, accountNumber, amountInCents, kind, idempotencyKey)
+        if new_bal is None:
+            self.findAccount(accountNumber)
+            raise ServiceError("That amount would take the balance past the most an account can hold.")
+        return new_bal
+
+    def withdraw(self, accountNumber: int, amountInCents: int, idempotencyKey: str | None = None) -> int:
+        """Returns the new balance."""
+        self._requirePositive(amountInCents)
+        self.findAccount(accountNumber)
+        # Check and withdraw in one step so a concurrent withdrawal cannot overdraw
+        new_bal = self._keyed(self.bank.withdraw, accountNumber, amountInCents, Ledger.WITHDRAWAL, idempotencyKey)
+        if new_bal is None:
+            raise self._insufficient(accountNumber)
+        return new_bal
+
+    def transfer(self, fromAccountNumber: int, toAccountNumber: int, amountInCents: int,
+                 idempotencyKey: str | None = None) -> tuple[int, int]:
+        """Returns (source balance, destination balance) after the transfer."""
+        self.findAccount(fromAccountNumber)
+        if self.bank.findAccount(toAccountNumber) is None:
+            raise ServiceError("No destination account found with that number.")
+        if fromAccountNumber == toAccountNumber:
+            raise ServiceError("Cannot transfer to the same account.")
+        self._requirePositive(amountInCents)
+        if not self._keyed(self.bank.transfer, fromAccountNumber, toAccountNumber, amountInCents, idempotencyKey):
+            if self.findAccount(fromAccountNumber).getBalanceInCents() >= amountInCents:
+                raise ServiceError("That amount would take the destination balance past the most an account can hold.")
+            raise self._insufficient(fromAccountNumber)
+        return (self.bank.findAccount(fromAccountNumber).getBalanceInCents(),
+                self.bank.findAccount(toAccountNumber).getBalanceInCents())
+
+    def atmWithdrawal(self, accountNumber: int, cents: int) -> tuple[dict, int]:
+        """
+        Dispense whole dollars from the ATM's cassettes (fewest bills that are on hand).
+        Returns ({bill: count}, new balance).
+        """
+        if cents % 100:
+            raise ServiceError("ATM can only dispense whole dollars. Try again.")
+        self._requirePositive(cents)
+        if cents // 100 > self.atm.maxDispense:
+            raise ServiceError(f"This ATM dispenses at most {BankUtility.formatCents(self.atm.maxDispense * 100)} "
+                               "per withdrawal.")
+        if self.findAccount(accountNumber).getBalanceInCents() < cents:
+            raise self._insufficient(accountNumber)
+
+        # Take the bills first so two withdrawals cannot both be promised the last ones
+        bills = self.atm.dispense(cents // 100)
+        if bills is None:
+            raise ServiceError(f"This ATM cannot dispense {BankUtility.formatCents(cents)} "
+                               "with the bills it has. Try a different amount.")
+        new_bal = self.bank.withdraw(accountNumber, cents, Ledger.ATM)
+        if new_bal is None:
+            self.atm.load(bills)
+            raise self._insufficient(accountNumber)
+        return bills, new_bal
+
+    def depositCoins(self, accountNumber: int, coins: str, idempotencyKey: str | None = None) -> tuple[int, int]:
+        """Returns (cents deposited, new balance)."""
+        cents = CoinCollector.parseChange(coins)
+        if cents <= 0:
+            raise ServiceError("No valid coins detected. Nothing deposited.")
+        return cents, self.deposit(accountNumber, cents, Ledger.COINS, idempotencyKey)
+
+    def statement(self, accountNumber: int, start: float | None = None, end: float | None = None,
+                  limit: int | None = None) -> list:
+        """Ledger entries for start <= time < end (epoch seconds); see Bank.getStatement."""
+        self.findAccount(accountNumber)
+        if start is not None and end is not None and end <= start:
+            raise ServiceError("The end date must be after the start date.")
+        return self.bank.getStatement(accountNumber, start, end, limit)
+
+    def closeAccount(self, accountNumber: int):
+        bal = self.findAccount(accountNumber).getBalanceInCents()
+        if bal != 0:
+            raise ServiceError(
+                f"Account must have a zero balance to close (current: {BankUtility.formatCents(bal)}).")
+        if not self.bank.removeAccountFromBank(accountNumber):
+            raise ServiceError("Unexpected error closing account.")
+
+    def addMonthlyInterest(self, apr) -> tuple[int, int]:
+        """Returns (accounts updated, total interest in cents). apr is a percent from 0 to MAX_APR."""
+        try:
+            rate = Decimal(str(apr))
+        except InvalidOperation:
+            raise ServiceError("Invalid rate. Try again.") from None
+        if not rate.is_finite():
+            raise ServiceError("Invalid rate. Try again.")
+        if rate < 0:
+            raise ServiceError("Rate cannot be negative.")
+        if rate > BankService.MAX_APR:
+            raise ServiceError(f"Rate cannot be more than {BankService.MAX_APR}%.")
+        try:
+            return self.bank.applyMonthlyInterest(apr)
+        except ValueError as e:
+            raise ServiceError(str(e)) from None
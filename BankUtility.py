@@ -1,27 +1,51 @@
+import hashlib
+import hmac
+import os
 import random
+import struct
 from decimal import Decimal, ROUND_HALF_UP
 
+from MoneyParser import MoneyParser
+
 class BankUtility:
+    # Stored PIN hash: uint32 iteration count, 12-byte salt, 32-byte PBKDF2-HMAC-SHA256 digest
+    PIN_HASH_SIZE = 48
+    PIN_HASH_ITERATIONS = 20000
 
+    # The prompts read with `read` and report problems with `write`, so a
+    # scripted BankManager can supply its own
     @staticmethod
-    def promptUserForString(prompt):
+    def promptUserForString(prompt, read=input, write=print):
         while True:
-            s = input(prompt).strip()
+            s = read(prompt).strip()
             if s:
                 return s
-            print("Input cannot be empty. Try again.")
+            write("Input cannot be empty. Try again.")
 
     @staticmethod
-    def promptUserForPositiveNumber(prompt):
+    def promptUserForPositiveNumber(prompt, read=input, write=print):
         while True:
-            s = input(prompt).strip().replace("$", "")
+            s = read(prompt).strip().replace("$", "")
             try:
                 val = float(s)
                 if val > 0:
                     return val
-                print("Please enter a number greater than 0.")
+                write("Please enter a number greater than 0.")
+            except ValueError:
+                write("Invalid number. Please try again.")
+
+    @staticmethod
+    def promptUserForPositiveCents(prompt, read=input, write=print):
+        """Like promptUserForPositiveNumber, but returns the amount in cents, parsed without floats."""
+        while True:
+            try:
+                cents = MoneyParser.parseCents(read(prompt))
             except ValueError:
-                print("Invalid number. Please try again.")
+                write("Invalid number. Please try again.")
+                continue
+            if cents > 0:
+                return cents
+            write("Please enter a number greater than 0.")
 
     @staticmethod
     def convertFromDollarsToCents(amount):
@@ -32,6 +56,74 @@ class BankUtility:
         cents = int(Decimal(str(amount)).scaleb(2).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
         return cents
 
+    @staticmethod
+    def formatCents(cents):
+        """Format an int number of cents like $1,234.05."""
+        dollars = cents // 100
+        cents_only = cents % 100
+        return f"${dollars:,}.{cents_only:02d}"
+
+    @staticmethod
+    def monthlyRateFromAPR(apr):
+        """
+        Return (numerator, exponent) such that numerator * 10**exponent equals
+        Decimal(str(apr)) / 1200 -- the monthly rate exactly as the Decimal code computes it.
+        """
+        rate = Decimal(str(apr)) / Decimal("1200")
+        exponent = rate.as_tuple().exponent
+        return int(rate.scaleb(-exponent)), exponent
+
+    @staticmethod
+    def monthlyInterestInCents(balanceInCents, rateNumerator, rateExponent):
+        """
+        Interest in cents for a positive balance, using only integer arithmetic.
+        Matches (Decimal(cents)/100 * rate).quantize(Decimal("0.01"), ROUND_HALF_UP)
+        under the default 28-digit Decimal context, to the cent.
+        """
+        p = balanceInCents * rateNumerator      # interest in cents == p * 10**rateExponent
+        if p <= 0:
+            return 0
+        if rateExponent >= 0:
+            return p * 10 ** rateExponent
+        d = 10 ** -rateExponent
+        q, r = divmod(p, d)
+        # Decimal rounds the product to 28 significant digits first; that can only
+        # change the half-up result when the remainder sits within 10**-27 * p of a tie.
+        if abs(2 * r - d) * 10 ** 27 > p:
+            return q + (2 * r > d)
+        digits = len(str(p))
+        if digits > 28:
+            unit = 10 ** (digits - 28)
+            p, r = divmod(p, unit)
+            if 2 * r > unit or (2 * r == unit and p & 1):   # ROUND_HALF_EVEN
+                p += 1
+            rateExponent += digits - 28
+            if rateExponent >= 0:
+                return p * 10 ** rateExponent
+            d = 10 ** -rateExponent
+        return (2 * p + d) // (2 * d)   # ROUND_HALF_UP
+
+    @staticmethod
+    def hashPIN(pin: str, iterations: int | None = None) -> bytes:
+        """
+        Salted, deliberately slow hash of a PIN (PIN_HASH_SIZE bytes).
+        The iteration count is stored with the hash, so raising
+        PIN_HASH_ITERATIONS later does not invalidate existing PINs.
+        """
+        iterations = iterations or BankUtility.PIN_HASH_ITERATIONS
+        salt = os.urandom(12)
+        digest = hashlib.pbkdf2_hmac("sha256", str(pin).encode(), salt, iterations)
+        return struct.pack("<I", iterations) + salt + digest
+
+    @staticmethod
+    def verifyPIN(pin: str, pinHash: bytes) -> bool:
+        """True if pin hashes to pinHash. An all-zero hash means no PIN is set and never matches."""
+        iterations, = struct.unpack_from("<I", pinHash)
+        if iterations == 0:
+            return False
+        digest = hashlib.pbkdf2_hmac("sha256", str(pin).encode(), bytes(pinHash[4:16]), iterations)
+        return hmac.compare_digest(digest, bytes(pinHash[16:]))
+
     @staticmethod
     def generateRandomInteger(low, high):
         return random.randint(low, high)
@@ -0,0 +1,162 @@
+import argparse
+import csv
+import json
+import time
+
+from Bank import Bank
+from CoinCollector import CoinCollector
+from Ledger import Ledger
+from MoneyParser import MoneyParser
+
+
+class BatchProcessor:
+    """
+    Streams deposit / withdraw / transfer / coins records from a CSV or NDJSON
+    file into a Bank, applying the same rules as the BankManager flows, and
+    writes one result line per input record.
+
+    CSV input has a header row with the columns  op,account,amount,to,coins,key
+    (unused columns may be left empty); NDJSON input has one object per line
+    with the same keys. Amounts are in dollars, e.g. "12.50" or "$1,250.00". A record with a
+    key is applied at most once, so a file can be re-run after a crash (see
+    Bank.deposit).
+
+    The result file is CSV:  record,status,detail  where status is "ok"
+    (detail = new balance in cents of `account`) or "rejected" (detail = reason);
+    a line that is not valid JSON is rejected as a malformed record. Input is read and results are written in chunks of `chunkSize` records, so
+    memory use does not depend on the size of the file.
+    """
+
+    def __init__(self, bank: Bank, chunkSize: int = 10000):
+        self.bank = bank
+        self.chunkSize = chunkSize
+
+    # ---------- Reading ----------
+    @staticmethod
+    def _csvRecords(f):
+        yield from csv.DictReader(f)
+
+    @staticmethod
+    def _ndjsonRecords(f):
+        # Lines are decoded one record at a time in processFile, so a bad line rejects only itself
+        for line in f:
+            if line.strip():
+                yield line
+
+    # ---------- Rules ----------
+    def _amountInCents(self, record) -> int | None:
+        try:
+            cents = MoneyParser.parseCents(str(record.get("amount") or ""))
+        except ValueError:
+            return None
+        return cents if cents > 0 else None
+
+    def processRecord(self, record) -> tuple[bool, str]:
+        """Apply one record. Returns (ok, detail)."""
+        op = record.get("op")
+        key = record.get("key") or None
+        try:
+            acct = self.bank.findAccount(int(record.get("account")))
+        except (TypeError, ValueError):
+            return False, "invalid account number"
+        if acct is None:
+            return False, "no account found"
+
+        if op == "coins":
+            cents = CoinCollector.parseChange(record.get("coins") or "")
+            if cents <= 0:
+                return False, "no valid coins detected"
+            new_bal = self.bank.deposit(acct.getAccountNumber(), cents, Ledger.COINS, key)
+            if new_bal is None:
+                return False, "amount too large for the account"
+            return True, str(new_bal)
+
+        cents = self._amountInCents(record)
+        if cents is None:
+            return False, "amount must be a number greater than 0"
+        if op == "deposit":
+            new_bal = acct.deposit(cents, key)
+            if new_bal is None:
+                return False, "amount too large for the account"
+            return True, str(new_bal)
+        if op == "withdraw":
+            new_bal = self.bank.withdraw(acct.getAccountNumber(), cents, Ledger.WITHDRAWAL, key)
+            if new_bal is None:
+                return False, "insufficient funds"
+            return True, str(new_bal)
+        if op == "transfer":
+            try:
+                dst = self.bank.findAccount(int(record.get("to")))
+            except (TypeError, ValueError):
+                return False, "invalid destination account number"
+            if dst is None:
+                return False, "no destination account found"
+            if dst.getAccountNumber() == acct.getAccountNumber():
+                return False, "cannot transfer to the same account"
+            if not self.bank.transfer(acct.getAccountNumber(), dst.getAccountNumber(), cents, key):
+                return False, "insufficient funds"
+            return True, str(acct.getBalanceInCents())
+        return False, f"unknown op {op!r}"
+
+    # ---------- Driver ----------
+    def processFile(self, inputPath: str, resultPath: str, fileFormat: str | None = None) -> dict:
+        """
+        Process inputPath and write results to resultPath.
+        fileFormat is "csv" or "ndjson"; by default it is taken from the file extension.
+        Returns a summary: records, ok, rejected, seconds, recordsPerSecond.
+        """
+        if fileFormat is None:
+            fileFormat = "csv" if inputPath.lower().endswith(".csv") else "ndjson"
+        reader = {"csv": self._csvRecords, "ndjson": self._ndjsonRecords}[fileFormat]
+        decode = json.loads if fileFormat == "ndjson" else None
+
+        total = ok = 0
+        start = time.perf_counter()
+        with open(inputPath, newline="") as src, open(resultPath, "w", newline="") as out:
+            writer = csv.writer(out)
+            writer.writerow(["record", "status", "detail"])
+            chunk = []
+            try:
+                for record in reader(src):
+                    total += 1
+                    try:
+                        if decode is not None:
+                            record = decode(record)
+                        success, detail = self.processRecord(record)
+                    except (AttributeError, OverflowError, TypeError, ValueError):
+                        success, detail = False, "malformed record"
+                    ok += success
+                    chunk.append((total, "ok" if success else "rejected", detail))
+                    if len(chunk) >= self.chunkSize:
+                        writer.writerows(chunk)
+                        chunk.clear()
+            finally:
+                # Whatever stops the run, the records already applied get their results
+                writer.writerows(chunk)
+        self.bank.sync()
+        seconds = time.perf_counter() - start
+        return {
+            "records": total,
+            "ok": ok,
+            "rejected": total - ok,
+            "seconds": seconds,
+            "recordsPerSecond": total / seconds if seconds else 0.0,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply a batch file of transactions to the bank")
+    parser.add_argument("input", help="CSV or NDJSON transaction file")
+    parser.add_argument("results", help="where to write per-record results (CSV)")
+    parser.add_argument("--journal", required=True, help="bank journal file")
+    parser.add_argument("--snapshot", help="bank snapshot file")
+    parser.add_argument("--format", choices=["csv", "ndjson"])
+    args = parser.parse_args()
+
+    bank = Bank(args.journal, syncEvery=0, snapshotPath=args.snapshot)
+    try:
+        summary = BatchProcessor(bank).processFile(args.input, args.results, args.format)
+    finally:
+        bank.close()
+    print(f"{summary['records']:,} records ({summary['ok']:,} ok, {summary['rejected']:,} rejected) "
+          f"in {summary['seconds']:.2f}s -- {summary['recordsPerSecond']:,.0f} records/s")
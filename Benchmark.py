@@ -0,0 +1,1831 @@
+"""
+Benchmarks for the banking modules.
+
+Run a single scenario from the command line, e.g.:
+    python Benchmark.py memory --accounts 1000000
+
+Track performance over time with the workload scenario: save a run, then
+compare later runs against it (exit status 1 on a regression):
+    python Benchmark.py workload --threads 1,4 --json baseline.json
+    python Benchmark.py workload --threads 1,4 --baseline baseline.json
+"""
+import argparse
+import asyncio
+import inspect
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from decimal import Decimal, ROUND_HALF_UP
+
+try:
+    import resource
+except ImportError:    # not on Windows; peak RSS is then not reported
+    resource = None
+
+from ATMDispenser import ATMDispenser
+from AccountNumberAllocator import AccountNumberAllocator
+from Account import Account
+from Bank import Bank
+from BankManager import BankManager
+from BankServer import runServer
+from BankService import BankService
+from BankUtility import BankUtility
+from BatchProcessor import BatchProcessor
+from CoinCollector import CoinCollector
+from Instrumentation import Instrumentation
+from Journal import Journal
+from Ledger import Ledger
+from MoneyParser import MoneyParser
+from PartitionedBank import PartitionedBank, PartitionUnavailable
+from PostingSchedule import AccountClass, PostingSchedule
+from SharedBalances import SharedBalances
+
+_FIRST_NAMES = ["James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda",
+                "David", "Elizabeth", "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica"]
+_LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
+               "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas"]
+
+
+class _LegacyAccount:
+    # Same attribute layout as the original dict-backed Account, for comparison only
+    def __init__(self, num, first, last, ssn, pin, cents):
+        self._accountNumber = num
+        self._ownerFirstName = first
+        self._ownerLastName = last
+        self._ownerSSN = ssn
+        self._pin = pin
+        self._balanceInCents = cents
+
+
+def _synthetic_rows(n: int, seed: int):
+    """Yield (number, first, last, ssn, pin, cents) tuples with unique numbers."""
+    rng = random.Random(seed)
+    for num in rng.sample(range(10000000, 100000000), n):
+        yield (num,
+               rng.choice(_FIRST_NAMES),
+               rng.choice(_LAST_NAMES),
+               f"{rng.randrange(10**9):09d}",
+               f"{rng.randrange(10000):04d}",
+               rng.randrange(0, 10**7))
+
+
+def build_bank(n: int, seed: int = 1, viaAccounts: bool = False, shards: int = 1, bank: Bank | None = None) -> Bank:
+    """
+    Fill a Bank (a new one, or `bank`) with n synthetic accounts, all with PIN
+    "0000" (MAX_ACCOUNTS is raised for this instance). viaAccounts=True goes
+    through Account + addAccountToBank; otherwise rows are written straight
+    into the store, which is much faster for large banks.
+    """
+    if bank is None:
+        bank = Bank(shards=shards)
+    bank.MAX_ACCOUNTS = max(n, Bank.MAX_ACCOUNTS)
+    # PIN hashing is slow on purpose, so every synthetic row shares one hash of "0000"
+    pin_hash = BankUtility.hashPIN("0000")
+    if not viaAccounts:
+        add_row = bank._store.addRow
+        for num, first, last, ssn, pin, cents in _synthetic_rows(n, seed):
+            add_row(num, first, last, ssn, pin_hash, cents)
+        return bank
+    for num, first, last, ssn, pin, cents in _synthetic_rows(n, seed):
+        a = Account()
+        a.setAccountNumber(num)
+        a.setOwnerFirstName(first)
+        a.setOwnerLastName(last)
+        a.setOwnerSSN(ssn)
+        a.setBalanceInCents(cents)
+        bank.addAccountToBank(a)
+        bank._store.setPIN(num, pin_hash)
+    return bank
+
+
+def _traced(build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    obj = build()
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, current, elapsed
+
+
+# ---------- Scenarios ----------
+def bench_memory(args):
+    n = args.accounts
+
+    def build_legacy():
+        return {row[0]: _LegacyAccount(*row) for row in _synthetic_rows(n, args.seed)}
+
+    legacy, legacy_bytes, legacy_secs = _traced(build_legacy)
+    del legacy
+    bank, store_bytes, store_secs = _traced(lambda: build_bank(n, args.seed, viaAccounts=True))
+
+    print(f"accounts: {n:,}")
+    print(f"  dict of Account objects: {legacy_bytes / 2**20:8.1f} MiB "
+          f"({legacy_bytes / n:6.1f} B/account, built in {legacy_secs:.2f}s)")
+    print(f"  columnar AccountStore:   {store_bytes / 2**20:8.1f} MiB "
+          f"({store_bytes / n:6.1f} B/account, built in {store_secs:.2f}s)")
+    print(f"  ratio: {legacy_bytes / store_bytes:.2f}x")
+    return bank
+
+
+def _decimal_interest(balanceInCents: int, monthlyRate: Decimal) -> int:
+    """Interest in cents as the original add_monthly_interest_flow computed it."""
+    if balanceInCents <= 0:
+        return 0
+    bal = Decimal(balanceInCents) / Decimal(100)
+    interest = (bal * monthlyRate).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    return int((interest * Decimal(100)).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def _legacy_interest(bank: Bank, apr) -> list:
+    """The original per-account Decimal loop from add_monthly_interest_flow (without depositing)."""
+    monthly_rate = Decimal(str(apr)) / Decimal("1200")
+    return [_decimal_interest(acct.getBalanceInCents(), monthly_rate) for acct in bank.getAllAccounts()]
+
+
+def _interest_ties(apr: str, count: int, rng: random.Random) -> list:
+    """Up to count balances whose interest at apr is exactly a whole cent plus one half."""
+    numerator, exponent = BankUtility.monthlyRateFromAPR(apr)
+    if exponent >= 0:
+        return []
+    d = 10 ** -exponent
+    # Solve balance * numerator == d / 2 (mod d)
+    g = math.gcd(numerator, d)
+    if (d // 2) % g:
+        return []
+    m = d // g
+    first = (d // 2 // g) * pow(numerator // g, -1, m) % m if m > 1 else 0
+    if first > 10 ** 12:
+        return []
+    return [first + k * m for k in sorted(rng.sample(range(min(10 ** 12 // m, 10 ** 6) + 1), count))
+            if 0 < first + k * m <= 10 ** 12]
+
+
+def _interest_cases(cases: int, seed: int):
+    """Yield (APR string, balances): random APRs with up to four decimals, random balances and tie balances."""
+    rng = random.Random(seed)
+    for _ in range(cases):
+        decimals = rng.randrange(5)
+        apr = str(rng.randrange(50))
+        if decimals:
+            apr += "." + "".join(rng.choice("0123456789") for _ in range(decimals))
+        balances = [rng.randrange(1, 10 ** rng.randrange(1, 13)) for _ in range(200)]
+        balances += _interest_ties(apr, 50, rng) + [0, -rng.randrange(1, 10 ** 6)]
+        yield apr, balances
+
+
+def _interest_property(cases: int, seed: int) -> tuple[int, int, int]:
+    """applyMonthlyInterest vs the Decimal loop over random APRs; returns (checked, ties, mismatches)."""
+    pin_hash = BankUtility.hashPIN("0000")
+    checked = ties = mismatches = 0
+    for apr, balances in _interest_cases(cases, seed):
+        bank = Bank()
+        bank.MAX_ACCOUNTS = len(balances)
+        for i, cents in enumerate(balances):
+            bank._store.addRow(10000000 + i, "Prop", "Test", "123456789", pin_hash, cents)
+        bank.applyMonthlyInterest(apr)
+        rate = Decimal(apr) / Decimal("1200")
+        numerator, exponent = BankUtility.monthlyRateFromAPR(apr)
+        for i, cents in enumerate(balances):
+            expected = cents + _decimal_interest(cents, rate)
+            mismatches += bank._store.getBalance(10000000 + i) != expected
+            ties += exponent < 0 and cents > 0 and 2 * (cents * numerator % 10 ** -exponent) == 10 ** -exponent
+        checked += len(balances)
+    return checked, ties, mismatches
+
+
+def bench_interest(args):
+    checked, ties, mismatches = _interest_property(args.cases, args.seed)
+    print(f"property check: {args.cases} random APRs, {checked:,} balances ({ties:,} half-cent ties), "
+          f"mismatches vs Decimal: {mismatches}")
+    assert mismatches == 0, "applyMonthlyInterest disagrees with the Decimal loop"
+    for n in args.sizes:
+        bank = build_bank(n, args.seed)
+        before = list(bank._store.balanceColumn())
+
+        start = time.perf_counter()
+        expected = _legacy_interest(bank, args.apr)
+        legacy_secs = time.perf_counter() - start
+
+        start = time.perf_counter()
+        updated, total = bank.applyMonthlyInterest(args.apr)
+        batch_secs = time.perf_counter() - start
+
+        after = bank._store.balanceColumn()
+        mismatches = sum(1 for b, i, a in zip(before, expected, after) if b + i != a)
+        print(f"accounts: {n:,}  APR {args.apr}%")
+        print(f"  Decimal loop:         {legacy_secs:8.2f}s")
+        print(f"  applyMonthlyInterest: {batch_secs:8.2f}s  ({legacy_secs / batch_secs:.1f}x)")
+        print(f"  updated {updated:,} accounts, paid {total:,} cents, mismatches vs Decimal: {mismatches}")
+        assert mismatches == 0, "applyMonthlyInterest disagrees with the Decimal loop"
+
+
+def _percentile(sortedValues: list, pct: float) -> float:
+    if not sortedValues:
+        return 0.0
+    return sortedValues[min(len(sortedValues) - 1, int(len(sortedValues) * pct / 100))]
+
+
+_SYNC_POLICIES = {
+    # name: (syncEvery, syncIntervalMs)
+    "every-record": (1, None),
+    "every-2ms": (0, 2),
+    "16-or-2ms": (16, 2),
+    "os-buffered": (0, None),
+}
+
+
+def bench_journal(args):
+    """
+    Concurrent deposits per fsync policy. A deposit returns once its journal
+    record is durable (group commit), so its latency is the time to durable;
+    os-buffered returns before any fsync and is listed for comparison only.
+    """
+    print(f"{args.threads} threads, {args.ops:,} deposits")
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.policies:
+            every, interval = _SYNC_POLICIES[name]
+            path = os.path.join(tmp, f"{name}.journal")
+            bank = Bank(path, 0)
+            bank.MAX_ACCOUNTS = args.accounts
+            numbers = [bank.openAccount("Bench", "User", "123456789").getAccountNumber() for _ in range(args.accounts)]
+            bank.close()
+            bank = Bank(path, every, interval)
+            accounts = [bank.findAccount(num) for num in numbers]
+            latencies = [[] for _ in range(args.threads)]
+            clock = time.perf_counter
+
+            def run(t):
+                rng = random.Random(args.seed + t)
+                for _ in range(args.ops // args.threads):
+                    acct = rng.choice(accounts)
+                    t0 = clock()
+                    acct.deposit(100)
+                    latencies[t].append(clock() - t0)
+
+            threads = [threading.Thread(target=run, args=(t,)) for t in range(args.threads)]
+            start = clock()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = clock() - start
+            # Every acknowledged deposit must already be in the file, before close() syncs the rest
+            on_disk = []
+            Journal.replay(path, lambda record: record[0] == "D" and on_disk.append(record))
+            bank.close()
+            latencies = sorted(itertools.chain.from_iterable(latencies))
+            durable = bool(every or interval)
+            missing = len(latencies) - len(on_disk)
+            failed |= durable and missing > 0
+            print(f"{name:>13}: {len(latencies) / elapsed:10,.0f} tx/s   "
+                  f"p50 {_percentile(latencies, 50) * 1e6:8.1f}us   p99 {_percentile(latencies, 99) * 1e6:8.1f}us   "
+                  + (f"{missing:,} acknowledged but not on disk" if missing else "all on disk when acknowledged")
+                  + ("" if durable else " (not durable)"))
+    if failed:
+        raise SystemExit(1)
+
+
+def bench_startup(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        journal, snapshot = os.path.join(tmp, "bank.journal"), os.path.join(tmp, "bank.snapshot")
+        bank = build_bank(args.accounts, args.seed)
+        numbers = bank._store.accountNumbers()
+        bank._snapshotPath = snapshot
+        bank._journal = Journal(journal, 0)
+        bank._store.setJournal(bank._journal)
+        # History for the ledger file Bank reopens with: a month of interest is an entry per account
+        bank._ledger = Ledger(journal + ".ledger")
+        bank._store.setLedger(bank._ledger)
+        for _ in range(args.ledger_months):
+            bank.applyMonthlyInterest("3.6")
+        entries = len(bank._ledger)
+        start = time.perf_counter()
+        bank.checkpoint()
+        checkpoint_secs = time.perf_counter() - start
+        rng = random.Random(args.seed)
+        for _ in range(args.tail):
+            bank.findAccount(rng.choice(numbers)).deposit(1)
+        bank.close()
+        del bank
+
+        start = time.perf_counter()
+        bank = Bank(journal, snapshotPath=snapshot)
+        startup_secs = time.perf_counter() - start
+        probes = [rng.choice(numbers) for _ in range(10000)]
+        start = time.perf_counter()
+        for num in probes:
+            bank.findAccount(num).getBalanceInCents()
+        lookup_secs = time.perf_counter() - start
+        start = time.perf_counter()
+        history = bank.getStatement(probes[0])
+        statement_secs = time.perf_counter() - start
+        bank.close()
+
+    print(f"accounts: {args.accounts:,}, ledger: {entries:,} entries, journal tail: {args.tail:,} records")
+    print(f"  checkpoint write:         {checkpoint_secs:8.3f}s")
+    print(f"  startup (mmap + replay):  {startup_secs:8.3f}s  (target < {args.max_startup:g}s)")
+    print(f"  findAccount from mapping: {lookup_secs / len(probes) * 1e6:8.2f}us per lookup")
+    print(f"  first full statement:     {statement_secs:8.3f}s  ({len(history)} entries; reads every ledger segment)")
+    if startup_secs >= args.max_startup:
+        raise SystemExit(1)
+
+
+def bench_coldstart(args):
+    """Wall time from launching the headless menu to its first operation done, in fresh interpreters."""
+    with tempfile.TemporaryDirectory() as tmp:
+        script = os.path.join(tmp, "open.txt")
+        with open(script, "w") as f:
+            f.write("1\nCold\nStart\n123456789\n11\n")
+        here = os.path.dirname(os.path.abspath(__file__))
+        commands = {
+            "python -c pass": [sys.executable, "-c", "pass"],
+            "import BankManager": [sys.executable, "-c", "import BankManager"],
+            "BankManager --script (open account)": [sys.executable, os.path.join(here, "BankManager.py"),
+                                                    "--script", script, "--output", os.devnull],
+        }
+        print(f"runs: {args.runs} each (fresh process every run)")
+        for name, command in commands.items():
+            times = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                subprocess.run(command, cwd=here, check=True)
+                times.append(time.perf_counter() - start)
+            times.sort()
+            print(f"  {name:<37} min {times[0] * 1e3:7.1f}ms   median {_percentile(times, 50) * 1e3:7.1f}ms")
+
+
+def _menu_script(numbers: list, interactions: int, seed: int) -> str:
+    """Answers for `interactions` menu choices (deposits, withdrawals, transfers, coins, lookups), as typed."""
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(interactions):
+        num, other = rng.choice(numbers), rng.choice(numbers)
+        amount = f"{rng.randrange(1, 20000) / 100:.2f}"
+        choice = rng.choices("2456899", k=1)[0]
+        if choice == "2":
+            lines += ["2", str(num), "0000"]
+        elif choice == "4":
+            lines += ["4", str(num), "0000", amount]
+        elif choice == "5":
+            lines += ["5", str(num), "0000", str(other), amount]
+        elif choice == "6":
+            lines += ["6", str(num), "0000", amount]
+        elif choice == "8":
+            lines += ["8", str(num), "0000", f"{rng.randrange(20)}q {rng.randrange(10)}d {rng.randrange(50)}p"]
+        else:
+            lines.append("99")    # invalid choice: menu redraw only
+    lines.append("11")
+    return "\n".join(lines) + "\n"
+
+
+def bench_replay(args):
+    """Replay a recorded menu session through a headless BankManager, buffered and line by line."""
+    with tempfile.TemporaryDirectory() as tmp:
+        script_path, output_path = os.path.join(tmp, "session.txt"), os.path.join(tmp, "session.out")
+        numbers = build_bank(args.accounts, args.seed)._store.accountNumbers()
+        with open(script_path, "w") as f:
+            f.write(_menu_script(numbers, args.interactions, args.seed))
+        print(f"{args.interactions:,} menu interactions over {args.accounts:,} accounts")
+        for label, flushEvery in (("buffered", BankManager._FLUSH_EVERY), ("flush every line", 1)):
+            with open(script_path) as script, open(output_path, "w") as output:
+                manager = BankManager(autoRun=False, script=script, output=output)
+                build_bank(args.accounts, args.seed, bank=manager.bank)
+                manager._FLUSH_EVERY = flushEvery
+                start = time.perf_counter()
+                manager.run()
+                elapsed = time.perf_counter() - start
+                manager.close()
+            print(f"  {label:<17} {elapsed:7.2f}s   {args.interactions / elapsed:10,.0f} interactions/s   "
+                  f"output {os.path.getsize(output_path) / 2**20:,.1f} MiB")
+
+
+def bench_batch(args):
+    bank = build_bank(args.accounts, args.seed)
+    numbers = bank._store.accountNumbers()
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        src, results = os.path.join(tmp, "deposits.csv"), os.path.join(tmp, "results.csv")
+        with open(src, "w") as f:
+            f.write("op,account,amount,to,coins\n")
+            for _ in range(args.records):
+                f.write(f"deposit,{rng.choice(numbers)},{rng.randrange(1, 100000) / 100},,\n")
+        summary = BatchProcessor(bank).processFile(src, results)
+    rate = summary["recordsPerSecond"]
+    print(f"{summary['records']:,} deposit records in {summary['seconds']:.2f}s: "
+          f"{rate:,.0f} records/s (target {args.target:,}/s: {'met' if rate >= args.target else 'NOT met'})")
+
+
+def _random_transfers(numbers: list, count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [(rng.choice(numbers), rng.choice(numbers), rng.randrange(1, 5000)) for _ in range(count)]
+
+
+def bench_shards(args):
+    """Random concurrent transfers; the total of all balances must never change."""
+    bank = build_bank(args.accounts, args.seed, shards=args.shards)
+    numbers = bank._store.accountNumbers()
+    expected_total = sum(bank._store.balanceColumn())
+    print(f"accounts: {args.accounts:,}, shards: {args.shards}, transfers per run: {args.transfers:,}")
+
+    for workers in range(1, args.workers + 1):
+        per_worker = args.transfers // workers
+        plans = [_random_transfers(numbers, per_worker, args.seed + w) for w in range(workers)]
+
+        def run(plan):
+            for src, dst, cents in plan:
+                bank.transfer(src, dst, cents)
+
+        threads = [threading.Thread(target=run, args=(plan,)) for plan in plans]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        total = sum(bank._store.balanceColumn())
+        print(f"  threads={workers:<3} {per_worker * workers / elapsed:10,.0f} transfers/s   "
+              f"total {'conserved' if total == expected_total else f'CHANGED by {total - expected_total}'}")
+        if total != expected_total:
+            raise SystemExit(1)
+
+        shared = SharedBalances(bank, args.shards)
+        chunks = [plan[i:i + 1000] for plan in plans for i in range(0, len(plan), 1000)]
+        with multiprocessing.Pool(workers, SharedBalances.attach, (shared.handle(),)) as pool:
+            start = time.perf_counter()
+            done = pool.map(SharedBalances.transferMany, chunks)
+            elapsed = time.perf_counter() - start
+        total = sum(shared.balances().values())
+        refused = shared.writeBack(bank, done)
+        matches = all(bank._store.getBalance(num) == bal for num, bal in shared.balances().items())
+        shared.close()
+        print(f"  processes={workers:<3} {per_worker * workers / elapsed:8,.0f} transfers/s   "
+              f"total {'conserved' if total == expected_total else f'CHANGED by {total - expected_total}'}, "
+              f"replay {'matches' if matches and not refused else f'DIFFERS ({refused} refused)'}")
+        if total != expected_total or refused or not matches:
+            raise SystemExit(1)
+
+
+def _partitioned_bank(directory: str, partitions: int, perPartition: int, seed: int, syncEvery: int):
+    """A PartitionedBank with about perPartition synthetic accounts in each partition."""
+    bank = PartitionedBank(directory, partitions, maxAccountsPerPartition=2 * perPartition, syncEvery=syncEvery)
+    rows = list(_synthetic_rows(partitions * perPartition, seed))
+
+    # Every account costs its partition one slow PIN hash, so fill the partitions side by side
+    def add(p):
+        for num, first, last, ssn, pin, cents in rows:
+            if bank.partitionOf(num) == p:
+                a = Account()
+                a.setAccountNumber(num)
+                a.setOwnerFirstName(first)
+                a.setOwnerLastName(last)
+                a.setOwnerSSN(ssn)
+                a.setPIN(pin)
+                a.setBalanceInCents(cents)
+                bank.addAccountToBank(a)
+
+    threads = [threading.Thread(target=add, args=(p,)) for p in range(partitions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return bank, [row[0] for row in rows]
+
+
+def _cross_transfers(bank: PartitionedBank, numbers: list, stop: threading.Event, seed: int, out: list):
+    """Transfer between accounts of different partitions until stop is set; append (seconds, committed)."""
+    rng = random.Random(seed)
+    clock = time.perf_counter
+    while not stop.is_set():
+        src, dst = rng.choice(numbers), rng.choice(numbers)
+        if bank.partitionOf(src) == bank.partitionOf(dst):
+            continue
+        t0 = clock()
+        try:
+            committed = bank.transfer(src, dst, rng.randrange(1, 5000))
+        except PartitionUnavailable:
+            committed = False
+        out.append((clock() - t0, committed))
+
+
+def bench_partitions(args):
+    """Cross-partition (two-phase commit) transfers as partitions are added, then the same under crashes."""
+    print(f"{args.accounts} accounts and {args.threads} client threads per partition, "
+          f"syncEvery={args.sync_every}, {args.seconds:g}s per run")
+    for partitions in args.partitions:
+        with tempfile.TemporaryDirectory() as tmp:
+            bank, numbers = _partitioned_bank(tmp, partitions, args.accounts, args.seed, args.sync_every)
+            expected_total = bank.totalCents()
+            stop = threading.Event()
+            results = [[] for _ in range(partitions * args.threads)]
+            threads = [threading.Thread(target=_cross_transfers, args=(bank, numbers, stop, args.seed + i, out))
+                       for i, out in enumerate(results)]
+            for t in threads:
+                t.start()
+            time.sleep(args.seconds)
+            stop.set()
+            for t in threads:
+                t.join()
+            done = list(itertools.chain.from_iterable(results))
+            latencies = sorted(seconds for seconds, _ in done)
+            total = bank.totalCents()
+            bank.close()
+        print(f"  partitions={partitions:<3} {len(done) / args.seconds:9,.0f} transfers/s"
+              f"   ({sum(committed for _, committed in done) / max(1, len(done)):.0%} committed)"
+              f"   p50 {_percentile(latencies, 50) * 1e3:6.2f}ms  p99 {_percentile(latencies, 99) * 1e3:6.2f}ms"
+              f"   total {'conserved' if total == expected_total else f'CHANGED by {total - expected_total}'}")
+        if total != expected_total:
+            raise SystemExit(1)
+
+    if not args.faults:
+        return
+    # Fault injection: workers crash at each step of the protocol, or are killed at random, mid-transfer
+    partitions = max(args.partitions)
+    with tempfile.TemporaryDirectory() as tmp:
+        bank, numbers = _partitioned_bank(tmp, partitions, args.accounts, args.seed, args.sync_every)
+        expected_total = bank.totalCents()
+        stop = threading.Event()
+        results = [[] for _ in range(partitions * args.threads)]
+        threads = [threading.Thread(target=_cross_transfers, args=(bank, numbers, stop, args.seed + i, out))
+                   for i, out in enumerate(results)]
+        for t in threads:
+            t.start()
+        rng = random.Random(args.seed)
+        for fault in range(args.faults):
+            time.sleep(args.seconds / args.faults)
+            p = rng.randrange(partitions)
+            if fault % 2:
+                bank.killPartition(p)
+                continue
+            try:
+                bank.crashPartition(p, rng.choice(PartitionedBank.CRASH_POINTS))
+            except PartitionUnavailable:
+                pass
+        stop.set()
+        for t in threads:
+            t.join()
+        done = list(itertools.chain.from_iterable(results))
+        total = bank.totalCents()
+        # A coordinator restarting on the directory settles anything left in doubt
+        bank.close()
+        with PartitionedBank(tmp, partitions) as reopened:
+            reopened_total = reopened.totalCents()
+    print(f"  {args.faults} worker crashes over {len(done):,} transfers "
+          f"({sum(committed for _, committed in done):,} committed):")
+    print(f"    total {'conserved' if total == expected_total else f'CHANGED by {total - expected_total}'}, "
+          f"after a restart {'conserved' if reopened_total == expected_total else f'CHANGED by {reopened_total - expected_total}'}")
+    if total != expected_total or reopened_total != expected_total:
+        raise SystemExit(1)
+
+
+async def _load_client(port: int, requests: list, window: int, latencies: list):
+    """Send requests pipelined up to `window` outstanding; record each round-trip time."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    clock = time.perf_counter
+    sent_at = {}
+    errors = 0
+
+    async def receive():
+        nonlocal errors
+        for _ in requests:
+            response = json.loads(await reader.readline())
+            errors += not response["ok"]
+            latencies.append(clock() - sent_at.pop(response["id"]))
+            credit.release()
+
+    credit = asyncio.Semaphore(window)
+    receiving = asyncio.create_task(receive())
+    for request in requests:
+        await credit.acquire()
+        sent_at[request["id"]] = clock()
+        writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+    await receiving
+    writer.close()
+    return errors
+
+
+async def _load_run(args, port: int):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    accounts = []
+    for i in range(args.accounts):
+        writer.write(json.dumps({"id": i, "op": "open", "first": "Load", "last": "Gen",
+                                 "ssn": f"{i:09d}"}).encode() + b"\n")
+        result = json.loads(await reader.readline())["result"]
+        accounts.append((result["accountNumber"], result["pin"]))
+    writer.close()
+
+    rng = random.Random(args.seed)
+    plans = []
+    for c in range(args.connections):
+        plan = []
+        # One customer per connection (session), so the server hashes each PIN once per connection
+        num, pin = accounts[c % len(accounts)]
+        for i in range(args.requests):
+            if rng.random() < 0.8:
+                plan.append({"id": i, "op": "deposit", "account": num, "pin": pin, "amount": "1.25"})
+            else:
+                plan.append({"id": i, "op": "info", "account": num, "pin": pin})
+        plans.append(plan)
+
+    latencies = []
+    start = time.perf_counter()
+    errors = await asyncio.gather(*(_load_client(port, plan, args.window, latencies) for plan in plans))
+    return time.perf_counter() - start, latencies, sum(errors), accounts
+
+
+async def _request(reader, writer, request: dict) -> dict:
+    writer.write(json.dumps(request).encode() + b"\n")
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+async def _bad_pin_run(args, port: int, accounts: list):
+    """
+    Time one client's requests while other clients send wrong PINs nonstop.
+    Each attacker alternates a wrong and a right PIN on its own account, so no
+    account locks and every request costs the server a PIN hash.
+    """
+    (num, pin), targets = accounts[0], accounts[1:1 + args.bad_pin_connections]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    stop = asyncio.Event()
+    attempts = 0
+
+    async def attack(num, pin):
+        nonlocal attempts
+        r, w = await asyncio.open_connection("127.0.0.1", port)
+        wrong = f"{(int(pin) + 1) % 10000:04d}"
+        while not stop.is_set():
+            for guess in (wrong, pin):
+                await _request(r, w, {"id": attempts, "op": "info", "account": num, "pin": guess})
+                attempts += 1
+        w.close()
+
+    attackers = [asyncio.create_task(attack(num, pin)) for num, pin in targets]
+    await asyncio.sleep(0.2)
+    latencies = []
+    clock = time.perf_counter
+    await _request(reader, writer, {"id": 0, "op": "info", "account": num, "pin": pin})  # hash once per session
+    for i in range(args.probes):
+        sent = clock()
+        await _request(reader, writer, {"id": i, "op": "info", "account": num, "pin": pin})
+        latencies.append(clock() - sent)
+        await asyncio.sleep(0.002)
+    stop.set()
+    await asyncio.gather(*attackers)
+    writer.close()
+    return latencies, attempts
+
+
+def bench_server(args):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=runServer, args=("127.0.0.1", port),
+                                     kwargs={"ready": ready.set}, daemon=True)
+    server.start()
+    try:
+        ready.wait(10)
+        elapsed, latencies, errors, accounts = asyncio.run(_load_run(args, port))
+        probes, attempts = asyncio.run(_bad_pin_run(args, port, accounts))
+    finally:
+        server.terminate()
+        server.join()
+    latencies.sort()
+    total = len(latencies)
+    print(f"{args.connections} connections x {args.requests} requests, pipeline window {args.window}")
+    print(f"  {total / elapsed:,.0f} requests/s, {errors} errors")
+    print(f"  latency p50 {_percentile(latencies, 50) * 1e3:.2f}ms  p99 {_percentile(latencies, 99) * 1e3:.2f}ms"
+          f"  p99.9 {_percentile(latencies, 99.9) * 1e3:.2f}ms")
+    probes.sort()
+    p99 = _percentile(probes, 99) * 1e3
+    print(f"{args.bad_pin_connections} clients sending wrong PINs ({attempts:,} PIN checks), {args.probes} probe requests:")
+    print(f"  probe latency p50 {_percentile(probes, 50) * 1e3:.2f}ms  p99 {p99:.2f}ms"
+          f"  (limit {args.max_probe_ms:g}ms)")
+    if p99 > args.max_probe_ms:
+        raise SystemExit(1)
+
+
+def bench_atm(args):
+    """Many ATM terminals (threads) dispensing concurrently, each from its own cassettes."""
+    rng = random.Random(args.seed)
+    common = [20, 40, 60, 80, 100, 200, 300]
+    amounts = [rng.choice(common) if rng.random() < 0.8 else rng.randint(1, 500)
+               for _ in range(args.withdrawals)]
+    print(f"{args.terminals} terminals, {args.withdrawals:,} withdrawals each, "
+          f"{args.bills} bills per cassette")
+
+    # Cost of re-solving from scratch for every withdrawal (no plan table)
+    atm = ATMDispenser({bill: args.bills for bill in ATMDispenser.DENOMINATIONS})
+    sample = amounts[:1000]
+    start = time.perf_counter()
+    for amount in sample:
+        atm._solve(amount)
+    per_solve = (time.perf_counter() - start) / len(sample)
+    start = time.perf_counter()
+    for amount in sample:
+        atm.plan(amount)
+    per_lookup = (time.perf_counter() - start) / len(sample)
+    print(f"  plan lookup {per_lookup * 1e6:.1f}us vs full re-solve {per_solve * 1e6:.1f}us per withdrawal")
+
+    refused = [0] * args.terminals
+
+    def run(t):
+        terminal = ATMDispenser({bill: args.bills for bill in ATMDispenser.DENOMINATIONS})
+        for amount in amounts:
+            if terminal.dispense(amount) is None:
+                refused[t] += 1
+
+    threads = [threading.Thread(target=run, args=(t,)) for t in range(args.terminals)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    total = args.terminals * args.withdrawals
+    print(f"  {total / elapsed:,.0f} dispenses/s, {sum(refused):,} refused ({sum(refused) / total:.1%})")
+
+    # Large and distinct amounts must neither hold the cassette lock for long nor grow the plan table
+    atm = ATMDispenser({bill: args.bills for bill in ATMDispenser.DENOMINATIONS}, maxDispense=5000)
+    start = time.perf_counter()
+    over = atm.dispense(150001)
+    over_secs = time.perf_counter() - start
+    for amount in range(1001, 1101):
+        atm.plan(amount)
+    cached = len(atm._plans)
+    print(f"  $150,001 (over the ${atm.maxDispense:,} limit) refused in {over_secs * 1e6:.0f}us; "
+          f"plan table {cached:,} entries after 100 amounts over planLimit")
+    if over is not None or over_secs > 0.01 or cached > 1001:
+        raise SystemExit(1)
+
+
+def bench_lookup(args):
+    """Owner SSN / name lookups: secondary indexes vs a scan of getAllAccounts()."""
+    bank = build_bank(args.accounts, args.seed)
+    rng = random.Random(args.seed)
+    sample = [bank.findAccount(num) for num in rng.sample(bank._store.accountNumbers(), args.queries)]
+    ssns = [a.getOwnerSSN() for a in sample]
+    last_names = [a.getOwnerLastName()[:3] for a in sample]
+    print(f"accounts: {args.accounts:,}, queries: {args.queries}")
+
+    scans = min(args.scans, len(ssns))
+    start = time.perf_counter()
+    for ssn in ssns[:scans]:
+        [a for a in bank.getAllAccounts() if a.getOwnerSSN() == ssn]
+    scan_ssn = (time.perf_counter() - start) / scans
+    start = time.perf_counter()
+    for prefix in last_names[:scans]:
+        prefix = prefix.casefold()
+        matches = [a for a in bank.getAllAccounts() if a.getOwnerLastName().casefold().startswith(prefix)]
+        matches.sort(key=lambda a: (a.getOwnerLastName().casefold(), a.getOwnerFirstName().casefold(),
+                                    a.getAccountNumber()))
+        matches[:args.page]
+    scan_name = (time.perf_counter() - start) / scans
+
+    start = time.perf_counter()
+    bank._store._buildIndexes()
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    for ssn in ssns:
+        bank.findAccountsBySSN(ssn, args.page)
+    index_ssn = (time.perf_counter() - start) / len(ssns)
+    start = time.perf_counter()
+    for prefix in last_names:
+        bank.findAccountsByName(prefix, limit=args.page)
+    index_name = (time.perf_counter() - start) / len(last_names)
+
+    print(f"  index build (first query): {build:.2f}s")
+    print(f"  by SSN:          scan {scan_ssn * 1e3:10.1f}ms   index {index_ssn * 1e6:8.1f}us   "
+          f"({scan_ssn / index_ssn:,.0f}x)")
+    print(f"  by name prefix:  scan {scan_name * 1e3:10.1f}ms   index {index_name * 1e6:8.1f}us   "
+          f"({scan_name / index_name:,.0f}x, page of {args.page})")
+
+
+def bench_allocator(args):
+    """
+    Account-number generation at a given occupancy: random rejection sampling
+    (the old generateUniqueAccountNumber) vs AccountNumberAllocator.
+    Occupancy is a one-byte-per-number map of the 8-digit space, since a real
+    bank with 81M accounts does not fit here; everything else openAccount does
+    is the same for both methods.
+    """
+    first, size = AccountNumberAllocator.FIRST_NUMBER, AccountNumberAllocator.NUMBER_RANGE
+    rng = random.Random(args.seed)
+    print(f"{args.opens:,} new numbers per run")
+    for pct in args.occupancy:
+        # Each byte of random noise marks its number taken with probability pct%
+        threshold = round(256 * pct / 100)
+        table = bytes(1 if v < threshold else 0 for v in range(256))
+        occupied = bytearray(os.urandom(size).translate(table))
+
+        start = time.perf_counter()
+        tries = 0
+        for _ in range(args.opens):
+            while True:
+                tries += 1
+                num = rng.randint(first, first + size - 1)
+                if not occupied[num - first]:
+                    occupied[num - first] = 1
+                    break
+        legacy = time.perf_counter() - start
+        del occupied
+
+        # The allocator only depends on how far its counter has got
+        allocator = AccountNumberAllocator()
+        allocator._next = size * pct // 100
+        start = time.perf_counter()
+        for _ in range(args.opens):
+            allocator.next()
+        elapsed = time.perf_counter() - start
+        print(f"  {pct:3d}% full:  rejection {args.opens / legacy:10,.0f}/s ({tries / args.opens:5.1f} tries each)"
+              f"   allocator {args.opens / elapsed:10,.0f}/s")
+
+    bank = Bank()
+    bank.MAX_ACCOUNTS = args.opens
+    start = time.perf_counter()
+    for i in range(args.opens):
+        bank.openAccount("Load", "Gen", f"{i:09d}")
+    print(f"  Bank.openAccount end to end: {args.opens / (time.perf_counter() - start):,.0f}/s")
+
+
+def bench_auth(args):
+    """Authenticated deposits per second with the PIN verification cache on and off."""
+    print(f"{args.accounts} accounts, {args.sessions} sessions, "
+          f"{BankUtility.PIN_HASH_ITERATIONS:,} PBKDF2 iterations per PIN check")
+    # Without the cache every operation pays for a hash, so that run is kept short
+    for cache_size, ops in ((args.cache_size, args.ops), (0, args.uncached_ops)):
+        bank = Bank()
+        bank.MAX_ACCOUNTS = args.accounts
+        service = BankService(bank, authCacheSize=cache_size)
+        accounts = []
+        for i in range(args.accounts):
+            acct = service.openAccount("Load", "Gen", f"{i:09d}")
+            accounts.append((acct.getAccountNumber(), acct.getPIN()))
+        rng = random.Random(args.seed)
+        # Each session keeps working on the same account, like one customer at an ATM or app
+        sessions = [accounts[s % len(accounts)] for s in range(args.sessions)]
+        start = time.perf_counter()
+        for _ in range(ops):
+            s = rng.randrange(args.sessions)
+            num, pin = sessions[s]
+            service.authenticate(num, pin, s)
+            service.deposit(num, 125)
+        elapsed = time.perf_counter() - start
+        print(f"  cache {'on (' + str(cache_size) + ')' if cache_size else 'off':<12} "
+              f"{ops / elapsed:10,.0f} authenticated ops/s over {ops:,} ops")
+
+
+def bench_statement(args):
+    """Statement latency for one account with a very long history, in memory and after reloading from disk."""
+    rng = random.Random(args.seed)
+    span = 5 * 365 * 86400 * 1_000_000          # five years of history, in microseconds
+    first_ts = 1_600_000_000 * 1_000_000
+    step = span // (args.entries + args.others)
+    account, others = 12345678, [20000000 + i for i in range(1000)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.ledger")
+        ledger = Ledger(path)
+        start = time.perf_counter()
+        ts, bal, mine = first_ts, 0, 0
+        while mine < args.entries:
+            ts += step
+            if rng.random() < args.entries / (args.entries + args.others):
+                amount = rng.randint(-5000, 10000)
+                bal += amount
+                ledger.append(account, Ledger.DEPOSIT if amount >= 0 else Ledger.WITHDRAWAL, amount, 0, bal, ts)
+                mine += 1
+            else:
+                ledger.append(rng.choice(others), Ledger.DEPOSIT, 100, 0, 100, ts)
+        ledger.close()
+        print(f"{len(ledger):,} entries ({args.entries:,} for one account), built in {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        ledger = Ledger(path)
+        print(f"  reload from disk: {time.perf_counter() - start:.2f}s")
+
+        def query_ranges(count):
+            for _ in range(count):
+                lo = first_ts + rng.randrange(span)
+                yield lo, lo + args.days * 86400 * 1_000_000
+
+        latencies, rows = [], 0
+        for lo, hi in query_ranges(args.queries):
+            start = time.perf_counter()
+            rows += len(ledger.statement(account, lo, hi))
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        print(f"  {args.days}-day statement: p50 {_percentile(latencies, 50) * 1e3:.3f}ms  "
+              f"p99 {_percentile(latencies, 99) * 1e3:.3f}ms  ({rows / len(latencies):,.0f} entries each)")
+
+        # Without the per-account index: filter every entry of every segment
+        lo, hi = next(query_ranges(1))
+        start = time.perf_counter()
+        for seg in ledger._segments:
+            [i for i, (t, a) in enumerate(zip(seg.timestamps, seg.accounts)) if a == account and lo <= t < hi]
+        print(f"  full scan of all history for the same query: {(time.perf_counter() - start) * 1e3:.1f}ms")
+        ledger.close()
+
+
+def _crash_traffic(directory: str, seed: int, threads: int):
+    """Child process: keyed and plain money movement, interest, postings and checkpoints until killed."""
+    bank = Bank(os.path.join(directory, "bank.journal"), snapshotPath=os.path.join(directory, "bank.snapshot"))
+    for runId in bank.pendingPostingRuns():
+        bank.postMonthEnd(runId)
+    numbers = bank._store.accountNumbers()
+
+    def run(t):
+        rng = random.Random(seed * 1000 + t)
+        for i in itertools.count():
+            num, cents = rng.choice(numbers), rng.randint(1, 5000)
+            op = rng.random()
+            if op < 0.3:
+                bank.deposit(num, cents, rng.choice((Ledger.DEPOSIT, Ledger.COINS)))
+            elif op < 0.5:
+                bank.withdraw(num, cents, rng.choice((Ledger.WITHDRAWAL, Ledger.ATM)))
+            elif op < 0.9:
+                bank.transfer(num, rng.choice(numbers), cents)
+            else:
+                bank.deposit(num, cents, idempotencyKey=f"crash-{seed}-{t}-{i}")
+
+    for t in range(threads):
+        threading.Thread(target=run, args=(t,), daemon=True).start()
+    rng = random.Random(seed)
+    schedule = _posting_schedule()
+    for i in itertools.count():
+        time.sleep(0.05)
+        step = rng.random()
+        if step < 0.3:
+            bank.applyMonthlyInterest("1.5")
+        elif step < 0.5:
+            bank.postMonthEnd(f"crash-{seed}-{i}", schedule, chunks=16)
+        elif step < 0.7:
+            bank.checkpoint()
+
+
+def _ledger_mismatches(bank: Bank) -> int:
+    """Accounts whose ledger entries do not chain (each balance = previous + amount) to the current balance."""
+    bad = 0
+    for num in bank._store.accountNumbers():
+        entries = bank.getStatement(num)
+        if not entries:
+            continue
+        chained = all(prev[4] + cur[2] == cur[4] for prev, cur in zip(entries, entries[1:]))
+        if not chained or entries[-1][4] != bank.findAccount(num).getBalanceInCents():
+            bad += 1
+    return bad
+
+
+def bench_crash(args):
+    """Kill a journaled bank mid-traffic, reopen it, and check that its ledger agrees with its balances."""
+    rng = random.Random(args.seed)
+    print(f"{args.accounts:,} accounts, {args.threads} client threads, {args.crashes} kills")
+    failed = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        bank = build_bank(args.accounts, args.seed, bank=Bank(os.path.join(tmp, "bank.journal"), 0,
+                                                             snapshotPath=os.path.join(tmp, "bank.snapshot")))
+        bank.close()
+        for crash in range(args.crashes):
+            child = multiprocessing.Process(target=_crash_traffic, args=(tmp, args.seed + crash, args.threads))
+            child.start()
+            time.sleep(rng.uniform(0.3, 1.5))
+            child.kill()
+            child.join()
+            start = time.perf_counter()
+            bank = Bank(os.path.join(tmp, "bank.journal"), snapshotPath=os.path.join(tmp, "bank.snapshot"))
+            reopen = time.perf_counter() - start
+            bad = _ledger_mismatches(bank)
+            failed += bad > 0
+            print(f"  kill {crash + 1}: reopened in {reopen * 1e3:6.1f}ms, {len(bank._ledger):,} ledger entries, "
+                  f"{bad} accounts out of step with their ledger")
+            bank.close()
+    if failed:
+        raise SystemExit(1)
+
+
+_LEGACY_COIN_TOKEN = re.compile(r"\s*([0-9]+)\s*([pndqhwPNDQHW])\s*")
+
+
+def _posting_schedule() -> PostingSchedule:
+    """Three account classes exercising banded rates, tiered rates, fees and minimums."""
+    return PostingSchedule({
+        0: AccountClass("basic checking", ((0, "0.05"),), monthlyFeeCents=500, feeWaiverCents=150000),
+        1: AccountClass("savings", ((0, "0.5"), (1000000, "2.0"), (10000000, "3.6")), minimumBalanceCents=10000),
+        2: AccountClass("money market", ((0, "1.0"), (2500000, "2.5"), (10000000, "4.15")), tiered=True,
+                        monthlyFeeCents=1200, feeWaiverCents=250000),
+    })
+
+
+def _posting_checks(args) -> bool:
+    """
+    A journaled run with transfers going on between its ranges must leave the
+    same balances after a restart, and posting it again after a checkpoint and
+    a restart must post nothing. Returns True if both hold.
+    """
+    schedule = _posting_schedule()
+    with tempfile.TemporaryDirectory() as tmp:
+        journal, snapshot = os.path.join(tmp, "bank.journal"), os.path.join(tmp, "bank.snapshot")
+        bank = build_bank(args.check_accounts, args.seed, bank=Bank(journal, 0, snapshotPath=snapshot))
+        classes = bank._store.classColumn()
+        for row in range(len(classes)):
+            classes[row] = row % 3
+        bank.checkpoint()
+        numbers = bank._store.accountNumbers()
+        stop = threading.Event()
+
+        def transfers():
+            rng = random.Random(args.seed)
+            while not stop.is_set():
+                bank.transfer(rng.choice(numbers), rng.choice(numbers), rng.randint(1, 10000))
+
+        mover = threading.Thread(target=transfers)
+        mover.start()
+        posted = bank.postMonthEnd("2026-10", schedule, args.workers, args.chunks)
+        stop.set()
+        mover.join()
+        live = {num: bank.findAccount(num).getBalanceInCents() for num in numbers}
+        bank.close()
+
+        bank = Bank(journal, 0, snapshotPath=snapshot)
+        replayed = sum(bank.findAccount(num).getBalanceInCents() != cents for num, cents in live.items())
+        bank.checkpoint()
+        bank.close()
+        bank = Bank(journal, 0, snapshotPath=snapshot)
+        again = bank.postMonthEnd("2026-10", schedule, args.workers, args.chunks)
+        changed = sum(bank.findAccount(num).getBalanceInCents() != cents for num, cents in live.items())
+        bank.close()
+    print(f"  checks ({args.check_accounts:,} accounts, transfers running): run posted {posted['chunks']} ranges; "
+          f"after a restart {replayed} balances differ; after a checkpoint and restart, posting it again "
+          f"posted {again['chunks']} ranges and changed {changed} balances")
+    return replayed == 0 and again["chunks"] == 0 and changed == 0
+
+
+def bench_postings(args):
+    """Month-end posting throughput and wall time, in this process and with a process pool."""
+    ok = _posting_checks(args)
+    bank = build_bank(args.accounts, args.seed)
+    classes = bank._store.classColumn()
+    for row in range(len(classes)):
+        classes[row] = row % 3
+    schedule = _posting_schedule()
+    print(f"accounts: {args.accounts:,}, ranges: {args.chunks}")
+
+    start = time.perf_counter()
+    bank.applyMonthlyInterest("3.6")
+    flat = time.perf_counter() - start
+    print(f"  flat APR (applyMonthlyInterest): {flat:8.2f}s  {args.accounts / flat:12,.0f} accounts/s")
+    for workers in sorted({0, args.workers}):
+        start = time.perf_counter()
+        summary = bank.postMonthEnd(f"bench-{workers}", schedule, workers, args.chunks)
+        elapsed = time.perf_counter() - start
+        label = "in process" if not workers else f"{workers} workers"
+        print(f"  postMonthEnd, {label:<12}     {elapsed:8.2f}s  {args.accounts / elapsed:12,.0f} accounts/s  "
+              f"({summary['credited']:,} credits, {summary['charged']:,} fees)")
+    if not ok:
+        raise SystemExit(1)
+
+
+def bench_dedup(args):
+    """Per-deposit cost of idempotency keys: none, new keys, and retried keys."""
+    with tempfile.TemporaryDirectory() as tmp:
+        bank = Bank(os.path.join(tmp, "bank.journal"), syncEvery=0) if args.journal else Bank()
+        bank.MAX_ACCOUNTS = args.accounts
+        pin_hash = BankUtility.hashPIN("0000")
+        for num, first, last, ssn, _, cents in _synthetic_rows(args.accounts, args.seed):
+            bank._store.addRow(num, first, last, ssn, pin_hash, cents)
+        rng = random.Random(args.seed)
+        numbers = bank._store.accountNumbers()
+        plan = [rng.choice(numbers) for _ in range(args.ops)]
+        keys = [f"req-{i:012d}" for i in range(args.ops)]
+
+        def run(label, keyed):
+            start = time.perf_counter()
+            if keyed:
+                for num, key in zip(plan, keys):
+                    bank.deposit(num, 100, Ledger.DEPOSIT, key)
+            else:
+                for num in plan:
+                    bank.deposit(num, 100)
+            elapsed = time.perf_counter() - start
+            print(f"  {label:<26} {args.ops / elapsed:12,.0f} deposits/s  {elapsed / args.ops * 1e6:6.2f}us each")
+            return elapsed
+
+        print(f"accounts: {args.accounts:,}, deposits: {args.ops:,}, journal: {'on' if args.journal else 'off'}, "
+              f"cache: {bank.IDEMPOTENCY_KEYS:,} keys")
+        base = run("no key", False)
+        fresh = run("new key each", True)
+        # Only the newest IDEMPOTENCY_KEYS keys are still cached; retry those
+        keys = keys[-bank.IDEMPOTENCY_KEYS:]
+        plan = plan[-bank.IDEMPOTENCY_KEYS:]
+        before = bank.getReport()["totalCents"]
+        start = time.perf_counter()
+        for num, key in zip(plan, keys):
+            bank.deposit(num, 100, Ledger.DEPOSIT, key)
+        retried = (time.perf_counter() - start) / len(keys)
+        assert bank.getReport()["totalCents"] == before, "a retried key moved money"
+        print(f"  {'retry of a cached key':<26} {1 / retried:12,.0f} deposits/s  {retried * 1e6:6.2f}us each")
+        print(f"  overhead of a new key: {(fresh - base) / args.ops * 1e6:+.2f}us per deposit")
+        bank.close()
+    if not _replayed_key_expiry():
+        raise SystemExit(1)
+
+
+class _ShortKeyBank(Bank):
+    IDEMPOTENCY_TTL = 1.0
+
+
+def _replayed_key_expiry() -> bool:
+    """A key replayed from the journal must expire when it first would have, not a TTL after the restart."""
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = os.path.join(tmp, "bank.journal")
+        bank = _ShortKeyBank(journal, 0)
+        num = bank.openAccount("Key", "Expiry", "123456789").getAccountNumber()
+        bank.deposit(num, 100, Ledger.DEPOSIT, "old")
+        time.sleep(0.6)
+        bank.deposit(num, 100, Ledger.DEPOSIT, "new")
+        expires = bank._idempotency._entries["new"][2]
+        bank.close()
+        time.sleep(0.6)     # "old" has expired, "new" has not
+        bank = _ShortKeyBank(journal, 0)
+        replayed = bank._idempotency._entries.get("new")
+        old_kept = "old" in bank._idempotency._entries
+        bank.close()
+    ok = replayed is not None and abs(replayed[2] - expires) < 0.01 and not old_kept
+    print(f"  after a restart: expired key {'still cached' if old_kept else 'dropped'}, live key "
+          + ("lost" if replayed is None else f"expires {replayed[2] - expires:+.3f}s from its first expiry"))
+    return ok
+
+
+def bench_instrumentation(args):
+    """Cost of the hot-path instrumentation: never enabled, enabled, sampling, and disabled again."""
+    bank = build_bank(args.accounts, args.seed)
+    rng = random.Random(args.seed)
+    numbers = [rng.choice(bank._store.accountNumbers()) for _ in range(args.ops)]
+    others = [rng.choice(bank._store.accountNumbers()) for _ in range(args.ops)]
+    amounts = [f"{rng.randrange(1, 10**6) / 100:.2f}" for _ in range(args.ops)]
+    coins = [f"{rng.randrange(20)}q {rng.randrange(20)}d {rng.randrange(20)}n {rng.randrange(100)}p"
+             for _ in range(args.ops)]
+
+    def run() -> dict:
+        # Attributes are looked up on every call, as application code does
+        times = {}
+        start = time.perf_counter_ns()
+        for num in numbers:
+            bank.findAccount(num)
+        times["Bank.findAccount"] = time.perf_counter_ns() - start
+        start = time.perf_counter_ns()
+        for num in numbers:
+            bank.deposit(num, 100)
+        times["Bank.deposit"] = time.perf_counter_ns() - start
+        start = time.perf_counter_ns()
+        for num in numbers:
+            bank.withdraw(num, 100)
+        times["Bank.withdraw"] = time.perf_counter_ns() - start
+        start = time.perf_counter_ns()
+        for num, other in zip(numbers, others):
+            bank.transfer(num, other, 100)
+        times["Bank.transfer"] = time.perf_counter_ns() - start
+        start = time.perf_counter_ns()
+        for s in amounts:
+            MoneyParser.parseCents(s)
+        times["MoneyParser.parseCents"] = time.perf_counter_ns() - start
+        start = time.perf_counter_ns()
+        for s in coins:
+            CoinCollector.parseChange(s)
+        times["CoinCollector.parseChange"] = time.perf_counter_ns() - start
+        return {name: ns / args.ops for name, ns in times.items()}
+
+    originals = [inspect.getattr_static(cls, name) for cls, name in Instrumentation.defaultTargets()]
+    metrics = {"on": Instrumentation(),
+               f"on, cProfile 1/{args.sample_every}": Instrumentation(sampleEvery=args.sample_every,
+                                                                      sampleMode="cprofile")}
+    labels = ["off (never enabled)", *metrics, "off (after disable)"]
+    best = {label: {} for label in labels}
+    # States take turns within each round, so drift on a busy machine hits them all alike
+    for _ in range(args.rounds):
+        for label in labels:
+            m = metrics.get(label)
+            if m is not None:
+                m.enable()
+            try:
+                for name, ns in run().items():
+                    best[label][name] = min(ns, best[label].get(name, ns))
+            finally:
+                if m is not None:
+                    m.disable()
+    restored = [inspect.getattr_static(cls, name) for cls, name in Instrumentation.defaultTargets()]
+    assert all(a is b for a, b in zip(originals, restored)), "disable() did not restore the original methods"
+
+    base = best[labels[0]]
+    print(f"ops: {args.ops:,} per operation, ns per call (best of {args.rounds} rounds; change vs never enabled)")
+    print(f"  {'':<38}" + "".join(f"{label:>24}" for label in labels))
+    for name in base:
+        cells = "".join(f"{best[label][name]:>14,.0f} ({best[label][name] - base[name]:+6,.0f})" for label in labels)
+        print(f"  {name:<38}{cells}")
+    summary = metrics["on"].summary()
+    print("  recorded while on: " + ", ".join(f"{name} p50 {s['p50Ns']:,}ns p99 {s['p99Ns']:,}ns"
+                                             for name, s in summary.items()))
+    missed = [name for name in metrics["on"].operations if name not in summary]
+    if missed:
+        print(f"  never recorded: {', '.join(missed)}")
+        raise SystemExit(1)
+
+
+def _scan_report(bank: Bank) -> dict:
+    """The report computed the old way: one pass over getAllAccounts()."""
+    total = nonzero = negative = 0
+    histogram = {}
+    for acct in bank.getAllAccounts():
+        bal = acct.getBalanceInCents()
+        total += bal
+        nonzero += bal != 0
+        if bal < 0:
+            negative += 1
+        else:
+            histogram[bal.bit_length()] = histogram.get(bal.bit_length(), 0) + 1
+    return {"totalCents": total, "nonZeroAccounts": nonzero, "negativeAccounts": negative,
+            "histogram": histogram}
+
+
+def bench_report(args):
+    """Bank-wide totals and balance histogram: maintained aggregates vs a full scan."""
+    bank = build_bank(args.accounts, args.seed)
+    numbers = bank._store.accountNumbers()
+    rng = random.Random(args.seed)
+    print(f"accounts: {args.accounts:,}")
+
+    start = time.perf_counter()
+    for _ in range(args.scans):
+        scanned = _scan_report(bank)
+    scan = (time.perf_counter() - start) / args.scans
+
+    start = time.perf_counter()
+    bank.getReport()
+    build = time.perf_counter() - start
+    # Keep the aggregates busy between reports, as a live bank would
+    plan = [(rng.choice(numbers), rng.randrange(1, 10000)) for _ in range(args.updates)]
+    start = time.perf_counter()
+    for num, cents in plan:
+        bank.deposit(num, cents)
+    updates = (time.perf_counter() - start) / len(plan)
+    start = time.perf_counter()
+    for _ in range(args.reports):
+        report = bank.getReport()
+    maintained = (time.perf_counter() - start) / args.reports
+
+    scanned = _scan_report(bank)
+    assert report["totalCents"] == scanned["totalCents"]
+    assert report["nonZeroAccounts"] == scanned["nonZeroAccounts"]
+    print(f"  full scan:        {scan * 1e3:10.1f}ms per report")
+    print(f"  aggregates:       {maintained * 1e6:10.1f}us per report ({scan / maintained:,.0f}x), "
+          f"first report {build:.2f}s")
+    print(f"  deposit with aggregates on: {updates * 1e6:.2f}us")
+    print(f"  total ${report['totalCents'] / 100:,.2f} in {report['nonZeroAccounts']:,} funded accounts")
+
+
+def _legacy_parse_change(changeString: str) -> int:
+    # The character-at-a-time parser CoinCollector used to have, for comparison only
+    total = 0
+    s = changeString.replace(",", " ").replace(";", " ")
+    i = 0
+    while i < len(s):
+        m = _LEGACY_COIN_TOKEN.match(s, i)
+        if not m:
+            i += 1
+            continue
+        total += int(m.group(1)) * CoinCollector._VALUES[m.group(2)]
+        i = m.end()
+    return total
+
+
+def _coin_inputs(size: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    tally = []
+    length = 0
+    while length < size:
+        token = f"{rng.randint(1, 500)}{rng.choice('pndqhw')}{rng.choice([' ', ', ', ';'])}"
+        tally.append(token)
+        length += len(token)
+    junk = "".join(rng.choice("abcxyz!?-. ") for _ in range(size))
+    return {
+        "tally": "".join(tally)[:size],
+        "junk": junk,
+        "digits without codes": "7" * size,
+        "digits and spaces": "9 " * (size // 2),
+    }
+
+
+def bench_coins(args):
+    """Coin-string parsing on large machine feeds, including adversarial input."""
+    print(f"input size {args.bytes:,} bytes (legacy parser on the first {args.legacy_bytes:,})")
+    for name, text in _coin_inputs(args.bytes, args.seed).items():
+        start = time.perf_counter()
+        total = CoinCollector.parseChange(text)
+        elapsed = time.perf_counter() - start
+        prefix = text[:args.legacy_bytes]
+        start = time.perf_counter()
+        legacy_total = _legacy_parse_change(prefix)
+        legacy_elapsed = time.perf_counter() - start
+        same = legacy_total == CoinCollector.parseChange(prefix)
+        print(f"  {name:<22} {len(text) / elapsed / 1e6:8.1f} MB/s   legacy {len(prefix) / legacy_elapsed / 1e6:8.2f} MB/s"
+              f"   totals {'match' if same else 'DIFFER'}   ({total:,} cents)")
+
+    feeds = [f"{i % 97}q {i % 13}d {i % 7}n {i % 50}p" for i in range(args.feeds)]
+    start = time.perf_counter()
+    totals = CoinCollector.parseMany(feeds)
+    elapsed = time.perf_counter() - start
+    print(f"  parseMany: {len(totals) / elapsed:,.0f} tallies/s over {len(totals):,} tallies")
+
+
+def bench_views(args):
+    """Transfer throughput and latency while full-bank reports run: none, through a read view, under the locks."""
+    bank = build_bank(args.accounts, args.seed, shards=args.shards)
+    numbers = bank._store.accountNumbers()
+    expected_total = sum(bank._store.balanceColumn())
+    print(f"accounts: {args.accounts:,}, shards: {args.shards}, {args.threads} transfer threads, "
+          f"{args.seconds:g}s per mode")
+
+    # A report that looks at every account in Python, as real ones do, not one C-level sum
+    def report(items):
+        total = 0
+        for _, balance in items:
+            total += balance
+        return total
+
+    def scan_view():
+        with bank.readView() as view:
+            return report(view.items())
+
+    def scan_locked():
+        store = bank._store
+        with store.exclusive():
+            return report(zip(store._numbers, store._balances))
+
+    for mode, scan in (("no report", None), ("report via readView", scan_view), ("report under exclusive()", scan_locked)):
+        stop = threading.Event()
+        latencies = [[] for _ in range(args.threads)]
+        scans, wrong = [0], [0]
+
+        def transfers(t):
+            rng = random.Random(args.seed + t)
+            clock = time.perf_counter
+            out = latencies[t]
+            while not stop.is_set():
+                src, dst = rng.choice(numbers), rng.choice(numbers)
+                t0 = clock()
+                bank.transfer(src, dst, rng.randrange(1, 5000))
+                out.append(clock() - t0)
+
+        def reports():
+            while not stop.is_set():
+                wrong[0] += scan() != expected_total
+                scans[0] += 1
+
+        threads = [threading.Thread(target=transfers, args=(t,)) for t in range(args.threads)]
+        if scan is not None:
+            threads.append(threading.Thread(target=reports))
+        for t in threads:
+            t.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        done = sorted(itertools.chain.from_iterable(latencies))
+        print(f"  {mode:<25} {len(done) / args.seconds:10,.0f} transfers/s   p50 {_percentile(done, 50) * 1e6:7.1f}us"
+              f"  p99 {_percentile(done, 99) * 1e6:7.1f}us  p99.9 {_percentile(done, 99.9) * 1e3:6.2f}ms"
+              + (f"   {scans[0]} reports, {wrong[0]} with a wrong total" if scan is not None else ""))
+
+
+def _money_inputs(count: int, seed: int) -> list:
+    """Amounts as people and files write them: plain, with "$" and separators, past the cent, and very large."""
+    rng = random.Random(seed)
+    out = []
+    for _ in range(count):
+        style = rng.randrange(4)
+        if style == 0:
+            out.append(f"{rng.randrange(1, 10**6) / 100:.2f}")
+        elif style == 1:
+            out.append(f"${rng.randrange(1, 10**9) / 100:,.2f}")
+        elif style == 2:
+            out.append(f"{rng.randrange(10**4)}.{rng.randrange(10**3):03d}")
+        else:
+            out.append(f"{rng.randrange(10**15):,}.{rng.randrange(100):02d}")
+    return out
+
+
+def bench_money(args):
+    """Text -> cents: MoneyParser vs the float + Decimal round-trip it replaces."""
+    amounts = _money_inputs(args.amounts, args.seed)
+    convert = BankUtility.convertFromDollarsToCents
+    print(f"amounts: {len(amounts):,}")
+
+    # The old paths cannot read "$" or separators, so they pay for stripping them
+    start = time.perf_counter()
+    legacy = [convert(float(s.replace("$", "").replace(",", ""))) for s in amounts]
+    legacy_secs = time.perf_counter() - start
+    start = time.perf_counter()
+    exact = [convert(s.replace("$", "").replace(",", "")) for s in amounts]
+    exact_secs = time.perf_counter() - start
+    parse = MoneyParser.parseCents
+    start = time.perf_counter()
+    parsed = [parse(s) for s in amounts]
+    parse_secs = time.perf_counter() - start
+    start = time.perf_counter()
+    many = MoneyParser.parseMany(amounts)
+    many_secs = time.perf_counter() - start
+
+    mismatches = sum(a != b for a, b in zip(parsed, exact)) + sum(a != b for a, b in zip(many, exact))
+    lossy = sum(a != b for a, b in zip(legacy, exact))
+    for name, secs in (("float + Decimal (old)", legacy_secs), ("Decimal from string", exact_secs),
+                       ("MoneyParser.parseCents", parse_secs), ("MoneyParser.parseMany", many_secs)):
+        print(f"  {name:<24} {secs:7.2f}s  {len(amounts) / secs:>12,.0f} amounts/s")
+    print(f"  mismatches vs convertFromDollarsToCents(str): {mismatches}; "
+          f"wrong through float: {lossy:,} ({lossy / len(amounts):.1%})")
+    assert mismatches == 0, "MoneyParser disagrees with convertFromDollarsToCents"
+
+
+_WORKLOAD_OPS = ("deposit", "withdraw", "transfer", "atm", "coins", "interest")
+
+
+def _mix(text: str) -> dict:
+    """"deposit=40,withdraw=25,..." -> {op: weight}"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in _WORKLOAD_OPS:
+            raise argparse.ArgumentTypeError(f"unknown op {name!r}; choose from {', '.join(_WORKLOAD_OPS)}")
+        mix[name] = float(weight)
+    if not any(w > 0 for w in mix.values()):
+        raise argparse.ArgumentTypeError("at least one op needs a positive weight")
+    return mix
+
+
+def _zipf_weights(n: int, s: float) -> list:
+    """Cumulative weights of ranks 1..n under Zipf(s), for random.choices(cum_weights=...)."""
+    return list(itertools.accumulate(1.0 / k ** s for k in range(1, n + 1)))
+
+
+def _peak_rss_mib() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10    # bytes on macOS, KiB elsewhere
+
+
+def _workload_plan(numbers: list, cumWeights: list, mix: dict, ops: int, seed: int) -> list:
+    """(op, account, other account, amount) tuples; accounts are Zipf-skewed, amounts are what a user types."""
+    rng = random.Random(seed)
+    names = rng.choices(list(mix), list(mix.values()), k=ops)
+    accounts = rng.choices(numbers, cum_weights=cumWeights, k=ops)
+    others = rng.choices(numbers, cum_weights=cumWeights, k=ops)
+    plan = []
+    for name, num, other in zip(names, accounts, others):
+        if name == "atm":
+            amount = rng.choice((20, 40, 60, 100, 200))
+        elif name == "coins":
+            amount = f"{rng.randrange(20)}q {rng.randrange(20)}d {rng.randrange(20)}n {rng.randrange(100)}p"
+        else:
+            amount = f"{rng.randrange(1, 50000) / 100:.2f}"
+        plan.append((name, num, other, amount))
+    return plan
+
+
+def _run_plan(bank: Bank, plan: list, latencies: dict, rejected: dict, apr: str):
+    clock = time.perf_counter_ns
+    # Each thread is one ATM terminal, with cassettes that do not run dry
+    atm = ATMDispenser({bill: 10**9 for bill in ATMDispenser.DENOMINATIONS})
+    for name, num, other, amount in plan:
+        ok = True
+        t0 = clock()
+        if name == "deposit":
+            bank.findAccount(num).deposit(MoneyParser.parseCents(amount))
+        elif name == "withdraw":
+            ok = bank.withdraw(num, MoneyParser.parseCents(amount)) is not None
+        elif name == "transfer":
+            ok = bank.transfer(num, other, MoneyParser.parseCents(amount))
+        elif name == "atm":
+            bills = atm.dispense(amount)
+            ok = bills is not None and bank.withdraw(num, amount * 100, Ledger.ATM) is not None
+            if bills is not None and not ok:
+                atm.load(bills)
+        elif name == "coins":
+            bank.deposit(num, CoinCollector.parseChange(amount), Ledger.COINS)
+        else:
+            bank.applyMonthlyInterest(apr)
+        latencies[name].append(clock() - t0)
+        rejected[name] += not ok
+
+
+def _workload_process(config: dict, index: int, barrier, results):
+    """One process of a workload run: its own bank, `threads` threads, results sent back on `results`."""
+    bank = build_bank(config["accounts"], config["seed"], shards=config["threads"])
+    numbers = bank._store.accountNumbers()
+    # Popularity is by rank, so shuffle which account holds which rank
+    random.Random(config["seed"]).shuffle(numbers)
+    cum = _zipf_weights(len(numbers), config["zipf"])
+    workers = config["processes"] * config["threads"]
+    plans = [_workload_plan(numbers, cum, config["mix"], config["ops"] // workers,
+                            config["seed"] + index * config["threads"] + t) for t in range(config["threads"])]
+    latencies = {name: [] for name in config["mix"]}
+    rejected = dict.fromkeys(config["mix"], 0)
+    threads = [threading.Thread(target=_run_plan, args=(bank, plan, latencies, rejected, config["apr"]))
+               for plan in plans]
+    barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    results.put((time.perf_counter() - start, latencies, rejected, _peak_rss_mib()))
+
+
+def _workload_run(config: dict) -> dict:
+    """
+    Run config in fresh processes, so peak RSS belongs to this run alone.
+    Every process has its own bank; throughput is all ops over the slowest process.
+    """
+    ctx = multiprocessing.get_context()
+    barrier, results = ctx.Barrier(config["processes"]), ctx.Queue()
+    procs = [ctx.Process(target=_workload_process, args=(config, i, barrier, results))
+             for i in range(config["processes"])]
+    for p in procs:
+        p.start()
+    parts = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    latencies = {name: [] for name in config["mix"]}
+    rejected = dict.fromkeys(config["mix"], 0)
+    for _, lat, rej, _ in parts:
+        for name in config["mix"]:
+            latencies[name] += lat[name]
+            rejected[name] += rej[name]
+    everything = sorted(itertools.chain.from_iterable(latencies.values()))
+    seconds = max(part[0] for part in parts)
+    rss = [part[3] for part in parts]
+
+    def pcts(values: list) -> dict:
+        values.sort()
+        return {"count": len(values), **{f"p{str(p).replace('.', '')}Us": _percentile(values, p) / 1e3
+                                         for p in (50, 95, 99, 99.9)}}
+
+    return {
+        "accounts": config["accounts"], "processes": config["processes"], "threads": config["threads"],
+        "ops": len(everything), "seconds": seconds, "opsPerSecond": len(everything) / seconds,
+        "latency": pcts(everything),
+        "latencyByOp": {name: {**pcts(values), "rejected": rejected[name]} for name, values in latencies.items()},
+        "peakRssMiB": None if None in rss else sum(rss),
+    }
+
+
+def _workload_regressions(runs: list, baseline: dict, tolerance: float) -> list:
+    """Messages for runs that are slower (throughput or p99) than the matching baseline run by more than tolerance %."""
+    key = lambda r: (r["accounts"], r["processes"], r["threads"])
+    before = {key(r): r for r in baseline["runs"]}
+    found = []
+    for run in runs:
+        base = before.get(key(run))
+        if base is None:
+            continue
+        label = "accounts={}, processes={}, threads={}".format(*key(run))
+        if run["opsPerSecond"] < base["opsPerSecond"] * (1 - tolerance / 100):
+            found.append(f"{label}: {run['opsPerSecond']:,.0f} ops/s vs {base['opsPerSecond']:,.0f} in the baseline")
+        if run["latency"]["p99Us"] > base["latency"]["p99Us"] * (1 + tolerance / 100):
+            found.append(f"{label}: p99 {run['latency']['p99Us']:,.1f}us vs {base['latency']['p99Us']:,.1f}us "
+                         "in the baseline")
+    return found
+
+
+def bench_workload(args):
+    """
+    Seeded operation mix over synthetic banks, for every combination of account,
+    process and thread count: throughput, latency percentiles and peak RSS.
+    """
+    print(f"mix: {', '.join(f'{n}={w:g}' for n, w in args.mix.items())}; zipf s={args.zipf}; "
+          f"{args.ops:,} ops per run")
+    runs = []
+    for accounts in args.accounts:
+        for processes in args.processes:
+            for threads in args.threads:
+                config = {"accounts": accounts, "processes": processes, "threads": threads, "ops": args.ops,
+                          "mix": args.mix, "zipf": args.zipf, "apr": args.apr, "seed": args.seed}
+                run = _workload_run(config)
+                runs.append(run)
+                lat = run["latency"]
+                rss = "n/a" if run["peakRssMiB"] is None else f"{run['peakRssMiB']:,.0f} MiB"
+                print(f"  accounts={accounts:<9,} processes={processes:<2} threads={threads:<3}"
+                      f"{run['opsPerSecond']:>10,.0f} ops/s   p50 {lat['p50Us']:7.1f}us  p99 {lat['p99Us']:8.1f}us"
+                      f"  p99.9 {lat['p999Us']:9.1f}us   peak RSS {rss}")
+                for name, op in run["latencyByOp"].items():
+                    print(f"      {name:<9} {op['count']:>9,}  p50 {op['p50Us']:7.1f}us  p99 {op['p99Us']:8.1f}us"
+                          f"  rejected {op['rejected']:,}")
+
+    if args.json:
+        settings = {"ops": args.ops, "mix": args.mix, "zipf": args.zipf, "apr": args.apr, "seed": args.seed}
+        with open(args.json, "w") as f:
+            json.dump({"settings": settings, "runs": runs}, f, indent=1)
+        print(f"results written to {args.json}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = _workload_regressions(runs, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"  REGRESSION {message}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"no regressions beyond {args.tolerance:g}% against {args.baseline}")
+
+
+def _int_list(text: str) -> list:
+    return [int(x) for x in text.split(",")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banking benchmarks")
+    parser.add_argument("--seed", type=int, default=1)
+    sub = parser.add_subparsers(dest="scenario", required=True)
+
+    p = sub.add_parser("memory", help="memory of dict-of-objects vs columnar store")
+    p.add_argument("--accounts", type=int, default=1000000)
+    p.set_defaults(func=bench_memory)
+
+    p = sub.add_parser("interest", help="batch monthly interest vs the Decimal loop")
+    p.add_argument("--sizes", type=_int_list, default=[100000, 1000000, 10000000],
+                   help="comma-separated account counts")
+    p.add_argument("--apr", default="3.6")
+    p.add_argument("--cases", type=int, default=300, help="random APRs in the property check")
+    p.set_defaults(func=bench_interest)
+
+    p = sub.add_parser("journal", help="journal throughput and commit latency per fsync policy")
+    p.add_argument("--accounts", type=int, default=1000)
+    p.add_argument("--ops", type=int, default=20000)
+    p.add_argument("--threads", type=int, default=16)
+    p.add_argument("--policies", type=lambda s: s.split(","), default=list(_SYNC_POLICIES),
+                   help="comma-separated subset of: " + ", ".join(_SYNC_POLICIES))
+    p.set_defaults(func=bench_journal)
+
+    p = sub.add_parser("startup", help="checkpoint write and mmap startup time")
+    p.add_argument("--accounts", type=int, default=1000000)
+    p.add_argument("--tail", type=int, default=10000, help="journal records written after the checkpoint")
+    p.add_argument("--ledger-months", type=int, default=1, help="months of interest in the ledger (an entry per account)")
+    p.add_argument("--max-startup", type=float, default=1.0, help="exit non-zero if startup takes this long (seconds)")
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser("coldstart", help="launch of the headless menu to its first operation, in fresh processes")
+    p.add_argument("--runs", type=int, default=20)
+    p.set_defaults(func=bench_coldstart)
+
+    p = sub.add_parser("replay", help="replay recorded menu sessions through a headless BankManager")
+    p.add_argument("--accounts", type=int, default=100, help="each costs one slow PIN hash per run")
+    p.add_argument("--interactions", type=int, default=100000)
+    p.set_defaults(func=bench_replay)
+
+    p = sub.add_parser("batch", help="bulk deposit ingestion throughput")
+    p.add_argument("--accounts", type=int, default=100000)
+    p.add_argument("--records", type=int, default=1000000)
+    p.add_argument("--target", type=int, default=500000, help="records/s goal for one core")
+    p.set_defaults(func=bench_batch)
+
+    p = sub.add_parser("shards", help="concurrent transfers across shards (threads and processes)")
+    p.add_argument("--accounts", type=int, default=100000)
+    p.add_argument("--shards", type=int, default=16)
+    p.add_argument("--transfers", type=int, default=200000)
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="scale from 1 up to this many")
+    p.set_defaults(func=bench_shards)
+
+    p = sub.add_parser("partitions", help="cross-partition two-phase-commit transfers, scaling and fault injection")
+    p.add_argument("--partitions", type=lambda s: [int(x) for x in s.split(",")], default=[2, 4, 8],
+                   help="comma-separated partition counts")
+    p.add_argument("--accounts", type=int, default=50, help="per partition; each costs one slow PIN hash")
+    p.add_argument("--threads", type=int, default=2, help="client threads per partition")
+    p.add_argument("--seconds", type=float, default=5.0, help="per run")
+    p.add_argument("--sync-every", type=int, default=1, help="journal syncEvery of each partition's Bank")
+    p.add_argument("--faults", type=int, default=20, help="worker crashes injected into a last run (0 = none)")
+    p.set_defaults(func=bench_partitions)
+
+    p = sub.add_parser("server", help="load-generate against BankServer over localhost TCP")
+    p.add_argument("--accounts", type=int, default=100)
+    p.add_argument("--connections", type=int, default=500)
+    p.add_argument("--requests", type=int, default=200, help="per connection")
+    p.add_argument("--window", type=int, default=16, help="pipelined requests in flight per connection")
+    p.add_argument("--bad-pin-connections", type=int, default=8, help="clients sending wrong PINs during the probe")
+    p.add_argument("--probes", type=int, default=200, help="requests timed while the wrong PINs arrive")
+    p.add_argument("--max-probe-ms", type=float, default=20.0, help="fail if probe p99 latency exceeds this")
+    p.set_defaults(func=bench_server)
+
+    p = sub.add_parser("atm", help="concurrent ATM dispensing with finite cassettes")
+    p.add_argument("--terminals", type=int, default=8)
+    p.add_argument("--withdrawals", type=int, default=1000, help="per terminal")
+    p.add_argument("--bills", type=int, default=2000, help="starting bills per cassette")
+    p.set_defaults(func=bench_atm)
+
+    p = sub.add_parser("lookup", help="owner SSN / name lookups: indexes vs linear scan")
+    p.add_argument("--accounts", type=int, default=1000000)
+    p.add_argument("--queries", type=int, default=1000)
+    p.add_argument("--scans", type=int, default=3, help="linear scans to time (they are slow)")
+    p.add_argument("--page", type=int, default=50)
+    p.set_defaults(func=bench_lookup)
+
+    p = sub.add_parser("allocator", help="account-number generation at 10/50/90%% occupancy")
+    p.add_argument("--opens", type=int, default=100000)
+    p.add_argument("--occupancy", type=_int_list, default=[10, 50, 90], help="comma-separated percentages")
+    p.set_defaults(func=bench_allocator)
+
+    p = sub.add_parser("auth", help="authenticated operations with the PIN cache on and off")
+    p.add_argument("--accounts", type=int, default=100)
+    p.add_argument("--sessions", type=int, default=200)
+    p.add_argument("--ops", type=int, default=50000)
+    p.add_argument("--uncached-ops", type=int, default=500)
+    p.add_argument("--cache-size", type=int, default=10000)
+    p.set_defaults(func=bench_auth)
+
+    p = sub.add_parser("statement", help="date-range statement latency for an account with a long history")
+    p.add_argument("--entries", type=int, default=1000000, help="entries for the queried account")
+    p.add_argument("--others", type=int, default=200000, help="entries for other accounts, interleaved")
+    p.add_argument("--queries", type=int, default=1000)
+    p.add_argument("--days", type=int, default=30)
+    p.set_defaults(func=bench_statement)
+
+    p = sub.add_parser("crash", help="kill a journaled bank mid-traffic and reconcile its ledger on reopen")
+    p.add_argument("--accounts", type=int, default=200)
+    p.add_argument("--threads", type=int, default=4)
+    p.add_argument("--crashes", type=int, default=5)
+    p.set_defaults(func=bench_crash)
+
+    p = sub.add_parser("report", help="bank-wide totals: maintained aggregates vs a full scan")
+    p.add_argument("--accounts", type=int, default=1000000)
+    p.add_argument("--scans", type=int, default=3)
+    p.add_argument("--reports", type=int, default=10000)
+    p.add_argument("--updates", type=int, default=100000, help="deposits applied before the timed reports")
+    p.set_defaults(func=bench_report)
+
+    p = sub.add_parser("postings", help="month-end interest and fee posting by account class")
+    p.add_argument("--accounts", type=int, default=10000000)
+    p.add_argument("--chunks", type=int, default=256, help="account-number ranges per run")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--check-accounts", type=int, default=20000, help="accounts in the journaled correctness checks")
+    p.set_defaults(func=bench_postings)
+
+    p = sub.add_parser("dedup", help="per-operation overhead of idempotency keys")
+    p.add_argument("--accounts", type=int, default=100000)
+    p.add_argument("--ops", type=int, default=500000)
+    p.add_argument("--journal", action="store_true", help="journal to a temp file (no fsync)")
+    p.set_defaults(func=bench_dedup)
+
+    p = sub.add_parser("instrumentation", help="overhead of hot-path metrics when off, on and sampling")
+    p.add_argument("--accounts", type=int, default=100000)
+    p.add_argument("--ops", type=int, default=50000)
+    p.add_argument("--rounds", type=int, default=5)
+    p.add_argument("--sample-every", type=int, default=1000)
+    p.set_defaults(func=bench_instrumentation)
+
+    p = sub.add_parser("coins", help="coin-string parsing throughput, including adversarial input")
+    p.add_argument("--bytes", type=int, default=1 << 20)
+    p.add_argument("--legacy-bytes", type=int, default=20000,
+                   help="prefix given to the old parser (it is quadratic on some inputs)")
+    p.add_argument("--feeds", type=int, default=200000, help="tallies for the parseMany run")
+    p.set_defaults(func=bench_coins)
+
+    p = sub.add_parser("views", help="transfers while full-bank reports run through read views vs the locks")
+    p.add_argument("--accounts", type=int, default=200000)
+    p.add_argument("--shards", type=int, default=16)
+    p.add_argument("--threads", type=int, default=4, help="transfer threads")
+    p.add_argument("--seconds", type=float, default=5.0, help="per mode")
+    p.set_defaults(func=bench_views)
+
+    p = sub.add_parser("money", help="dollar-string parsing: MoneyParser vs float + Decimal")
+    p.add_argument("--amounts", type=int, default=2000000)
+    p.set_defaults(func=bench_money)
+
+    p = sub.add_parser("workload", help="seeded operation mix with Zipf-skewed accounts; scaling, JSON, baseline")
+    p.add_argument("--accounts", type=_int_list, default=[10000, 100000], help="comma-separated account counts")
+    p.add_argument("--processes", type=_int_list, default=[1], help="comma-separated process counts")
+    p.add_argument("--threads", type=_int_list, default=[1, 4], help="comma-separated threads per process")
+    p.add_argument("--ops", type=int, default=100000, help="operations per run, split over all threads")
+    p.add_argument("--mix", type=_mix, default=_mix("deposit=40,withdraw=25,transfer=20,atm=5,coins=10,interest=0.002"),
+                   help="comma-separated op=weight")
+    p.add_argument("--zipf", type=float, default=1.1, help="skew of account popularity (0 = uniform)")
+    p.add_argument("--apr", default="3.6", help="APR for interest ops")
+    p.add_argument("--json", help="write results to this file")
+    p.add_argument("--baseline", help="results file of an earlier run; exit 1 if this run is slower")
+    p.add_argument("--tolerance", type=float, default=10.0, help="allowed slowdown vs the baseline, in percent")
+    p.set_defaults(func=bench_workload)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,64 @@
 import re
+from array import array
 
 class CoinCollector:
-    _VALUES = {"p": 1, "n": 5, "d": 10, "q": 25, "h": 50, "w": 100}
+    """
+    Parses coin tallies such as "3q 2d, 4p" into cents.
 
-    # NOTE: remove spaces from the character class
-    _TOKEN = re.compile(r"\s*([0-9]+)\s*([pndqhwPNDQHW])\s*")
+    Each token is a count followed by a coin code (p, n, d, q, h, w; any case),
+    optionally separated by whitespace, commas or semicolons. The string is
+    tokenized in a single regex pass (findall, or finditer in strict mode); anything that is not a token is skipped,
+    or reported with strict=True.
+    """
+    _VALUES = {"p": 1, "n": 5, "d": 10, "q": 25, "h": 50, "w": 100,
+               "P": 1, "N": 5, "D": 10, "Q": 25, "H": 50, "W": 100}
+
+    # A token's count must not start in the middle of a longer digit run, so
+    # each run of digits is tried once and a scan is linear in the input
+    _TOKEN = re.compile(r"(?<![0-9])([0-9]+)[\s,;]*([pndqhwPNDQHW])")
+    _SEPARATORS = re.compile(r"[\s,;]*")
+
+    @staticmethod
+    def _malformed(s: str, start: int, end: int, bad: list):
+        gap = CoinCollector._SEPARATORS.match(s, start, end)
+        if gap.end() < end:
+            bad.append(gap.end())
 
     @staticmethod
-    def parseChange(changeString: str) -> int:
+    def parseChange(changeString: str, strict: bool = False) -> int:
+        """
+        Total cents in changeString. With strict=True, any text between tokens other than
+        separators raises ValueError listing the offsets where the malformed text starts.
+        """
         if not changeString:
             return 0
 
+        values = CoinCollector._VALUES
         total = 0
-        s = changeString.replace(",", " ").replace(";", " ")
-        i = 0
-        while i < len(s):
-            m = CoinCollector._TOKEN.match(s, i)
-            if not m:
-                i += 1
-                continue
-            qty = int(m.group(1))
-            code = m.group(2).lower().strip()
-            if code in CoinCollector._VALUES:
-                total += qty * CoinCollector._VALUES[code]
-            i = m.end()
+        if not strict:
+            for qty, code in CoinCollector._TOKEN.findall(changeString):
+                total += int(qty) * values[code]
+            return total
+
+        bad = []
+        pos = 0
+        for m in CoinCollector._TOKEN.finditer(changeString):
+            if m.start() > pos:
+                CoinCollector._malformed(changeString, pos, m.start(), bad)
+            total += int(m.group(1)) * values[m.group(2)]
+            pos = m.end()
+        if pos < len(changeString):
+            CoinCollector._malformed(changeString, pos, len(changeString), bad)
+        if bad:
+            shown = ", ".join(str(i) for i in bad[:10]) + (", ..." if len(bad) > 10 else "")
+            raise ValueError(f"Malformed coin string: {len(bad)} bad token(s) at offset(s) {shown}")
         return total
+
+    @staticmethod
+    def parseMany(changeStrings, strict: bool = False) -> array:
+        """Parse each string of an iterable (e.g. one tally per machine feed line); returns an array of cents."""
+        totals = array("q")
+        parse = CoinCollector.parseChange
+        for s in changeStrings:
+            totals.append(parse(s, strict))
+        return totals
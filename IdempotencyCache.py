@@ -0,0 +1,92 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class IdempotencyCache:
+    """
+    Results of completed money-moving requests by client-chosen idempotency key,
+    so a retried request returns the first result instead of moving money twice.
+
+    At most `maxSize` keys are kept, each for `ttlSeconds` after it completed;
+    the oldest are dropped first. Entries are kept in completion order, so both
+    lookups and expiry are O(1).
+
+    Each entry also holds the request it answered (as its journal record, minus
+    the key); reusing a key for a different request is an error. AccountStore
+    consults the cache under the account's shard lock, so a key is applied at
+    most once even when retries race. Bank persists the cache with each
+    checkpoint; the journal after it re-adds newer keys on replay, with the
+    time each completed, so a replayed key expires when it first would have.
+    """
+
+    MAX_KEY_LENGTH = 200
+
+    def __init__(self, maxSize: int = 100000, ttlSeconds: float = 86400.0):
+        self.maxSize = maxSize
+        self.ttlSeconds = ttlSeconds
+        self._entries = OrderedDict()    # key -> (request, result, expires at as time.time())
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def checkKey(key: str):
+        if not isinstance(key, str) or not 0 < len(key) <= IdempotencyCache.MAX_KEY_LENGTH:
+            raise ValueError(f"Idempotency keys must be strings of 1 to {IdempotencyCache.MAX_KEY_LENGTH} characters.")
+
+    def get(self, key: str, request: tuple):
+        """The result recorded for key, or None. Raises ValueError if key answered a different request."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() >= entry[2]:
+                del self._entries[key]
+                return None
+        if entry[0] != request:
+            raise ValueError("This idempotency key was already used for a different request.")
+        return entry[1]
+
+    def put(self, key: str, request: tuple, result, expires: float | None = None):
+        """Remember key until `expires` (time.time(); default ttlSeconds from now). An already expired entry is skipped."""
+        if self.maxSize <= 0:
+            return
+        now = time.time()
+        entry = (request, result, now + self.ttlSeconds if expires is None else expires)
+        if entry[2] <= now:
+            return
+        with self._lock:
+            entries = self._entries
+            if key in entries:
+                entries.move_to_end(key)
+            entries[key] = entry
+            if len(entries) > self.maxSize:
+                entries.popitem(last=False)
+            # Expired entries are all at the old end
+            while entries and next(iter(entries.values()))[2] <= now:
+                entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ---------- Persistence ----------
+    def save(self, path: str):
+        """Write the unexpired entries to path (atomically via a temp file + rename)."""
+        now = time.time()
+        with self._lock:
+            rows = [[key, list(request), result, expires]
+                    for key, (request, result, expires) in self._entries.items() if expires > now]
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(rows, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def load(self, path: str):
+        """Add the entries saved in path that have not expired yet."""
+        with open(path) as f:
+            rows = json.load(f)
+        for key, request, result, expires in rows:
+            self.put(key, tuple(request), tuple(result) if isinstance(result, list) else result, expires)
@@ -0,0 +1,306 @@
+import cProfile
+import http.server
+import inspect
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from array import array
+from functools import wraps
+
+
+class Histogram:
+    """
+    Latency histogram over fixed log-linear buckets, as HDR histograms lay them
+    out: values below 2**SUB_BITS get one bucket each, and every power of two
+    above that is split into 2**(SUB_BITS - 1) equal buckets, so any value is
+    within 1/2**(SUB_BITS - 1) of its bucket's bounds. Values are nanoseconds
+    (or bytes) and recording one is a bit_length, a shift and an increment.
+    """
+
+    SUB_BITS = 4
+    MAX_BITS = 44                # about 4.9 hours in nanoseconds; larger values land in the last bucket
+    SIZE = (MAX_BITS - SUB_BITS + 1) * (1 << (SUB_BITS - 1)) + (1 << (SUB_BITS - 1))
+
+    def __init__(self):
+        self.counts = array("q", bytes(8 * Histogram.SIZE))
+        self.count = 0
+        self.total = 0
+
+    @staticmethod
+    def index(value: int) -> int:
+        bits = value.bit_length()
+        if bits <= Histogram.SUB_BITS:
+            return value
+        shift = bits - Histogram.SUB_BITS
+        if bits > Histogram.MAX_BITS:
+            return Histogram.SIZE - 1
+        # The top SUB_BITS bits of value, in [2**(SUB_BITS - 1), 2**SUB_BITS)
+        return (shift << (Histogram.SUB_BITS - 1)) + (value >> shift)
+
+    @staticmethod
+    def upperBound(index: int) -> int:
+        """Largest value recorded in bucket `index`."""
+        half = 1 << (Histogram.SUB_BITS - 1)
+        if index < 2 * half:
+            return index
+        shift, top = divmod(index - half, half)
+        return ((top + half + 1) << shift) - 1
+
+    def record(self, value: int):
+        self.counts[Histogram.index(value)] += 1
+        self.count += 1
+        self.total += value
+
+    def percentile(self, pct: float) -> int:
+        """Upper bound of the bucket holding the pct-th percentile (0 if empty)."""
+        if not self.count:
+            return 0
+        rank = max(1, -(-self.count * pct // 100))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return Histogram.upperBound(i)
+        return Histogram.upperBound(Histogram.SIZE - 1)
+
+
+class _Operation:
+    """Counters for one instrumented callable."""
+    __slots__ = ("name", "latency", "errors", "calls", "lock")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latency = Histogram()    # nanoseconds per call
+        self.errors = 0               # calls that raised
+        self.calls = 0                # for choosing which calls to sample
+        self.lock = threading.Lock()
+
+
+class Instrumentation:
+    """
+    Per-operation call counts, error counts and latency histograms for the hot
+    paths of the bank, plus optional sampling of every Nth call under cProfile
+    or tracemalloc.
+
+    enable() replaces each target (class, attribute name) with a timing wrapper
+    and disable() puts the original back, so while instrumentation is off the
+    code runs exactly as before, at no cost at all. Only one Instrumentation
+    can be enabled at a time.
+
+        metrics = Instrumentation(sampleEvery=1000, sampleMode="cprofile")
+        with metrics:
+            ...
+        metrics.writePrometheus("bank.prom")
+        metrics.profileStats().sort_stats("cumulative").print_stats(20)
+    """
+
+    SAMPLE_MODES = (None, "cprofile", "tracemalloc")
+    _active = None
+
+    def __init__(self, targets=None, sampleEvery: int = 0, sampleMode: str | None = None):
+        if sampleMode not in Instrumentation.SAMPLE_MODES:
+            raise ValueError(f"sampleMode must be one of {Instrumentation.SAMPLE_MODES}.")
+        self.targets = list(targets) if targets is not None else Instrumentation.defaultTargets()
+        self.sampleEvery = int(sampleEvery) if sampleMode else 0
+        self.sampleMode = sampleMode
+        self.operations = {f"{cls.__name__}.{name}": _Operation(f"{cls.__name__}.{name}")
+                           for cls, name in self.targets}
+        self._originals = []          # (class, name, attribute as found on the class)
+        self._profile = cProfile.Profile() if sampleMode == "cprofile" else None
+        self._allocations = Histogram() if sampleMode == "tracemalloc" else None
+        self._allocationSites = {}    # "file:line" -> bytes allocated during sampled calls
+        self._sampling = threading.Lock()
+        self._server = None
+
+    @staticmethod
+    def defaultTargets() -> list:
+        from Bank import Bank
+        from CoinCollector import CoinCollector
+        from MoneyParser import MoneyParser
+        return [(Bank, "findAccount"), (Bank, "deposit"), (Bank, "withdraw"), (Bank, "transfer"),
+                (MoneyParser, "parseCents"), (CoinCollector, "parseChange")]
+
+    # ---------- Switching on and off ----------
+    def enable(self):
+        if Instrumentation._active is not None:
+            raise RuntimeError("Another Instrumentation is already enabled.")
+        Instrumentation._active = self
+        for cls, name in self.targets:
+            found = inspect.getattr_static(cls, name)
+            self._originals.append((cls, name, found))
+            if isinstance(found, staticmethod):
+                setattr(cls, name, staticmethod(self._wrap(found.__func__, self.operations[f"{cls.__name__}.{name}"])))
+            else:
+                setattr(cls, name, self._wrap(found, self.operations[f"{cls.__name__}.{name}"]))
+
+    def disable(self):
+        for cls, name, found in reversed(self._originals):
+            setattr(cls, name, found)
+        self._originals.clear()
+        if Instrumentation._active is self:
+            Instrumentation._active = None
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.disable()
+
+    def _wrap(self, func, op: _Operation):
+        clock = time.perf_counter_ns
+        every = self.sampleEvery
+        sampled = self._sampled
+
+        @wraps(func)
+        def timed(*args, **kwargs):
+            if every:
+                with op.lock:
+                    op.calls += 1
+                    sample = op.calls % every == 0
+                if sample:
+                    return sampled(func, op, args, kwargs)
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                with op.lock:
+                    op.errors += 1
+                raise
+            finally:
+                elapsed = clock() - start
+                with op.lock:
+                    op.latency.record(elapsed)
+        return timed
+
+    def _sampled(self, func, op: _Operation, args, kwargs):
+        # One sampled call at a time: profilers are process-wide, and a call sampled
+        # inside another (e.g. parseChange under a sampled deposit) is already covered
+        if not self._sampling.acquire(blocking=False):
+            return func(*args, **kwargs)
+        tracing = self.sampleMode == "tracemalloc" and not tracemalloc.is_tracing()
+        start = time.perf_counter_ns()
+        try:
+            if self._profile is not None:
+                self._profile.enable()
+            elif tracing:
+                tracemalloc.start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if self._profile is not None:
+                    self._profile.disable()
+                elif tracing:
+                    self._recordAllocations(tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()[1])
+                    tracemalloc.stop()
+        except BaseException:
+            with op.lock:
+                op.errors += 1
+            raise
+        finally:
+            # Sampled calls pay for the profiler, so they are timed but kept apart
+            elapsed = time.perf_counter_ns() - start
+            with op.lock:
+                op.latency.record(elapsed)
+            self._sampling.release()
+
+    def _recordAllocations(self, snapshot, peak: int):
+        self._allocations.record(peak)
+        sites = self._allocationSites
+        for stat in snapshot.statistics("lineno"):
+            frame = stat.traceback[0]
+            site = f"{frame.filename}:{frame.lineno}"
+            sites[site] = sites.get(site, 0) + stat.size
+
+    # ---------- Reading results ----------
+    def profileStats(self) -> pstats.Stats | None:
+        """cProfile statistics of every sampled call so far (cprofile mode only)."""
+        if self._profile is None:
+            return None
+        return pstats.Stats(self._profile)
+
+    def allocationSites(self, limit: int = 20) -> list:
+        """(file:line, bytes) allocated during sampled calls, largest first (tracemalloc mode only)."""
+        return sorted(self._allocationSites.items(), key=lambda item: -item[1])[:limit]
+
+    def summary(self) -> dict:
+        """name -> {calls, errors, meanNs, p50Ns, p99Ns, maxNs} for every operation that was called."""
+        out = {}
+        for name, op in self.operations.items():
+            h = op.latency
+            if h.count:
+                out[name] = {"calls": h.count, "errors": op.errors, "meanNs": h.total // h.count,
+                             "p50Ns": h.percentile(50), "p99Ns": h.percentile(99), "maxNs": h.percentile(100)}
+        return out
+
+    # ---------- Prometheus export ----------
+    @staticmethod
+    def _label(name: str) -> str:
+        return name.replace("\\", "\\\\").replace('"', '\\"')
+
+    def prometheusText(self) -> str:
+        """Every operation's counters and latency histogram in the Prometheus text format."""
+        lines = [
+            "# HELP bank_operation_errors_total Calls that raised an exception.",
+            "# TYPE bank_operation_errors_total counter",
+        ]
+        for name, op in self.operations.items():
+            lines.append(f'bank_operation_errors_total{{operation="{self._label(name)}"}} {op.errors}')
+        lines += [
+            "# HELP bank_operation_seconds Latency of instrumented bank operations.",
+            "# TYPE bank_operation_seconds histogram",
+        ]
+        for name, op in self.operations.items():
+            label = self._label(name)
+            with op.lock:
+                counts, count, total = op.latency.counts.tolist(), op.latency.count, op.latency.total
+            last = max((i for i, n in enumerate(counts) if n), default=-1)
+            seen = 0
+            # Buckets up to the highest one used; the rest would repeat the total
+            for i in range(last + 1):
+                seen += counts[i]
+                if counts[i] or i == last:
+                    le = (Histogram.upperBound(i) + 1) / 1e9
+                    lines.append(f'bank_operation_seconds_bucket{{operation="{label}",le="{le:.9g}"}} {seen}')
+            lines.append(f'bank_operation_seconds_bucket{{operation="{label}",le="+Inf"}} {count}')
+            lines.append(f'bank_operation_seconds_sum{{operation="{label}"}} {total / 1e9:.9g}')
+            lines.append(f'bank_operation_seconds_count{{operation="{label}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def writePrometheus(self, path: str):
+        """Write prometheusText() to path atomically, e.g. for node_exporter's textfile collector."""
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(self.prometheusText())
+        os.replace(tmp, path)
+
+    def serve(self, port: int = 9464, host: str = "127.0.0.1") -> tuple:
+        """Serve prometheusText() at http://host:port/metrics from a daemon thread. Returns (host, port)."""
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheusText().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+        return self._server.server_address[:2]
+
+    def stopServing(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
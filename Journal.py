@@ -0,0 +1,185 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Journal:
+    """
+    Append-only write-ahead journal of bank mutations, one JSON array per line.
+
+    append() returns once the record is on disk, and records appended by
+    concurrent threads are made durable together (group commit): the first
+    appender to find no fsync running leads the next one, writing and
+    fsync'ing every record pending at that moment, while the others wait for
+    the fsync that covers theirs. Records that arrive during an fsync go
+    into the next one.
+      syncEvery=N (N > 0)               -> a leader fsyncs at once
+      syncIntervalMs=M                  -> a leader first waits up to M ms for more
+                                           records to join its fsync, or until
+                                           syncEvery (if > 1) records are pending
+      syncEvery=0, syncIntervalMs=None  -> no fsync: append() returns as soon as the
+                                           record is buffered, so acknowledged records
+                                           are NOT durable until sync() or close()
+    Waiting for others only pays when several threads append at once; a
+    single thread gets one fsync per record whatever the settings.
+
+    A writer that appends while holding a lock should do so inside
+    deferring(), which waits for the fsync after the lock is released, so
+    that other writers can append and join the same fsync meanwhile.
+    """
+
+    def __init__(self, path: str, syncEvery: int = 1, syncIntervalMs: float | None = None):
+        self._path = path
+        self._file = open(path, "ab")
+        self._syncEvery = int(syncEvery) if syncEvery > 1 else None   # batch that ends a linger early
+        self._interval = syncIntervalMs / 1000.0 if syncIntervalMs else 0.0
+        self._durable = bool(syncEvery) or bool(syncIntervalMs)
+        self._cond = threading.Condition()
+        self._buffer = []            # encoded lines not yet written
+        self._appended = self._file.tell()   # byte position after the last record appended
+        self._synced = self._appended        # ... and after the last one on disk (written and fsync'd)
+        self._syncing = False        # a leader is writing and fsync'ing outside the lock
+        self._closed = False
+        self._local = threading.local()   # per thread: inside deferring()? last record appended
+
+    # ---------- Writing ----------
+    def append(self, record: list) -> int:
+        """
+        Add a record; returns its position, the byte offset just past it (replay()
+        reports the same). See deferring() for when it is durable.
+        """
+        line = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+        local = self._local
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Journal is closed.")
+            self._buffer.append(line)
+            self._appended += len(line)
+            position = self._appended
+            if getattr(local, "deferring", False):
+                local.last = position
+            elif self._durable:
+                self._waitFor(position, self._interval)
+        return position
+
+    @contextmanager
+    def deferring(self, lock=None):
+        """
+        Hold `lock` (if given) for the block; append() inside it returns at once,
+        and leaving the block (after releasing the lock) waits until every record
+        this thread appended is durable. Nests: only the outermost block waits.
+        """
+        local = self._local
+        outer = getattr(local, "deferring", False)
+        local.deferring = True
+        try:
+            if lock is None:
+                yield
+            else:
+                with lock:
+                    yield
+        finally:
+            if not outer:
+                local.deferring = False
+                position = getattr(local, "last", 0)
+                if self._durable and position:
+                    with self._cond:
+                        self._waitFor(position, self._interval)
+
+    def sync(self):
+        """Write and fsync everything appended so far."""
+        with self._cond:
+            self._waitFor(self._appended, 0.0)
+
+    def _waitFor(self, position: int, linger: float):
+        # Caller holds _cond; returns once every record up to `position` is on disk
+        deadline = None
+        while self._synced < position:
+            if self._syncing:
+                self._cond.wait()
+                continue
+            if linger and (self._syncEvery is None or len(self._buffer) < self._syncEvery):
+                # Lead the next fsync, after giving other appenders a moment to join it
+                if deadline is None:
+                    deadline = time.monotonic() + linger
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+            self._syncBatch()
+
+    def _syncBatch(self):
+        # Caller holds _cond and no fsync is running; the file is written with
+        # the lock released, so appenders can queue the next batch meanwhile
+        lines, upTo = self._buffer, self._appended
+        self._buffer = []
+        self._syncing = True
+        self._cond.release()
+        try:
+            if lines:
+                self._file.write(b"".join(lines))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except BaseException:
+            with self._cond:
+                # Not durable: the next leader retries these records first
+                self._buffer[:0] = lines
+                self._syncing = False
+                self._cond.notify_all()
+            raise
+        finally:
+            self._cond.acquire()
+        self._syncing = False
+        self._synced = upTo
+        self._cond.notify_all()
+
+    def size(self) -> int:
+        """Byte length of the journal once everything pending is synced."""
+        with self._cond:
+            self._waitFor(self._appended, 0.0)
+            while self._syncing:
+                self._cond.wait()
+            return self._file.tell()
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._waitFor(self._appended, 0.0)
+            while self._syncing:
+                self._cond.wait()
+            self._closed = True
+            self._file.close()
+
+    # ---------- Reading ----------
+    @staticmethod
+    def replay(path: str, apply, offset: int = 0, positions: bool = False) -> int:
+        """
+        Call apply(record) for every complete record from byte `offset` on, or
+        with positions=True apply(record, position) (see append()).
+        A torn or corrupt tail (crash mid-write) is truncated away.
+        Returns the byte offset of the end of the last good record.
+        """
+        if not os.path.exists(path):
+            return offset
+        end = offset
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                end += len(line)
+                if positions:
+                    apply(record, end)
+                else:
+                    apply(record)
+        if os.path.getsize(path) > end:
+            with open(path, "r+b") as f:
+                f.truncate(end)
+        return end
@@ -0,0 +1,415 @@
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+
+class _Segment:
+    """
+    Up to SEGMENT_SIZE ledger entries as parallel columns, plus the index of
+    which entries belong to which account. While the segment is being filled
+    the index is a dict; once full it is sealed into sorted arrays.
+
+    A segment read back from the ledger file starts out as just its slice of
+    the mapped file (see mapped()); load() turns it into columns and an index
+    the first time a statement needs its entries.
+    """
+    __slots__ = ("timestamps", "accounts", "kinds", "amounts", "counterparties", "balances",
+                 "_open", "_keys", "_starts", "_offsets", "_source")
+
+    def __init__(self):
+        self.timestamps = array("q")       # microseconds since the epoch
+        self.accounts = array("q")
+        self.kinds = array("B")
+        self.amounts = array("q")          # signed cents
+        self.counterparties = array("q")   # other account of a transfer, else 0
+        self.balances = array("q")         # account balance after the entry
+        self._open = {}                    # account -> array of offsets (while filling)
+        self._keys = None                  # sorted accounts (once sealed)
+        self._starts = None                # _offsets[_starts[i]:_starts[i + 1]] belong to _keys[i]
+        self._offsets = None
+        self._source = None                # records in the ledger file, until load()
+
+    @staticmethod
+    def mapped(records: memoryview) -> "_Segment":
+        """A segment of whole records from the ledger file, read only when load() is called."""
+        seg = _Segment()
+        seg._source = records
+        return seg
+
+    def load(self, seal: bool = True):
+        """Read a mapped segment's records into the columns and index them (no-op once loaded)."""
+        records = self._source
+        if records is None:
+            return
+        # Whole columns at a time: every field is at a fixed stride in the file
+        fields = records.cast("q")
+        for column, field in ((self.timestamps, 0), (self.accounts, 1), (self.amounts, 2),
+                              (self.counterparties, 3), (self.balances, 4)):
+            column.frombytes(fields[field::6].tobytes())
+            if sys.byteorder == "big":
+                column.byteswap()      # the file is little-endian
+        self.kinds.frombytes(records[40::Ledger._RECORD.size].tobytes())    # low byte of the last field
+        self._source = None
+        accounts = self.accounts
+        if not seal:
+            index = self._open
+            for offset, num in enumerate(accounts):
+                offsets = index.get(num)
+                if offsets is None:
+                    offsets = index[num] = array("H")
+                offsets.append(offset)
+            return
+        # The sealed index straight away: offsets sorted by account (stably, so each account's stay in order)
+        order = sorted(range(len(accounts)), key=accounts.__getitem__)
+        ordered = array("q", map(accounts.__getitem__, order))
+        starts = array("I", [0])
+        starts.extend(i for i in range(1, len(ordered)) if ordered[i] != ordered[i - 1])
+        self._keys = array("q", map(ordered.__getitem__, starts))
+        starts.append(len(ordered))
+        self._starts, self._offsets, self._open = starts, array("H", order), None
+
+    def firstTimestamp(self) -> int:
+        if self._source is not None:
+            return _Segment._TIMESTAMP.unpack_from(self._source, 0)[0]
+        return self.timestamps[0]
+
+    def lastTimestamp(self) -> int:
+        if self._source is not None:
+            return _Segment._TIMESTAMP.unpack_from(self._source, len(self._source) - Ledger._RECORD.size)[0]
+        return self.timestamps[-1]
+
+    _TIMESTAMP = struct.Struct("<q")
+
+    def add(self, ts, num, kind, amount, counterparty, balance):
+        offsets = self._open.get(num)
+        if offsets is None:
+            offsets = self._open[num] = array("H")
+        offsets.append(len(self.timestamps))
+        self.timestamps.append(ts)
+        self.accounts.append(num)
+        self.kinds.append(kind)
+        self.amounts.append(amount)
+        self.counterparties.append(counterparty)
+        self.balances.append(balance)
+
+    def addMany(self, ts, kind, accounts, amounts, balances):
+        """Bulk add (no counterparty); the caller makes sure they fit in the segment."""
+        n = len(accounts)
+        index = self._open
+        for offset, num in enumerate(accounts, len(self.timestamps)):
+            offsets = index.get(num)
+            if offsets is None:
+                offsets = index[num] = array("H")
+            offsets.append(offset)
+        self.timestamps.extend(array("q", [ts]) * n)
+        self.accounts.extend(accounts)
+        self.kinds.extend(array("B", [kind]) * n)
+        self.amounts.extend(amounts)
+        self.counterparties.extend(array("q", [0]) * n)
+        self.balances.extend(balances)
+
+    def seal(self):
+        keys, starts, offsets = array("q"), array("I"), array("H")
+        for num in sorted(self._open):
+            keys.append(num)
+            starts.append(len(offsets))
+            offsets.extend(self._open[num])
+        starts.append(len(offsets))
+        self._keys, self._starts, self._offsets = keys, starts, offsets
+        self._open = None
+
+    def offsetsFor(self, num: int):
+        """Offsets of num's entries in this segment, oldest first."""
+        if self._open is not None:
+            return self._open.get(num, ())
+        i = bisect_left(self._keys, num)
+        if i == len(self._keys) or self._keys[i] != num:
+            return ()
+        return self._offsets[self._starts[i]:self._starts[i + 1]]
+
+
+class Ledger:
+    """
+    Append-only history of every balance change: deposits, withdrawals, both
+    legs of each transfer, coin deposits, ATM dispenses, interest credits,
+    monthly fees and manual adjustments.
+
+    Entries live in fixed-size columnar segments and are never modified.
+    Timestamps never go backwards, so each segment covers one time span, and
+    each segment indexes its entries by account. A statement for a date range
+    binary-searches the segments that overlap it and reads only that
+    account's entries from them, without touching the rest of the history.
+
+    With a path, entries are also appended to that file (fixed-size records)
+    and reloaded on startup; the file is flushed by flush()/close(). Startup
+    maps the file and reads only the last segment: the others are read the
+    first time a statement reaches them, so startup does not grow with the
+    history.
+
+    An entry may carry the position of the journal record that caused it (see
+    Journal.append). After a crash the journal can hold changes whose entries
+    never reached the file, or the file entries whose records never reached
+    the journal. With recoverFrom (the journal offset replay starts at), the
+    ledger reconciles itself while the journal is replayed into it: append()
+    skips entries the file already has for a replayed record, adds the missing
+    ones (stamped with the time of the recovery), and endRecovery() drops the
+    entries no replayed record accounts for. checkpoint() notes how many
+    entries the file held at a journal position, so recovering from that
+    position reads only the entries written after them.
+    """
+
+    DEPOSIT, WITHDRAWAL, TRANSFER_OUT, TRANSFER_IN, COINS, ATM, INTEREST, ADJUSTMENT, FEE = range(1, 10)
+    KIND_NAMES = {DEPOSIT: "Deposit", WITHDRAWAL: "Withdrawal", TRANSFER_OUT: "Transfer out",
+                  TRANSFER_IN: "Transfer in", COINS: "Coin deposit", ATM: "ATM withdrawal",
+                  INTEREST: "Interest", ADJUSTMENT: "Adjustment", FEE: "Monthly fee"}
+
+    SEGMENT_SIZE = 1 << 16
+    # timestamp, account, amount, counterparty, balance, kind | journal position << 8 (0 = none;
+    # files from before positions have zero padding there)
+    _RECORD = struct.Struct("<qqqqqq")
+    _MARK = struct.Struct("<qq")    # entries in the file, journal position they cover (path + ".mark")
+
+    def __init__(self, path: str | None = None, recoverFrom: int | None = None):
+        self._segments = [_Segment()]
+        self._count = 0
+        self._lastTimestamp = 0
+        self._lock = threading.Lock()
+        self._path = path
+        self._file = None
+        self._recovering = None    # (journal position, account) -> entries in the file, while recovering
+        self._floor = 0            # records at or before this position need no recovery
+        self._recoverStart = 0     # entries before this one were not read for recovery
+        self._map = None           # the ledger file as loaded, which mapped segments read from
+        if path is not None:
+            if os.path.exists(path):
+                self._load(path, recoverFrom)
+            elif recoverFrom is not None:
+                self._recovering, self._floor = {}, recoverFrom
+            self._file = open(path, "ab")
+
+    # ---------- Loading ----------
+    def _load(self, path: str, recoverFrom: int | None = None):
+        size, span = Ledger._RECORD.size, Ledger.SEGMENT_SIZE * Ledger._RECORD.size
+        with open(path, "r+b") as f:
+            whole = os.fstat(f.fileno()).st_size // size * size
+            f.truncate(whole)      # a torn record from a crash mid-write
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if whole else None
+        records = memoryview(self._map) if whole else memoryview(b"")
+        count = whole // size
+        # Every segment but the last is full; the last is read now, as appends go into it
+        tail = (count - 1) // Ledger.SEGMENT_SIZE * span if count else 0
+        self._segments = [_Segment.mapped(records[i:i + span]) for i in range(0, tail, span)]
+        last = _Segment.mapped(records[tail:whole])
+        last.load(seal=False)
+        self._segments.append(last)
+        self._count = count
+        self._lastTimestamp = last.timestamps[-1] if count else 0
+        if recoverFrom is not None:
+            self._startRecovery(path, records, recoverFrom)
+
+    def _startRecovery(self, path: str, records: memoryview, recoverFrom: int):
+        """Count the file's entries of records after recoverFrom: (position, account) -> entries."""
+        start = 0
+        if os.path.exists(path + ".mark"):
+            with open(path + ".mark", "rb") as f:
+                marked, position = Ledger._MARK.unpack(f.read(Ledger._MARK.size))
+            if position == recoverFrom and marked <= self._count:
+                start = marked    # every entry before these is of a record at or before recoverFrom
+        fields = records.cast("q")
+        accounts, words = array("q"), array("q")
+        accounts.frombytes(fields[start * 6 + 1::6].tobytes())
+        words.frombytes(fields[start * 6 + 5::6].tobytes())
+        if sys.byteorder == "big":
+            accounts.byteswap()
+            words.byteswap()
+        threshold = (recoverFrom + 1) << 8       # word of the first position after recoverFrom
+        found, first = {}, None
+        for num, word in zip(accounts, words):
+            if word >= threshold:
+                key = (word >> 8, num)
+                found[key] = found.get(key, 0) + 1
+                if first is None or key[0] < first:
+                    first = key[0]
+        self._recovering, self._floor, self._recoverStart = found, recoverFrom, start
+        if not start and min(words, default=256) < 256:
+            # Entries written before positions existed cover the records before the first one that has one
+            self._floor = first - 1 if first is not None else float("inf")
+
+    def _recorded(self, position: int, account: int) -> bool:
+        """While recovering, whether the file already has this entry (each one answers once)."""
+        if position <= self._floor:
+            return True
+        key = (position, account)
+        n = self._recovering.get(key)
+        if not n:
+            return False
+        if n == 1:
+            del self._recovering[key]
+        else:
+            self._recovering[key] = n - 1
+        return True
+
+    def endRecovery(self):
+        """
+        Finish reconciling with the journal: drop the file's entries that no
+        replayed record accounted for (their records never became durable).
+        """
+        with self._lock:
+            orphans, self._recovering = self._recovering, None
+            if not orphans:
+                return
+            self._file.close()
+            size = Ledger._RECORD.size
+            with open(self._path, "rb") as f:
+                data = f.read()
+            # Only entries from where recovery started reading can be orphans
+            start = self._recoverStart * size
+            keep = bytearray(data[:start])
+            for i, (_, num, _, _, _, word) in enumerate(Ledger._RECORD.iter_unpack(memoryview(data)[start:])):
+                i += self._recoverStart
+                key = (word >> 8, num)
+                if orphans.get(key):
+                    orphans[key] -= 1
+                else:
+                    keep += data[i * size:(i + 1) * size]
+            tmp = self._path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(keep)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self._path)
+            self._load(self._path)
+            self._file = open(self._path, "ab")
+
+    # ---------- Appending ----------
+    def _add(self, ts, num, kind, amount, counterparty, balance):
+        seg = self._segments[-1]
+        if len(seg.timestamps) == Ledger.SEGMENT_SIZE:
+            seg.seal()
+            seg = _Segment()
+            self._segments.append(seg)
+        seg.add(ts, num, kind, amount, counterparty, balance)
+        self._count += 1
+        if ts > self._lastTimestamp:
+            self._lastTimestamp = ts
+
+    def append(self, account: int, kind: int, amountInCents: int, counterparty: int, balanceInCents: int,
+               timestamp: int | None = None, position: int = 0):
+        """
+        Record one entry. timestamp (microseconds) defaults to now; it is clamped so time never runs backwards.
+        position is that of the journal record behind the entry.
+        """
+        with self._lock:
+            if self._recovering is not None and self._recorded(position, account):
+                return
+            ts = time.time_ns() // 1000 if timestamp is None else int(timestamp)
+            ts = max(ts, self._lastTimestamp)
+            self._add(ts, account, kind, amountInCents, counterparty, balanceInCents)
+            if self._file is not None:
+                self._file.write(Ledger._RECORD.pack(ts, account, amountInCents, counterparty, balanceInCents,
+                                                     kind | position << 8))
+
+    def appendMany(self, kind: int, accounts: array, amounts: array, balances: array,
+                   timestamp: int | None = None, position: int = 0):
+        """
+        Record one entry of `kind` per account at one time, e.g. interest.
+        accounts, amounts and balances are parallel int64 arrays; no counterparty.
+        """
+        with self._lock:
+            if self._recovering is not None:
+                missing = [i for i, num in enumerate(accounts) if not self._recorded(position, num)]
+                if len(missing) < len(accounts):
+                    accounts = array("q", (accounts[i] for i in missing))
+                    amounts = array("q", (amounts[i] for i in missing))
+                    balances = array("q", (balances[i] for i in missing))
+            ts = max(time.time_ns() // 1000 if timestamp is None else int(timestamp), self._lastTimestamp)
+            i = 0
+            while i < len(accounts):
+                seg = self._segments[-1]
+                room = Ledger.SEGMENT_SIZE - len(seg.timestamps)
+                if room == 0:
+                    seg.seal()
+                    seg = _Segment()
+                    self._segments.append(seg)
+                    room = Ledger.SEGMENT_SIZE
+                j = min(len(accounts), i + room)
+                seg.addMany(ts, kind, accounts[i:j], amounts[i:j], balances[i:j])
+                i = j
+            self._count += len(accounts)
+            self._lastTimestamp = ts
+            if self._file is not None:
+                pack, word = Ledger._RECORD.pack, kind | position << 8
+                self._file.write(b"".join(pack(ts, num, amount, 0, bal, word)
+                                          for num, amount, bal in zip(accounts, amounts, balances)))
+
+    def flush(self):
+        """Write buffered entries to the ledger file and fsync it."""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+    def checkpoint(self, position: int):
+        """
+        flush(), then record that every entry so far is of a journal record at or
+        before `position` (caller makes sure no append is running), so recovering
+        from that position reads only the entries after them.
+        """
+        self.flush()
+        if self._path is None:
+            return
+        with self._lock:
+            mark = Ledger._MARK.pack(self._count, position)
+        tmp = self._path + ".mark.tmp"
+        with open(tmp, "wb") as f:
+            f.write(mark)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._path + ".mark")
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # ---------- Queries ----------
+    def __len__(self) -> int:
+        return self._count
+
+    def statement(self, account: int, start: int | None = None, end: int | None = None,
+                  limit: int | None = None) -> list:
+        """
+        Entries of `account` with start <= timestamp < end (microseconds; None = unbounded),
+        oldest first, at most `limit` of them. Each entry is a tuple
+        (timestamp, kind, amountInCents, counterparty, balanceInCents).
+        """
+        out = []
+        with self._lock:
+            if not self._count:
+                return out
+            segments = self._segments
+            # First segment whose last entry is not before start (segments are never empty here)
+            i = 0 if start is None else bisect_left(segments, start, key=_Segment.lastTimestamp)
+            for seg in segments[i:]:
+                if end is not None and seg.firstTimestamp() >= end:
+                    break
+                seg.load()
+                timestamps = seg.timestamps
+                offsets = seg.offsetsFor(account)
+                if not offsets:
+                    continue
+                key = timestamps.__getitem__
+                lo = 0 if start is None or timestamps[0] >= start else bisect_left(offsets, start, key=key)
+                hi = len(offsets) if end is None or timestamps[-1] < end else bisect_left(offsets, end, lo, key=key)
+                for j in offsets[lo:hi]:
+                    out.append((timestamps[j], seg.kinds[j], seg.amounts[j], seg.counterparties[j], seg.balances[j]))
+                    if limit is not None and len(out) >= limit:
+                        return out
+        return out
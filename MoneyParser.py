@@ -0,0 +1,73 @@
+import re
+from array import array
+
+class MoneyParser:
+    """
+    Parses dollar amounts typed by people or read from files, such as "12.50",
+    "$1,234.567" or "-$3", straight into integer cents -- no float, no Decimal.
+
+    An amount is an optional sign and "$" (in either order), digits with
+    optional thousands separators (which must group by three), and an optional
+    fraction. Fractions beyond the cent are rounded half-up (away from zero),
+    exactly as BankUtility.convertFromDollarsToCents rounds them, so
+    "19.995" -> 2000 and "-0.005" -> -1. Surrounding whitespace is ignored;
+    anything else (exponents, "inf", a second decimal point) is invalid.
+    """
+
+    _AMOUNT = re.compile(r"\s*([+-]?)\s*\$?\s*([+-]?)([0-9]{1,3}(?:,[0-9]{3})+|[0-9]*)(?:\.([0-9]{0,2})([0-9]*))?\s*")
+    _PAD = ("00", "0", "")
+
+    @staticmethod
+    def _parse(text: str) -> int | None:
+        # Plain "123" / "123.45" need no regex
+        whole, _, frac = text.partition(".")
+        if whole.isdigit() and len(frac) <= 2 and whole.isascii() and (not frac or frac.isdigit() and frac.isascii()):
+            return int(whole + frac + MoneyParser._PAD[len(frac)])
+        m = MoneyParser._AMOUNT.fullmatch(text)
+        if m is None:
+            return None
+        sign, sign2, whole, frac, rest = m.groups("")
+        if sign and sign2 or not (whole or frac):
+            return None
+        cents = int(whole.replace(",", "") + frac + MoneyParser._PAD[len(frac)])
+        # Half-up: the first digit past the cent decides
+        if rest and rest[0] >= "5":
+            cents += 1
+        return -cents if "-" in (sign, sign2) else cents
+
+    @staticmethod
+    def parseCents(text: str) -> int:
+        """Amount in cents of a dollar string. Raises ValueError if text is not an amount."""
+        cents = MoneyParser._parse(text)
+        if cents is None:
+            raise ValueError(f"Invalid amount: {text!r}")
+        return cents
+
+    @staticmethod
+    def parseMany(amounts, invalid: int | None = None) -> array:
+        """
+        Parse each string of an iterable (e.g. a column of a batch file); returns an
+        array of cents. Invalid amounts, and amounts too large for the array's 64
+        bits, are stored as `invalid`, or, by default, raise ValueError listing
+        their positions.
+        """
+        cents = array("q")
+        append = cents.append
+        parse = MoneyParser._parse
+        bad = []
+        for i, text in enumerate(amounts):
+            value = parse(text)
+            if value is not None:
+                try:
+                    append(value)
+                    continue
+                except OverflowError:
+                    pass
+            if invalid is None:
+                bad.append(i)
+                continue
+            append(invalid)
+        if bad:
+            shown = ", ".join(str(i) for i in bad[:10]) + (", ..." if len(bad) > 10 else "")
+            raise ValueError(f"Invalid amounts: {len(bad)} at position(s) {shown}")
+        return cents
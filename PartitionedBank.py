@@ -0,0 +1,564 @@
+import json
+import multiprocessing
+import os
+import secrets
+import threading
+
+from Account import Account
+from AccountNumberAllocator import AccountNumberAllocator
+from AccountStore import AccountStore
+from Bank import Bank
+from Journal import Journal
+from Ledger import Ledger
+
+
+class PartitionUnavailable(RuntimeError):
+    """A partition's worker process died during a request; it is restarted (and recovered) on next use."""
+
+
+class _Partition:
+    """
+    Worker-process side of one partition: a Bank plus the participant half of
+    two-phase commit.
+
+    A cross-partition transfer touches each partition as one leg: a debit of
+    the source account or a credit of the destination. prepare() records the
+    leg in the participant log (fsync'd) before voting yes; a debit is taken
+    from the account right away, so the money cannot be spent twice, while a
+    credit waits for commit(). Each leg's balance change carries an idempotency
+    key derived from the transaction id, so a leg redone during recovery is
+    applied once. Accounts with a leg in doubt cannot be closed.
+
+    Once a leg is acknowledged the coordinator forgets it, and a leg found in
+    doubt after a restart is then aborted. Only a committed debit would come
+    to harm (its money would be refunded), so only its end record is fsync'd
+    before the acknowledgement; a lost end record of any other leg just
+    repeats a step that is a no-op under its key.
+    """
+
+    def __init__(self, directory: str, index: int, shards: int, maxAccounts: int, syncEvery: int):
+        base = os.path.join(directory, f"partition-{index}")
+        self.bank = Bank(base + ".journal", syncEvery, shards=shards)
+        self.bank.MAX_ACCOUNTS = maxAccounts
+        self._syncEvery = syncEvery
+        self._prepared = {}      # transaction id -> (account, cents: < 0 debit, > 0 credit)
+        self._busy = {}          # account -> legs in doubt
+        self._crashAt = None
+        logPath = base + ".2pc"
+        Journal.replay(logPath, self._applyRecord)
+        # Only the legs still in doubt need to survive this start
+        tmp = logPath + ".tmp"
+        with open(tmp, "w") as f:
+            for tx, (num, cents) in self._prepared.items():
+                f.write(json.dumps(["P", tx, num, cents], separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, logPath)
+        self._log = Journal(logPath, syncEvery=0)    # synced where a reply depends on it
+
+    def _applyRecord(self, record: list):
+        if record[0] == "P":
+            self._track(record[1], record[2], record[3])
+        else:
+            self._untrack(record[1])
+
+    def _track(self, tx: str, num: int, cents: int):
+        self._prepared[tx] = (num, cents)
+        self._busy[num] = self._busy.get(num, 0) + 1
+
+    def _untrack(self, tx: str):
+        num, _ = self._prepared.pop(tx)
+        if self._busy[num] == 1:
+            del self._busy[num]
+        else:
+            self._busy[num] -= 1
+
+    def _end(self, tx: str):
+        self._log.append(["E", tx])
+        self._untrack(tx)
+
+    def _durable(self):
+        # A vote or an acknowledgement promises that the balance change is on disk
+        # (the ledger is history, not money, and is left to its usual flushes)
+        if not self._syncEvery:
+            self.bank._journal.sync()
+
+    def _crash(self, point: str):
+        if self._crashAt == point:
+            os._exit(70)
+
+    @staticmethod
+    def _key(tx: str, leg: str) -> str:
+        return f"2pc:{tx}:{leg}"
+
+    # ---------- Two-phase commit (participant) ----------
+    def prepare(self, tx: str, num: int, cents: int) -> bool:
+        """Vote on one leg: True once it is durably prepared, False if it cannot be done."""
+        if tx in self._prepared:
+            return True
+        acct = self.bank.findAccount(num)
+        if acct is None or (cents > 0 and not AccountStore.fits(acct.getBalanceInCents() + cents)):
+            return False
+        self._log.append(["P", tx, num, cents])
+        self._log.sync()
+        self._track(tx, num, cents)
+        if cents < 0:
+            self._crash("prepare")
+            if self.bank.withdraw(num, -cents, Ledger.TRANSFER_OUT, self._key(tx, "out")) is None:
+                self._end(tx)
+                return False
+            self._durable()
+        self._crash("prepared")
+        return True
+
+    def commit(self, tx: str):
+        entry = self._prepared.get(tx)
+        if entry is None:
+            return
+        num, cents = entry
+        if cents > 0:
+            self._crash("commit")
+            self.bank.deposit(num, cents, Ledger.TRANSFER_IN, self._key(tx, "in"))
+            self._durable()
+            self._end(tx)
+            return
+        self._end(tx)
+        self._log.sync()
+
+    def abort(self, tx: str):
+        entry = self._prepared.get(tx)
+        if entry is None:
+            return
+        num, cents = entry
+        if cents < 0:
+            # After a crash the debit may never have happened: take it now (a no-op
+            # under its key if it did) so that the refund always undoes exactly it
+            if self.bank.withdraw(num, -cents, Ledger.TRANSFER_OUT, self._key(tx, "out")) is not None:
+                self.bank.deposit(num, -cents, Ledger.TRANSFER_IN, self._key(tx, "back"))
+                self._durable()
+        self._end(tx)
+
+    def inDoubt(self) -> list:
+        """Transaction ids prepared here and not yet committed or aborted."""
+        return list(self._prepared)
+
+    def arm(self, point: str | None):
+        """Fault injection: exit abruptly on reaching `point` (see PartitionedBank.CRASH_POINTS)."""
+        self._crashAt = point
+
+    # ---------- Accounts ----------
+    def openAccount(self, num: int, first: str, last: str, ssn9: str) -> str | None:
+        """Open account num; returns its PIN, or None if the partition is full or num is taken."""
+        bank = self.bank
+        if bank.isFull():
+            return None
+        a = Account()
+        a.setAccountNumber(num)
+        a.setOwnerFirstName(first)
+        a.setOwnerLastName(last)
+        a.setOwnerSSN(ssn9)
+        pin = bank.generateRandomPIN()
+        a.setPIN(pin)
+        return pin if bank.addAccountToBank(a) else None
+
+    def addAccount(self, num: int, first: str, last: str, ssn: str, pin: str, cents: int) -> bool:
+        a = Account()
+        a.setAccountNumber(num)
+        a.setOwnerFirstName(first)
+        a.setOwnerLastName(last)
+        a.setOwnerSSN(ssn)
+        a.setPIN(pin)
+        a.setBalanceInCents(cents)
+        return self.bank.addAccountToBank(a)
+
+    def account(self, num: int) -> tuple | None:
+        """(first name, last name, SSN, balance) of num, or None."""
+        acct = self.bank.findAccount(num)
+        if acct is None:
+            return None
+        return acct.getOwnerFirstName(), acct.getOwnerLastName(), acct.getOwnerSSN(), acct.getBalanceInCents()
+
+    def closeAccount(self, num: int) -> bool:
+        if num in self._busy:
+            return False
+        return self.bank.removeAccountFromBank(num)
+
+    def countAccounts(self) -> int:
+        return self.bank.countAccounts()
+
+    def totalCents(self) -> int:
+        return self.bank.getReport()["totalCents"]
+
+    # Single-account requests the router passes straight to the Bank
+    _BANK_CALLS = frozenset(("deposit", "withdraw", "transfer", "checkPIN", "isLocked", "unlockAccount",
+                             "getStatement", "getAccountClass", "setAccountClass"))
+
+    def call(self, method: str, args: tuple):
+        if method not in _Partition._BANK_CALLS:
+            raise ValueError(f"Not a partition request: {method!r}")
+        return getattr(self.bank, method)(*args)
+
+    def close(self):
+        self._log.close()
+        self.bank.close()
+
+
+def _serve(conn, directory: str, index: int, options: dict):
+    """Worker process main loop: answer (method, args) requests until told to close."""
+    try:
+        partition = _Partition(directory, index, **options)
+    except Exception as e:
+        conn.send((False, e))
+        return
+    conn.send((True, None))
+    while True:
+        try:
+            method, args = conn.recv()
+        except (EOFError, OSError):
+            # The coordinator is gone
+            partition.close()
+            return
+        try:
+            result = getattr(partition, method)(*args)
+        except Exception as e:
+            conn.send((False, e))
+            continue
+        conn.send((True, result))
+        if method == "close":
+            return
+
+
+class PartitionedBank:
+    """
+    Many Banks behind one router: partition i runs in its own worker process
+    and owns the i-th of `partitions` equal account-number ranges (the same
+    split as AccountStore shards), with its own journal in `directory`. Account
+    lookups and single-account operations go to the owning partition; so do
+    transfers between two accounts of one partition.
+
+    A transfer between partitions is a two-phase commit, coordinated here:
+    both partitions prepare their leg (the source takes the money out), and
+    only if both vote yes is the commit decision written, and fsync'd, to the
+    coordinator log before it is sent to them. Without a commit record the
+    transfer is aborted (presumed abort) and the source gets its money back.
+    A worker that dies mid-transfer is restarted on the next request for its
+    partition; it replays its journal, and every leg it still has in doubt is
+    then committed or aborted as the coordinator log says. A coordinator
+    started on an existing directory does the same for every partition. So a
+    crash at any point moves the money exactly once or not at all.
+
+    Requests to one partition are served one at a time over a pipe; requests
+    to different partitions run in parallel, so use several threads.
+
+        with PartitionedBank("bankdata", partitions=8) as bank:
+            acct = bank.openAccount("Ada", "Lovelace", "123456789")
+            bank.deposit(acct.getAccountNumber(), 10000)
+            bank.transfer(acct.getAccountNumber(), other, 2500)
+    """
+
+    # Where a worker can be told to crash: before or after taking the source's
+    # money (after recording its vote), and before crediting the destination
+    CRASH_POINTS = ("prepare", "prepared", "commit")
+
+    def __init__(self, directory: str, partitions: int = 4, shards: int = 1,
+                 maxAccountsPerPartition: int = Bank.MAX_ACCOUNTS, syncEvery: int = 1, context=None):
+        """
+        shards and syncEvery are passed to each partition's Bank. The partition
+        count is saved in the directory; reopening it with another count is an
+        error, as accounts would be looked for in the wrong partition.
+        """
+        os.makedirs(directory, exist_ok=True)
+        layoutPath = os.path.join(directory, "partitions.json")
+        if os.path.exists(layoutPath):
+            with open(layoutPath) as f:
+                saved = json.load(f)["partitions"]
+            if saved != partitions:
+                raise ValueError(f"{directory} holds {saved} partitions, not {partitions}.")
+        else:
+            with open(layoutPath, "w") as f:
+                json.dump({"partitions": partitions}, f)
+        self._directory = directory
+        self._options = {"shards": shards, "maxAccounts": maxAccountsPerPartition, "syncEvery": syncEvery}
+        # Spawned, not forked: workers are restarted while other threads hold locks
+        self._context = context or multiprocessing.get_context("spawn")
+        self._workers = [None] * partitions     # (process, connection) while running
+        self._locks = [threading.Lock() for _ in range(partitions)]
+        self._allocator = AccountNumberAllocator(os.path.join(directory, "coordinator.alloc"))
+
+        # Decisions of transactions in progress: id -> True (commit) or False (abort)
+        self._decisions = {}
+        self._decisionLock = threading.Lock()
+        self._log = None
+        logPath = os.path.join(directory, "coordinator.journal")
+        Journal.replay(logPath, self._applyRecord)
+        try:
+            for p in range(partitions):
+                with self._locks[p]:
+                    self._start(p)
+            # Every partition has settled its legs, so no decision is needed any more
+            self._decisions.clear()
+            open(logPath, "wb").close()
+            self._log = Journal(logPath, syncEvery=0)
+        except BaseException:
+            self.close()
+            raise
+
+    def _applyRecord(self, record: list):
+        # Commit records only: every other outcome is presumed to be an abort
+        self._decisions[record[1]] = True
+
+    # ---------- Workers ----------
+    def partitionCount(self) -> int:
+        return len(self._workers)
+
+    def partitionOf(self, accountNumber: int) -> int:
+        """The partition that owns accountNumber."""
+        return AccountStore.shardIndex(int(accountNumber), len(self._workers))
+
+    def _start(self, p: int):
+        # Caller holds partition p's lock
+        ours, theirs = self._context.Pipe()
+        process = self._context.Process(target=_serve, args=(theirs, self._directory, p, self._options),
+                                        name=f"partition-{p}", daemon=True)
+        process.start()
+        theirs.close()
+        ok, error = ours.recv()
+        if not ok:
+            process.join()
+            raise error
+        self._workers[p] = (process, ours)
+        # Settle whatever the last worker left in doubt before anything else reaches it
+        for tx in self._request(p, "inDoubt"):
+            self._request(p, "commit" if self._decide(tx, False) else "abort", tx)
+
+    def _request(self, p: int, method: str, *args):
+        # Caller holds partition p's lock
+        conn = self._workers[p][1]
+        try:
+            conn.send((method, args))
+            ok, result = conn.recv()
+        except (EOFError, OSError):
+            self._stopped(p)
+            raise PartitionUnavailable(f"Partition {p} stopped while serving {method}.") from None
+        if not ok:
+            raise result
+        return result
+
+    def _stopped(self, p: int):
+        process, conn = self._workers[p]
+        self._workers[p] = None
+        conn.close()
+        process.join(5)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def _call(self, p: int, method: str, *args):
+        with self._locks[p]:
+            if self._workers[p] is None:
+                self._start(p)
+            return self._request(p, method, *args)
+
+    def _callBoth(self, a: int, b: int, requests: tuple) -> list:
+        """
+        Send ((method, args) for a, (method, args) for b) at once and wait for
+        both. Returns their results, with PartitionUnavailable in place of a
+        result that was lost.
+        """
+        pair = ((a, requests[0]), (b, requests[1]))
+        first, second = self._locks[min(a, b)], self._locks[max(a, b)]
+        with first, second:
+            results = [None, None]
+            for i, (p, (method, args)) in enumerate(pair):
+                try:
+                    if self._workers[p] is None:
+                        self._start(p)
+                    self._workers[p][1].send((method, args))
+                except Exception as e:
+                    if self._workers[p] is not None:
+                        self._stopped(p)
+                    results[i] = e if isinstance(e, PartitionUnavailable) else \
+                        PartitionUnavailable(f"Partition {p} could not take {method}: {e}")
+            for i, (p, (method, _)) in enumerate(pair):
+                if results[i] is not None:
+                    continue
+                try:
+                    results[i] = self._workers[p][1].recv()[1]
+                except (EOFError, OSError):
+                    self._stopped(p)
+                    results[i] = PartitionUnavailable(f"Partition {p} stopped while serving {method}.")
+            return results
+
+    def close(self):
+        """Stop every worker (each closes its Bank cleanly)."""
+        for p in range(len(self._workers)):
+            with self._locks[p]:
+                if self._workers[p] is None:
+                    continue
+                try:
+                    self._request(p, "close")
+                except PartitionUnavailable:
+                    continue
+                self._stopped(p)
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def crashPartition(self, p: int, at: str):
+        """Fault injection: make partition p's worker exit abruptly on reaching `at` (one of CRASH_POINTS)."""
+        if at not in PartitionedBank.CRASH_POINTS:
+            raise ValueError(f"at must be one of {PartitionedBank.CRASH_POINTS}.")
+        self._call(p, "arm", at)
+
+    def killPartition(self, p: int):
+        """Fault injection: kill partition p's worker now, whatever it is doing."""
+        worker = self._workers[p]
+        if worker is not None:
+            worker[0].kill()
+
+    # ---------- Two-phase commit (coordinator) ----------
+    def _decide(self, tx: str, commit: bool) -> bool:
+        """
+        Record the outcome of tx, unless one already was: a recovering partition
+        may abort a transaction before the thread running it decides, and both
+        must then agree. A commit is on disk before anyone hears of it.
+        """
+        with self._decisionLock:
+            decided = self._decisions.get(tx)
+            if decided is None:
+                if commit:
+                    self._log.append(["C", tx])
+                self._decisions[tx] = decided = commit
+        if decided and self._log is not None:
+            # Outside the lock, so that concurrent commits share one fsync (whoever
+            # saw the decision first); while starting up, decisions come from disk
+            self._log.sync()
+        return decided
+
+    def _transferAcross(self, src: int, a: int, dst: int, b: int, cents: int) -> bool:
+        tx = secrets.token_hex(8)
+        votes = self._callBoth(a, b, (("prepare", (tx, src, -cents)), ("prepare", (tx, dst, cents))))
+        commit = self._decide(tx, all(vote is True for vote in votes))
+        method = "commit" if commit else "abort"
+        acks = self._callBoth(a, b, ((method, (tx,)), (method, (tx,))))
+        # A partition that missed a commit settles it from the decision when it restarts
+        if not commit or not any(isinstance(ack, Exception) for ack in acks):
+            with self._decisionLock:
+                del self._decisions[tx]
+        return commit
+
+    # ---------- Accounts ----------
+    def openAccount(self, first: str, last: str, ssn9: str) -> Account:
+        """
+        Open an account in whichever partition owns the next allocated number.
+        Returns a detached Account holding the number and the new PIN.
+        """
+        for _ in range(100):
+            num = self._allocator.next()
+            pin = self._call(self.partitionOf(num), "openAccount", num, first, last, ssn9)
+            if pin is not None:
+                a = Account()
+                a.setAccountNumber(num)
+                a.setOwnerFirstName(first)
+                a.setOwnerLastName(last)
+                a.setOwnerSSN(ssn9)
+                a.setPIN(pin)
+                return a
+            if self.isFull():
+                break
+        raise RuntimeError("Every partition is full; cannot open another account.")
+
+    def addAccountToBank(self, account: Account) -> bool:
+        """Add a detached Account to its number's partition. False if that partition is full or has the number."""
+        num = account.getAccountNumber()
+        if num is None:
+            raise ValueError("Account must have an account number before adding to bank.")
+        return self._call(self.partitionOf(num), "addAccount", num, account.getOwnerFirstName(),
+                          account.getOwnerLastName(), account.getOwnerSSN(), account.getPIN(),
+                          account.getBalanceInCents())
+
+    def findAccount(self, accountNumber: int) -> Account | None:
+        """A detached copy of the account as it is now, or None (changes go through this router)."""
+        num = int(accountNumber)
+        found = self._call(self.partitionOf(num), "account", num)
+        if found is None:
+            return None
+        a = Account()
+        a.setAccountNumber(num)
+        a.setOwnerFirstName(found[0])
+        a.setOwnerLastName(found[1])
+        a.setOwnerSSN(found[2])
+        a.setBalanceInCents(found[3])
+        return a
+
+    def getBalance(self, accountNumber: int) -> int | None:
+        found = self._call(self.partitionOf(accountNumber), "account", int(accountNumber))
+        return None if found is None else found[3]
+
+    def removeAccountFromBank(self, accountNumber: int) -> bool:
+        """Close an account. False if not found, or if a transfer involving it is still being settled."""
+        return self._call(self.partitionOf(accountNumber), "closeAccount", int(accountNumber))
+
+    def countAccounts(self) -> int:
+        return sum(self._call(p, "countAccounts") for p in range(len(self._workers)))
+
+    def isFull(self) -> bool:
+        return self.countAccounts() >= len(self._workers) * self._options["maxAccounts"]
+
+    def totalCents(self) -> int:
+        """Sum of every balance; money in a transfer still being settled is in neither account."""
+        return sum(self._call(p, "totalCents") for p in range(len(self._workers)))
+
+    # ---------- Single-account operations (see Bank) ----------
+    def _route(self, accountNumber: int, method: str, *args):
+        return self._call(self.partitionOf(accountNumber), "call", method, args)
+
+    def checkPIN(self, accountNumber: int, pin: str) -> bool:
+        return self._route(accountNumber, "checkPIN", int(accountNumber), pin)
+
+    def isLocked(self, accountNumber: int) -> bool:
+        return self._route(accountNumber, "isLocked", int(accountNumber))
+
+    def unlockAccount(self, accountNumber: int):
+        self._route(accountNumber, "unlockAccount", int(accountNumber))
+
+    def deposit(self, accountNumber: int, amountInCents: int, kind: int = Ledger.DEPOSIT,
+                idempotencyKey: str | None = None) -> int | None:
+        return self._route(accountNumber, "deposit", int(accountNumber), int(amountInCents), kind, idempotencyKey)
+
+    def withdraw(self, accountNumber: int, amountInCents: int, kind: int = Ledger.WITHDRAWAL,
+                 idempotencyKey: str | None = None) -> int | None:
+        return self._route(accountNumber, "withdraw", int(accountNumber), int(amountInCents), kind, idempotencyKey)
+
+    def getStatement(self, accountNumber: int, start: float | None = None, end: float | None = None,
+                     limit: int | None = None) -> list:
+        return self._route(accountNumber, "getStatement", int(accountNumber), start, end, limit)
+
+    def getAccountClass(self, accountNumber: int) -> int:
+        return self._route(accountNumber, "getAccountClass", int(accountNumber))
+
+    def setAccountClass(self, accountNumber: int, accountClass: int):
+        self._route(accountNumber, "setAccountClass", int(accountNumber), accountClass)
+
+    def transfer(self, fromAccountNumber: int, toAccountNumber: int, amountInCents: int) -> bool:
+        """
+        Move amountInCents between two accounts. Returns False if either account
+        is missing, they are the same account, or the source has insufficient
+        funds -- or if a partition failed before the transfer was committed, in
+        which case nothing moved. A committed transfer returns True even if a
+        partition fails while applying it; that partition finishes it on restart.
+        Unlike Bank.transfer this takes no idempotency key.
+        """
+        src, dst, cents = int(fromAccountNumber), int(toAccountNumber), int(amountInCents)
+        if src == dst or cents <= 0:
+            return False
+        a, b = self.partitionOf(src), self.partitionOf(dst)
+        if a == b:
+            return self._route(src, "transfer", src, dst, cents)
+        return self._transferAcross(src, a, dst, b, cents)
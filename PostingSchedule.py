@@ -0,0 +1,158 @@
+import argparse
+import json
+from array import array
+from bisect import bisect_right
+from decimal import Decimal
+
+from BankUtility import BankUtility
+
+# Schedule of the current pool worker, set by PostingSchedule.attach()
+_worker = None
+
+
+class AccountClass:
+    """
+    How one class of account is priced at month end.
+
+    rates is a list of (fromCents, apr) bands, lowest first, the first from 0.
+    Banded (the default): the whole balance earns the APR of the highest band it
+    reaches. Tiered: each slice of the balance earns its own band's APR, and the
+    sum is rounded once. Either way interest is APR/12 rounded half-up to the
+    cent, exactly as applyMonthlyInterest rounds it.
+
+    Balances below minimumBalanceCents earn no interest. Balances below
+    feeWaiverCents pay monthlyFeeCents, but never more than the account holds,
+    so posting does not overdraw it.
+    """
+
+    def __init__(self, name: str, rates=((0, "0"),), tiered: bool = False, monthlyFeeCents: int = 0,
+                 feeWaiverCents: int = 0, minimumBalanceCents: int = 0):
+        rates = [(int(floor), str(apr)) for floor, apr in rates]
+        if not rates or rates[0][0] != 0:
+            raise ValueError("The first rate band must start at 0 cents.")
+        if any(a[0] >= b[0] for a, b in zip(rates, rates[1:])):
+            raise ValueError("Rate bands must be in increasing order.")
+        if any(float(apr) < 0 for _, apr in rates) or monthlyFeeCents < 0:
+            raise ValueError("Rates and fees cannot be negative.")
+        self.name = name
+        self.rates = rates
+        self.tiered = bool(tiered)
+        self.monthlyFeeCents = int(monthlyFeeCents)
+        self.feeWaiverCents = int(feeWaiverCents)
+        self.minimumBalanceCents = int(minimumBalanceCents)
+        self._floors = [floor for floor, _ in rates]
+        self._monthly = [BankUtility.monthlyRateFromAPR(apr) for _, apr in rates]
+        # Tiered sums use the APRs exactly: apr == numerator * 10**_exponent
+        exponents = [Decimal(apr).as_tuple().exponent for _, apr in rates]
+        self._exponent = min(0, *exponents)
+        self._aprs = [int(Decimal(apr).scaleb(-self._exponent)) for _, apr in rates]
+
+    def interestInCents(self, balanceInCents: int) -> int:
+        if balanceInCents <= 0 or balanceInCents < self.minimumBalanceCents:
+            return 0
+        i = bisect_right(self._floors, balanceInCents) - 1
+        if not self.tiered:
+            numerator, exponent = self._monthly[i]
+            return BankUtility.monthlyInterestInCents(balanceInCents, numerator, exponent)
+        # Exact interest of every slice (cents * APR / 1200), rounded half-up once
+        floors, exact = self._floors, 0
+        for k in range(i + 1):
+            top = balanceInCents if k == i else floors[k + 1]
+            exact += (top - floors[k]) * self._aprs[k]
+        d = 1200 * 10 ** -self._exponent
+        return (2 * exact + d) // (2 * d)
+
+    def feeInCents(self, balanceInCents: int, interestInCents: int) -> int:
+        if balanceInCents >= self.feeWaiverCents:
+            return 0
+        return max(0, min(self.monthlyFeeCents, balanceInCents + interestInCents))
+
+    def toDict(self) -> dict:
+        return {"name": self.name, "rates": self.rates, "tiered": self.tiered,
+                "monthlyFeeCents": self.monthlyFeeCents, "feeWaiverCents": self.feeWaiverCents,
+                "minimumBalanceCents": self.minimumBalanceCents}
+
+    @classmethod
+    def fromDict(cls, d: dict) -> "AccountClass":
+        return cls(d["name"], d.get("rates", ((0, "0"),)), d.get("tiered", False), d.get("monthlyFeeCents", 0),
+                   d.get("feeWaiverCents", 0), d.get("minimumBalanceCents", 0))
+
+
+class PostingSchedule:
+    """
+    Month-end interest and fees for every account class: {class id: AccountClass}.
+    Accounts whose class has no entry are not touched. Run it with
+    Bank.postMonthEnd(); the schedule is journaled with the run, so replay and
+    a resumed run price every account the same way.
+    """
+
+    def __init__(self, classes: dict):
+        self.classes = {int(k): v for k, v in classes.items()}
+        if any(not 0 <= k <= 255 for k in self.classes):
+            raise ValueError("Account classes must be between 0 and 255.")
+
+    @classmethod
+    def flat(cls, apr) -> "PostingSchedule":
+        """One APR for class 0 and no fees, as applyMonthlyInterest does."""
+        return cls({0: AccountClass("standard", ((0, apr),))})
+
+    def toDict(self) -> dict:
+        return {str(k): c.toDict() for k, c in sorted(self.classes.items())}
+
+    @classmethod
+    def fromDict(cls, d: dict) -> "PostingSchedule":
+        return cls({int(k): AccountClass.fromDict(c) for k, c in d.items()})
+
+    def price(self, balances: array, classes: array) -> tuple[array, array]:
+        """Interest and fee in cents for parallel balance / class arrays."""
+        interest, fees = array("q", bytes(8 * len(balances))), array("q", bytes(8 * len(balances)))
+        table = [self.classes.get(k) for k in range(256)]
+        for i, (bal, k) in enumerate(zip(balances, classes)):
+            cls = table[k]
+            if cls is None:
+                continue
+            credit = cls.interestInCents(bal)
+            interest[i] = credit
+            fees[i] = cls.feeInCents(bal, credit)
+        return interest, fees
+
+    # ---------- Worker side ----------
+    @staticmethod
+    def attach(schedule: "PostingSchedule"):
+        """Pool initializer: the schedule every price task in this worker uses."""
+        global _worker
+        _worker = schedule
+
+    @staticmethod
+    def priceChunk(task: tuple) -> tuple:
+        """(chunk, balances, classes) -> (chunk, interest, fees), using the attached schedule."""
+        chunk, balances, classes = task
+        return (chunk, *_worker.price(balances, classes))
+
+
+if __name__ == "__main__":
+    from Bank import Bank
+
+    parser = argparse.ArgumentParser(description="Post month-end interest and fees (resumes an unfinished run)")
+    parser.add_argument("run", help="run id, e.g. 2026-10; posting the same run twice does nothing")
+    parser.add_argument("--journal", required=True, help="bank journal file")
+    parser.add_argument("--snapshot", help="bank snapshot file")
+    parser.add_argument("--classes", help="JSON file of account classes, as PostingSchedule.toDict() writes")
+    parser.add_argument("--workers", type=int, default=0, help="pricing processes (0 = price in this process)")
+    parser.add_argument("--chunks", type=int, default=256, help="account-number ranges; progress is saved per range")
+    args = parser.parse_args()
+
+    schedule = None
+    if args.classes:
+        with open(args.classes) as f:
+            schedule = PostingSchedule.fromDict(json.load(f))
+    bank = Bank(args.journal, syncEvery=0, snapshotPath=args.snapshot)
+    try:
+        summary = bank.postMonthEnd(args.run, schedule, args.workers, args.chunks)
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        bank.close()
+    print(f"run {args.run}: {summary['chunks']} ranges posted, "
+          f"{summary['credited']:,} interest credits ({BankUtility.formatCents(summary['interestCents'])}), "
+          f"{summary['charged']:,} fees ({BankUtility.formatCents(summary['feeCents'])})")
@@ -0,0 +1,134 @@
+import multiprocessing
+from array import array
+from bisect import bisect_left
+from multiprocessing import shared_memory
+
+from AccountStore import AccountStore
+
+# Per-process state set up by SharedBalances.attach() in pool workers
+_worker = None
+
+
+class SharedBalances:
+    """
+    A Bank's balances copied into shared memory so a multiprocessing pool can
+    run transfers in parallel. Accounts are split into the same account-number
+    shards as AccountStore, with one multiprocessing lock per shard; a transfer
+    takes both shard locks in shard order, so it is atomic and cannot deadlock.
+
+    Each shard also keeps a logical clock. A transfer is stamped, under its
+    locks, one past the clocks of the shards it touches, so two transfers that
+    share an account are stamped in the order they ran. writeBack() replays the
+    transfers into the bank in stamp order as ordinary journaled transfers, and
+    each account sees the same sequence of changes it saw in the pool.
+
+        shared = SharedBalances(bank, shards=16)
+        with multiprocessing.Pool(4, SharedBalances.attach, (shared.handle(),)) as pool:
+            done = pool.map(SharedBalances.transferMany, chunksOfTransfers)
+        shared.writeBack(bank, done)
+        shared.close()
+    """
+
+    def __init__(self, bank, shards: int = 16, context=None):
+        ctx = context or multiprocessing.get_context()
+        numbers = array("q", sorted(bank._store.accountNumbers()))
+        balances = array("q", (bank._store.getBalance(num) for num in numbers))
+        self._count = len(numbers)
+        size = max(1, len(numbers) * numbers.itemsize)
+        self._numbersBlock = shared_memory.SharedMemory(create=True, size=size)
+        self._balancesBlock = shared_memory.SharedMemory(create=True, size=size)
+        self._numbersBlock.buf[:len(numbers) * 8] = numbers.tobytes()
+        self._balancesBlock.buf[:len(balances) * 8] = balances.tobytes()
+        self._locks = [ctx.Lock() for _ in range(max(1, shards))]
+        self._clocksBlock = shared_memory.SharedMemory(create=True, size=len(self._locks) * 8)
+        self._clocksBlock.buf[:len(self._locks) * 8] = bytes(len(self._locks) * 8)
+
+    def handle(self) -> tuple:
+        """Picklable description for SharedBalances.attach() (pass as a pool initarg)."""
+        return (self._numbersBlock.name, self._balancesBlock.name, self._clocksBlock.name,
+                self._count, self._locks)
+
+    # ---------- Worker side ----------
+    @staticmethod
+    def attach(handle: tuple):
+        """Pool initializer: map the shared blocks into this worker."""
+        global _worker
+        numbers_name, balances_name, clocks_name, count, locks = handle
+        blocks = [shared_memory.SharedMemory(name=name) for name in (numbers_name, balances_name, clocks_name)]
+        _worker = (
+            blocks,
+            blocks[0].buf[:count * 8].cast("q"),
+            blocks[1].buf[:count * 8].cast("q"),
+            blocks[2].buf[:len(locks) * 8].cast("q"),
+            locks,
+        )
+
+    @staticmethod
+    def transfer(src: int, dst: int, amountInCents: int, state=None) -> int:
+        """
+        Atomic transfer inside a worker. Returns its stamp (always positive), or
+        0 if an account is missing or funds are short.
+        """
+        _, numbers, balances, clocks, locks = state or _worker
+        rs, rd = bisect_left(numbers, src), bisect_left(numbers, dst)
+        if src == dst or rs >= len(numbers) or rd >= len(numbers) or numbers[rs] != src or numbers[rd] != dst:
+            return False
+        a, b = AccountStore.shardIndex(src, len(locks)), AccountStore.shardIndex(dst, len(locks))
+        first, second = locks[min(a, b)], locks[max(a, b)]
+        with first:
+            if a != b:
+                second.acquire()
+            try:
+                if balances[rs] < amountInCents:
+                    return 0
+                balances[rs] -= amountInCents
+                balances[rd] += amountInCents
+                stamp = max(clocks[a], clocks[b]) + 1
+                clocks[a] = clocks[b] = stamp
+                return stamp
+            finally:
+                if a != b:
+                    second.release()
+
+    @staticmethod
+    def transferMany(transfers) -> list:
+        """
+        Run a chunk of (src, dst, cents) transfers in a worker. Returns the ones
+        that succeeded as (stamp, src, dst, cents), for writeBack().
+        """
+        state = _worker
+        transfer = SharedBalances.transfer
+        done = []
+        for src, dst, cents in transfers:
+            stamp = transfer(src, dst, cents, state)
+            if stamp:
+                done.append((stamp, src, dst, cents))
+        return done
+
+    # ---------- Owner side ----------
+    def balances(self) -> dict:
+        numbers = self._numbersBlock.buf[:self._count * 8].cast("q")
+        balances = self._balancesBlock.buf[:self._count * 8].cast("q")
+        try:
+            return dict(zip(numbers.tolist(), balances.tolist()))
+        finally:
+            numbers.release()
+            balances.release()
+
+    def writeBack(self, bank, done) -> int:
+        """
+        Replay the transfers the workers made (the lists transferMany returned)
+        into bank, in stamp order, as journaled transfers with ledger legs.
+        Returns how many the bank refused; that is 0 unless the bank was changed
+        while the pool ran, in which case the bank's own checks win.
+        """
+        refused = 0
+        for _, src, dst, cents in sorted(t for chunk in done for t in chunk):
+            if not bank.transfer(src, dst, cents):
+                refused += 1
+        return refused
+
+    def close(self):
+        for block in (self._numbersBlock, self._balancesBlock, self._clocksBlock):
+            block.close()
+            block.unlink()
@@ -0,0 +1,120 @@
+"""Concurrent transfers on a sharded Bank and through SharedBalances: money is never created or lost."""
+import multiprocessing
+import random
+import sys
+import threading
+
+import pytest
+
+from Bank import Bank
+from BankUtility import BankUtility
+from Ledger import Ledger
+from SharedBalances import SharedBalances
+
+_PIN_HASH = BankUtility.hashPIN("0000")
+
+
+@pytest.fixture
+def bank():
+    bank = Bank(shards=16)
+    rng = random.Random(1)
+    for i in range(300):
+        # Spread the accounts over the whole number range, so every shard is used
+        bank._store.addRow(10000000 + i * 299_999, "Stress", "Test", "123456789", _PIN_HASH,
+                           rng.randrange(0, 100_000))
+    return bank
+
+
+@pytest.fixture
+def fastSwitching():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def _plan(numbers: list, count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [(rng.choice(numbers), rng.choice(numbers), rng.randrange(1, 20_000)) for _ in range(count)]
+
+
+def _total(bank: Bank) -> int:
+    return sum(bank._store.balanceColumn())
+
+
+def _run(threads: list, timeout: float = 60):
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout)
+        assert not t.is_alive(), "transfers deadlocked"
+
+
+def test_thread_transfers_conserve_total(bank, fastSwitching):
+    numbers = list(bank._store.accountNumbers())
+    before = _total(bank)
+    plans = [_plan(numbers, 5_000, seed) for seed in range(8)]
+    _run([threading.Thread(target=lambda plan=plan: [bank.transfer(*t) for t in plan]) for plan in plans])
+    assert _total(bank) == before
+    assert min(bank._store.balanceColumn()) >= 0
+
+
+def test_opposite_transfers_do_not_deadlock(bank, fastSwitching):
+    numbers = list(bank._store.accountNumbers())
+    a, b = numbers[0], numbers[-1]
+    assert bank._store.shardOf(a) != bank._store.shardOf(b)
+    before = _total(bank)
+
+    def run(src, dst):
+        for _ in range(20_000):
+            bank.transfer(src, dst, 1)
+
+    _run([threading.Thread(target=run, args=pair) for pair in ((a, b), (b, a)) * 2])
+    assert _total(bank) == before
+
+
+def test_ledger_chains_after_thread_transfers(bank, fastSwitching):
+    numbers = list(bank._store.accountNumbers())
+    plans = [_plan(numbers, 2_000, seed) for seed in range(4)]
+    _run([threading.Thread(target=lambda plan=plan: [bank.transfer(*t) for t in plan]) for plan in plans])
+    for num in numbers:
+        entries = bank.getStatement(num)
+        if entries:
+            assert all(prev[4] + cur[2] == cur[4] for prev, cur in zip(entries, entries[1:]))
+            assert entries[-1][4] == bank._store.getBalance(num)
+
+
+def test_process_pool_transfers_conserve_total_and_replay(bank):
+    numbers = list(bank._store.accountNumbers())
+    before = _total(bank)
+    chunks = [_plan(numbers, 1_000, seed) for seed in range(16)]
+    shared = SharedBalances(bank, shards=16)
+    try:
+        with multiprocessing.Pool(4, SharedBalances.attach, (shared.handle(),)) as pool:
+            done = pool.map(SharedBalances.transferMany, chunks)
+        balances = shared.balances()
+        assert sum(balances.values()) == before
+        assert min(balances.values()) >= 0
+        assert shared.writeBack(bank, done) == 0
+    finally:
+        shared.close()
+    assert {num: bank._store.getBalance(num) for num in numbers} == balances
+    kinds = {entry[1] for num in numbers for entry in bank.getStatement(num)}
+    assert kinds == {Ledger.TRANSFER_OUT, Ledger.TRANSFER_IN}
+
+
+def test_write_back_lets_the_bank_refuse_after_a_change(bank):
+    numbers = list(bank._store.accountNumbers())
+    src, dst = numbers[0], numbers[1]
+    bank._store.setBalance(src, 5_000)
+    shared = SharedBalances(bank, shards=16)
+    try:
+        with multiprocessing.Pool(1, SharedBalances.attach, (shared.handle(),)) as pool:
+            done = pool.map(SharedBalances.transferMany, [[(src, dst, 5_000)]])
+        assert done == [[(1, src, dst, 5_000)]]
+        # The bank is changed behind the pool's back: the source no longer has the money
+        bank.withdraw(src, 1)
+        assert shared.writeBack(bank, done) == 1
+    finally:
+        shared.close()
+    assert bank._store.getBalance(src) == 4_999
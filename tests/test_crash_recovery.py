@@ -0,0 +1,157 @@
+"""PartitionedBank under fault injection: workers and the coordinator die mid-transfer, and no money is made or lost."""
+import multiprocessing
+import os
+import random
+import threading
+import time
+
+import pytest
+
+from Account import Account
+from PartitionedBank import PartitionedBank, PartitionUnavailable
+
+_PARTITIONS = 3
+
+
+def _open(directory: str) -> PartitionedBank:
+    return PartitionedBank(directory, _PARTITIONS, maxAccountsPerPartition=100)
+
+
+@pytest.fixture
+def accounts(tmp_path):
+    """(directory, account numbers) of a closed PartitionedBank with eight funded accounts per partition."""
+    directory = str(tmp_path)
+    bank = _open(directory)
+    numbers = []
+    rng = random.Random(7)
+    while len(numbers) < 8 * _PARTITIONS:
+        num = rng.randrange(10000000, 100000000)
+        if num in numbers or sum(bank.partitionOf(n) == bank.partitionOf(num) for n in numbers) >= 8:
+            continue
+        a = Account()
+        a.setAccountNumber(num)
+        a.setOwnerFirstName("Crash")
+        a.setOwnerLastName("Test")
+        a.setOwnerSSN("123456789")
+        a.setPIN("1234")
+        a.setBalanceInCents(1_000_000)
+        assert bank.addAccountToBank(a)
+        numbers.append(num)
+    bank.close()
+    return directory, numbers
+
+
+def _pair(bank: PartitionedBank, numbers: list) -> tuple:
+    """Two accounts in different partitions."""
+    src = numbers[0]
+    dst = next(num for num in numbers if bank.partitionOf(num) != bank.partitionOf(src))
+    return src, dst
+
+
+def _balances(bank: PartitionedBank, numbers: list) -> dict:
+    return {num: bank.getBalance(num) for num in numbers}
+
+
+@pytest.mark.parametrize("point, side, committed", [
+    ("prepare", "src", False),
+    ("prepared", "src", False),
+    ("prepared", "dst", False),
+    ("commit", "dst", True),
+])
+def test_worker_crash_at_each_step(accounts, point, side, committed):
+    directory, numbers = accounts
+    with _open(directory) as bank:
+        src, dst = _pair(bank, numbers)
+        before = _balances(bank, numbers)
+        bank.crashPartition(bank.partitionOf(src if side == "src" else dst), point)
+        assert bank.transfer(src, dst, 2_500) is committed
+        # The crashed worker restarts on the next call and settles the transfer first
+        moved = 2_500 if committed else 0
+        expected = {**before, src: before[src] - moved, dst: before[dst] + moved}
+        assert _balances(bank, numbers) == expected
+    with _open(directory) as bank:
+        assert _balances(bank, numbers) == expected
+
+
+def _transfers(bank: PartitionedBank, numbers: list, stop: threading.Event, seed: int):
+    rng = random.Random(seed)
+    while not stop.is_set():
+        try:
+            bank.transfer(rng.choice(numbers), rng.choice(numbers), rng.randrange(1, 50_000))
+        except PartitionUnavailable:
+            pass
+
+
+def test_workers_killed_mid_transfer(accounts):
+    directory, numbers = accounts
+    with _open(directory) as bank:
+        expected = bank.totalCents()
+        stop = threading.Event()
+        threads = [threading.Thread(target=_transfers, args=(bank, numbers, stop, seed)) for seed in range(6)]
+        for t in threads:
+            t.start()
+        rng = random.Random(1)
+        try:
+            for fault in range(12):
+                time.sleep(0.1)
+                p = rng.randrange(_PARTITIONS)
+                if fault % 2:
+                    bank.killPartition(p)
+                    continue
+                try:
+                    bank.crashPartition(p, rng.choice(PartitionedBank.CRASH_POINTS))
+                except PartitionUnavailable:
+                    pass
+        finally:
+            stop.set()
+            for t in threads:
+                t.join()
+        balances = _balances(bank, numbers)
+        assert sum(balances.values()) == expected
+        assert min(balances.values()) >= 0
+    with _open(directory) as bank:
+        assert _balances(bank, numbers) == balances
+
+
+def _coordinator(directory: str, numbers: list, pids):
+    """Child process: a coordinator that transfers between partitions until it is killed."""
+    bank = _open(directory)
+    bank.totalCents()   # start every worker
+    pids.put([worker[0].pid for worker in bank._workers])
+    _transfers(bank, numbers, threading.Event(), os.getpid())
+
+
+def _gone(pid: int) -> bool:
+    """True once process pid has exited (always, where there is no /proc to tell)."""
+    if not os.path.isdir("/proc"):
+        return True
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            return any(line.startswith("State:") and "Z" in line for line in f)
+    except FileNotFoundError:
+        return True
+
+
+def test_coordinator_killed_mid_transfer(accounts):
+    directory, numbers = accounts
+    with _open(directory) as bank:
+        expected = bank.totalCents()
+    ctx = multiprocessing.get_context("spawn")
+    pids = ctx.Queue()
+    for attempt in range(3):
+        child = ctx.Process(target=_coordinator, args=(directory, numbers, pids))
+        child.start()
+        workers = pids.get(timeout=60)
+        time.sleep(0.3 + 0.2 * attempt)
+        child.kill()
+        child.join()
+        # Each worker sees the coordinator's pipe close and shuts its Bank down
+        deadline = time.monotonic() + 30
+        while not all(_gone(pid) for pid in workers):
+            assert time.monotonic() < deadline, "partition workers outlived their coordinator"
+            time.sleep(0.05)
+        with _open(directory) as bank:
+            balances = _balances(bank, numbers)
+        assert sum(balances.values()) == expected
+        assert min(balances.values()) >= 0
+        assert set(balances.values()) != {1_000_000}, "the coordinator was killed before any transfer"
@@ -0,0 +1,88 @@
+"""Bank.applyMonthlyInterest against the per-account Decimal loop it replaced."""
+import math
+import random
+from decimal import Decimal, ROUND_HALF_UP
+
+import pytest
+
+from Bank import Bank
+from BankUtility import BankUtility
+
+_PIN_HASH = BankUtility.hashPIN("0000")
+
+
+def _decimal_interest(balanceInCents: int, apr: str) -> int:
+    """Interest in cents as the original add_monthly_interest_flow computed it."""
+    if balanceInCents <= 0:
+        return 0
+    bal = Decimal(balanceInCents) / Decimal(100)
+    interest = (bal * (Decimal(apr) / Decimal("1200"))).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    return int((interest * Decimal(100)).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def _ties(apr: str, count: int) -> list:
+    """Up to count balances whose interest at apr is exactly a whole cent plus one half."""
+    numerator, exponent = BankUtility.monthlyRateFromAPR(apr)
+    if exponent >= 0:
+        return []
+    d = 10 ** -exponent
+    g = math.gcd(numerator, d)
+    if (d // 2) % g:
+        return []
+    m = d // g
+    first = (d // 2 // g) * pow(numerator // g, -1, m) % m if m > 1 else 0
+    return [b for b in (first + k * m for k in range(count)) if 0 < b <= 10 ** 12]
+
+
+def _bank(balances: list) -> Bank:
+    bank = Bank()
+    bank.MAX_ACCOUNTS = len(balances)
+    for i, cents in enumerate(balances):
+        bank._store.addRow(10000000 + i, "Prop", "Test", "123456789", _PIN_HASH, cents)
+    return bank
+
+
+def _random_apr(rng: random.Random) -> str:
+    apr = str(rng.randrange(50))
+    decimals = rng.randrange(5)
+    if decimals:
+        apr += "." + "".join(rng.choice("0123456789") for _ in range(decimals))
+    return apr
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_decimal_loop(seed):
+    rng = random.Random(seed)
+    for _ in range(10):
+        apr = _random_apr(rng)
+        balances = [rng.randrange(1, 10 ** rng.randrange(1, 13)) for _ in range(200)]
+        balances += _ties(apr, 20) + [0, -rng.randrange(1, 10 ** 6)]
+        bank = _bank(balances)
+        updated, total = bank.applyMonthlyInterest(apr)
+        expected = [_decimal_interest(cents, apr) for cents in balances]
+        assert [bank._store.getBalance(10000000 + i) for i in range(len(balances))] == \
+            [cents + interest for cents, interest in zip(balances, expected)], f"APR {apr}"
+        assert updated == sum(1 for interest in expected if interest)
+        assert total == sum(expected)
+
+
+@pytest.mark.parametrize("apr", ["1.5", "3", "6", "9.99", "12.3456", "7.77"])
+def test_half_cent_ties_round_up(apr):
+    balances = _ties(apr, 200)
+    assert balances
+    bank = _bank(balances)
+    bank.applyMonthlyInterest(apr)
+    for i, cents in enumerate(balances):
+        assert bank._store.getBalance(10000000 + i) == cents + _decimal_interest(cents, apr)
+
+
+def test_zero_and_negative_balances_untouched():
+    bank = _bank([0, -500, 100000])
+    assert bank.applyMonthlyInterest("12") == (1, 1000)
+    assert [bank._store.getBalance(10000000 + i) for i in range(3)] == [0, -500, 101000]
+
+
+def test_zero_apr_pays_nothing():
+    bank = _bank([100000, 5])
+    assert bank.applyMonthlyInterest("0") == (0, 0)
+    assert [bank._store.getBalance(10000000 + i) for i in range(2)] == [100000, 5]
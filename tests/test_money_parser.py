@@ -0,0 +1,86 @@
+"""MoneyParser against BankUtility.convertFromDollarsToCents, the conversion it replaces."""
+import random
+
+import pytest
+
+from BankUtility import BankUtility
+from MoneyParser import MoneyParser
+
+convert = BankUtility.convertFromDollarsToCents
+
+
+def _plain(text: str) -> str:
+    """text without what only MoneyParser reads ("$" and thousands separators)."""
+    return text.replace("$", "").replace(",", "")
+
+
+def _amounts(count: int, seed: int) -> list:
+    """Amounts as people and files write them: plain, with "$" and separators, past the cent, signed and very large."""
+    rng = random.Random(seed)
+    out = []
+    for _ in range(count):
+        style = rng.randrange(6)
+        if style == 0:
+            text = f"{rng.randrange(10**6) / 100:.2f}"
+        elif style == 1:
+            text = f"${rng.randrange(10**9) / 100:,.2f}"
+        elif style == 2:
+            text = f"{rng.randrange(10**4)}.{rng.randrange(10**4):0{rng.randrange(1, 5)}d}"
+        elif style == 3:
+            text = f"{rng.randrange(10**15):,}.{rng.randrange(100):02d}"
+        elif style == 4:
+            text = f"{rng.randrange(10**6)}.{rng.randrange(100):02d}5"
+        else:
+            text = str(rng.randrange(10**18))
+        out.append(rng.choice(("", "-", "+")) + text)
+    return out
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_matches_convert_from_dollars_to_cents(seed):
+    for text in _amounts(5_000, seed):
+        assert MoneyParser.parseCents(text) == convert(_plain(text)), text
+
+
+def test_parse_many_matches_parse_cents():
+    amounts = [text for text in _amounts(5_000, 99) if abs(convert(_plain(text))) < 1 << 63]
+    assert list(MoneyParser.parseMany(amounts)) == [convert(_plain(text)) for text in amounts]
+
+
+@pytest.mark.parametrize("text, cents", [
+    ("19.995", 2000), ("0.005", 1), ("0.004", 0), ("-0.005", -1), ("-$3", -300), ("$-3", -300),
+    ("$1,234.567", 123457), (" 12.5 ", 1250), (".5", 50), ("7.", 700), ("+1", 100),
+    ("90071992547409.93", 9007199254740993),
+])
+def test_examples(text, cents):
+    assert MoneyParser.parseCents(text) == cents
+    assert convert(_plain(text).replace(" ", "")) == cents
+
+
+def test_exact_where_float_is_not():
+    text = "90071992547409.93"
+    assert MoneyParser.parseCents(text) == convert(text)
+    assert convert(float(text)) != convert(text)
+
+
+@pytest.mark.parametrize("text", [
+    "", " ", "$", "-", ".", "abc", "1e5", "inf", "nan", "1.2.3", "1,23", "12,34.5", "1,2345",
+    "--1", "-$-1", "$$1", "1 000", "0x10", "١٢",
+])
+def test_invalid_amounts_raise(text):
+    with pytest.raises(ValueError):
+        MoneyParser.parseCents(text)
+
+
+def test_parse_many_reports_or_replaces_invalid_amounts():
+    with pytest.raises(ValueError, match="2 at position"):
+        MoneyParser.parseMany(["1", "x", "2", "1e3"])
+    assert list(MoneyParser.parseMany(["1", "x", "2"], invalid=-1)) == [100, -1, 200]
+
+
+def test_parse_many_refuses_amounts_past_64_bits():
+    largest = "92,233,720,368,547,758.07"
+    assert list(MoneyParser.parseMany([largest, "-" + largest])) == [(1 << 63) - 1, -(1 << 63) + 1]
+    with pytest.raises(ValueError, match="1 at position"):
+        MoneyParser.parseMany(["92233720368547758.08"])
+    assert list(MoneyParser.parseMany(["1", "1" + "0" * 30], invalid=0)) == [100, 0]